@@ -1,17 +1,16 @@
 """章节管理API"""
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
-from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-import json
 import asyncio
-from typing import Optional
+import json
+from typing import List, Optional, Tuple
 
+from app.config import settings
 from app.database import get_db
 from app.models.chapter import Chapter
 from app.models.project import Project
 from app.models.outline import Outline
-from app.models.character import Character
 from app.models.generation_history import GenerationHistory
 from app.models.writing_style import WritingStyle
 from app.schemas.chapter import (
@@ -23,8 +22,20 @@ from app.schemas.chapter import (
 )
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service
+from app.services import chapter_context_repository, project_context_cache, generation_jobs, chapter_checkpoint
+from app.services.chapter_completion_index import check_chapter_prerequisites
+from app.services.chapter_summary_service import (
+    PreviousContext,
+    build_previous_context,
+    invalidate_chapter_summary,
+    schedule_chapter_summary,
+    schedule_summary_tree_update
+)
+from app.services.context_assembler import ContextPlan, ContextSection, assemble_context, prompt_token_budget
 from app.logger import get_logger
 from app.api.settings import get_user_ai_service
+from app.utils.sse_response import SSEResponse, create_sse_response, coalesce_text_stream
+from app.utils.token_estimator import estimate_tokens
 
 router = APIRouter(prefix="/chapters", tags=["章节管理"])
 logger = get_logger(__name__)
@@ -105,9 +116,11 @@ async def get_chapter(
 async def update_chapter(
     chapter_id: str,
     chapter_update: ChapterUpdate,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user_ai_service: AIService = Depends(get_user_ai_service)
 ):
-    """更新章节信息"""
+    """更新章节信息（正文变化时在后台重新生成本章摘要并沿路径重新汇总剧情弧和卷）"""
     result = await db.execute(
         select(Chapter).where(Chapter.id == chapter_id)
     )
@@ -116,8 +129,9 @@ async def update_chapter(
     if not chapter:
         raise HTTPException(status_code=404, detail="章节不存在")
     
-    # 记录旧字数
+    # 记录旧字数和序号
     old_word_count = chapter.word_count or 0
+    old_chapter_number = chapter.chapter_number
     
     # 更新字段
     update_data = chapter_update.model_dump(exclude_unset=True)
@@ -137,8 +151,16 @@ async def update_chapter(
         if project:
             project.current_words = project.current_words - old_word_count + new_word_count
     
+    # 正文变化后旧的剧情摘要及所在剧情弧、卷的汇总失效
+    content_changed = "content" in update_data
+    if content_changed:
+        await invalidate_chapter_summary(db, chapter, old_chapter_number)
+    
     await db.commit()
     await db.refresh(chapter)
+    
+    if content_changed and chapter.content and chapter.content.strip():
+        schedule_chapter_summary(request.state.user_id, chapter.id, user_ai_service)
     return chapter
 
 
@@ -164,90 +186,384 @@ async def delete_chapter(
     if project:
         project.current_words = max(0, project.current_words - chapter.word_count)
     
+    # 删除本章摘要及所在剧情弧、卷的汇总（SQLite未启用外键，级联删除不会生效）
+    await invalidate_chapter_summary(db, chapter)
     await db.delete(chapter)
     await db.commit()
     
     return {"message": "章节删除成功"}
 
 
-async def check_prerequisites(db: AsyncSession, chapter: Chapter) -> tuple[bool, str, list[Chapter]]:
+async def check_prerequisites(db: AsyncSession, chapter: Chapter) -> tuple[bool, str]:
     """
-    检查章节前置条件
+    检查章节前置条件（查询项目的章节完成度索引，不扫描前置章节）
     
     Args:
         db: 数据库会话
         chapter: 当前章节
         
     Returns:
-        (可否生成, 错误信息, 前置章节列表)
+        (可否生成, 错误信息)
     """
     # 如果是第一章，无需检查前置
     if chapter.chapter_number == 1:
-        return True, "", []
+        return True, ""
     
-    # 查询所有前置章节（序号小于当前章节的）
-    result = await db.execute(
-        select(Chapter)
-        .where(Chapter.project_id == chapter.project_id)
-        .where(Chapter.chapter_number < chapter.chapter_number)
-        .order_by(Chapter.chapter_number)
+    can_generate, error_msg, _ = await check_chapter_prerequisites(
+        db, chapter.project_id, chapter.chapter_number
     )
-    previous_chapters = result.scalars().all()
-    
-    # 检查是否所有前置章节都有内容
-    incomplete_chapters = [
-        ch for ch in previous_chapters
-        if not ch.content or ch.content.strip() == ""
-    ]
-    
-    if incomplete_chapters:
-        missing_numbers = [str(ch.chapter_number) for ch in incomplete_chapters]
-        error_msg = f"需要先完成前置章节：第 {', '.join(missing_numbers)} 章"
-        return False, error_msg, previous_chapters
-    
-    return True, "", previous_chapters
+    return can_generate, error_msg
 
 
 @router.get("/{chapter_id}/can-generate", summary="检查章节是否可以生成")
 async def check_can_generate(
     chapter_id: str,
+    include_chapters: bool = Query(True, description="是否返回前置章节列表（需要查询所有前置章节，只判断可否生成时可关闭）"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     检查章节是否满足生成条件
     返回可生成状态和前置章节信息
+    
+    可否生成由项目的章节完成度索引直接给出；include_chapters=false 时不查询前置章节。
     """
     # 获取章节
     result = await db.execute(
-        select(Chapter).where(Chapter.id == chapter_id)
+        select(Chapter.project_id, Chapter.chapter_number).where(Chapter.id == chapter_id)
     )
-    chapter = result.scalar_one_or_none()
+    chapter = result.first()
     if not chapter:
         raise HTTPException(status_code=404, detail="章节不存在")
     
-    # 检查前置条件
-    can_generate, error_msg, previous_chapters = await check_prerequisites(db, chapter)
-    
-    # 构建前置章节信息
-    previous_info = [
-        {
-            "id": ch.id,
-            "chapter_number": ch.chapter_number,
-            "title": ch.title,
-            "has_content": bool(ch.content and ch.content.strip()),
-            "word_count": ch.word_count or 0
-        }
-        for ch in previous_chapters
-    ]
+    # 检查前置条件（只读接口，提交以保存可能重建的章节完成度索引）
+    can_generate, error_msg, first_incomplete = await check_chapter_prerequisites(
+        db, chapter.project_id, chapter.chapter_number
+    )
+    await db.commit()
+    
+    # 构建前置章节信息（不加载正文）
+    previous_info = []
+    if include_chapters:
+        previous_chapters = await chapter_context_repository.list_previous_chapter_briefs(
+            db, chapter.project_id, chapter.chapter_number
+        )
+        previous_info = [
+            {
+                "id": ch.id,
+                "chapter_number": ch.chapter_number,
+                "title": ch.title,
+                "has_content": bool(ch.has_content),
+                "word_count": ch.word_count or 0
+            }
+            for ch in previous_chapters
+        ]
     
     return {
         "can_generate": can_generate,
         "reason": error_msg if not can_generate else "",
         "previous_chapters": previous_info,
-        "chapter_number": chapter.chapter_number
+        "chapter_number": chapter.chapter_number,
+        "first_incomplete_chapter": first_incomplete
+    }
+
+
+async def _build_chapter_prompt(
+    db: AsyncSession,
+    chapter: Chapter,
+    project: Project,
+    style_id: Optional[int],
+    budget: int,
+    draft_content: str = ""
+) -> Tuple[str, str, ContextPlan, PreviousContext]:
+    """
+    构建章节创作提示词
+    
+    写作风格、前置章节、角色、大纲、世界规则五段上下文按 budget（见 prompt_token_budget）装配，
+    超出预算时优先截断优先级低的段落。续写时本章草稿优先级最高，超出时保留结尾。
+    
+    Returns:
+        (可缓存的提示词前缀, 提示词其余部分, 装配明细, 前置章节上下文)
+    """
+    # 获取对应的大纲
+    outline_result = await db.execute(
+        select(Outline)
+        .where(Outline.project_id == chapter.project_id)
+        .where(Outline.order_index == chapter.chapter_number)
+        .execution_options(populate_existing=True)
+    )
+    outline = outline_result.scalar_one_or_none()
+    
+    # 获取所有大纲和角色信息用于上下文（项目未变化时直接使用缓存）
+    outlines_context = await project_context_cache.get_outlines_context(db, chapter.project_id)
+    characters_info = await project_context_cache.get_characters_info(db, chapter.project_id)
+    
+    # 获取写作风格
+    style_content = ""
+    if style_id:
+        # 使用指定的风格
+        style_result = await db.execute(
+            select(WritingStyle).where(WritingStyle.id == style_id)
+        )
+        style = style_result.scalar_one_or_none()
+        if style:
+            # 验证风格是否可用：全局预设风格（project_id为NULL）或者当前项目的自定义风格
+            if style.project_id is None or style.project_id == chapter.project_id:
+                style_content = style.prompt_content or ""
+                style_type = "全局预设" if style.project_id is None else "项目自定义"
+                logger.info(f"使用指定风格: {style.name} ({style_type})")
+            else:
+                logger.warning(f"风格 {style_id} 不属于当前项目，无法使用")
+        else:
+            logger.warning(f"未找到风格 {style_id}")
+    else:
+        logger.info("未指定写作风格，使用原始提示词")
+    
+    # 构建前置章节内容上下文（较早章节使用剧情摘要，最近章节使用完整正文）
+    previous_context = await build_previous_context(db, chapter.project_id, chapter.chapter_number)
+    
+    # 项目资料放在可缓存前缀中，前置章节、本章信息和写作风格放在后半部分
+    def render(world_rules: str, characters: str, outlines: str, previous: str, style_text: str,
+               draft: str) -> Tuple[str, str]:
+        return prompt_service.get_chapter_prompt_parts(
+            title=project.title,
+            theme=project.theme or '',
+            genre=project.genre or '',
+            narrative_perspective=project.narrative_perspective or '第三人称',
+            time_period=project.world_time_period or '未设定',
+            location=project.world_location or '未设定',
+            atmosphere=project.world_atmosphere or '未设定',
+            rules=world_rules or '未设定',
+            characters_info=characters or '暂无角色信息',
+            outlines_context=outlines,
+            previous_content=previous,
+            chapter_number=chapter.chapter_number,
+            chapter_title=chapter.title,
+            chapter_outline=outline.content if outline else chapter.summary or '暂无大纲',
+            style_content=style_text,
+            draft_content=draft
+        )
+    
+    # 大纲列表优先保留当前剧情弧附近的部分（以剧情弧起始章为中心，同一剧情弧内截断位置相同，前缀保持不变）
+    arc_size = max(1, settings.story_arc_size)
+    arc_start = (chapter.chapter_number - 1) // arc_size * arc_size + 1
+    outline_lines = outlines_context.split("\n")
+    outline_focus = next(
+        (i for i, line in enumerate(outline_lines) if line.startswith(f"第{arc_start}章 ")),
+        None
+    )
+    sections = [
+        ContextSection("draft", draft_content, priority=0, max_share=0.3, strategy="tail"),
+        ContextSection("style", style_content, priority=1, max_share=0.15, strategy="head"),
+        ContextSection("previous_content", previous_context.text, priority=2, max_share=0.5, strategy="tail"),
+        ContextSection("characters", characters_info, priority=3, max_share=0.2, strategy="lines", stable=True),
+        ContextSection("outlines", outlines_context, priority=4, max_share=0.2, strategy="lines", focus=outline_focus, stable=True),
+        ContextSection("world", project.world_rules or "", priority=5, max_share=0.1, strategy="head", stable=True),
+    ]
+    fixed_tokens = estimate_tokens("".join(render("", "", "", "", "", "")))
+    if draft_content:
+        # 续写说明
+        fixed_tokens += estimate_tokens(prompt_service.CHAPTER_RESUME)
+    plan = assemble_context(sections, budget, fixed_tokens)
+    if plan.truncated:
+        logger.info(
+            f"✂️ 第{chapter.chapter_number}章提示词超出预算 {plan.budget}，"
+            f"已截断: {', '.join(plan.truncated)}（约 {plan.total_tokens} tokens）"
+        )
+    
+    prompt_prefix, prompt = render(
+        plan.texts["world"],
+        plan.texts["characters"],
+        plan.texts["outlines"],
+        plan.texts["previous_content"],
+        plan.texts["style"],
+        plan.texts["draft"]
+    )
+    return prompt_prefix, prompt, plan, previous_context
+
+
+@router.post("/{chapter_id}/prompt-plan", summary="预览章节创作提示词的token分配")
+async def preview_chapter_prompt_plan(
+    chapter_id: str,
+    generate_request: ChapterGenerateRequest = ChapterGenerateRequest(),
+    db: AsyncSession = Depends(get_db),
+    user_ai_service: AIService = Depends(get_user_ai_service)
+):
+    """
+    只构建提示词、不调用AI，返回各段上下文的原始/分配/最终token数以及是否被截断
+    
+    请求体参数与流式创作相同（style_id）
+    """
+    result = await db.execute(select(Chapter).where(Chapter.id == chapter_id))
+    chapter = result.scalar_one_or_none()
+    if not chapter:
+        raise HTTPException(status_code=404, detail="章节不存在")
+    
+    project_result = await db.execute(select(Project).where(Project.id == chapter.project_id))
+    project = project_result.scalar_one_or_none()
+    if not project:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    
+    budget = prompt_token_budget(user_ai_service.default_model, user_ai_service.default_max_tokens)
+    prompt_prefix, prompt, plan, _ = await _build_chapter_prompt(db, chapter, project, generate_request.style_id, budget)
+    return {
+        "chapter_id": chapter_id,
+        "chapter_number": chapter.chapter_number,
+        "prompt_chars": len(prompt_prefix) + len(prompt),
+        "prompt_tokens": estimate_tokens(prompt_prefix) + estimate_tokens(prompt),
+        "cacheable_prefix_tokens": estimate_tokens(prompt_prefix),
+        **plan.to_dict()
     }
 
 
+async def chapter_generation_generator(
+    db_session: AsyncSession,
+    user_id: str,
+    chapter_id: str,
+    style_id: Optional[int],
+    user_ai_service: AIService,
+    resume: bool = False
+):
+    """
+    章节创作事件生成器（在后台生成任务中运行，使用任务专用的数据库会话）
+    
+    创作过程中定期把已生成的部分保存为草稿；resume 为 True 时以草稿为前文续写。
+    """
+    db_committed = False
+    checkpointer = None
+    content_parts: List[str] = []
+    content_chars = 0
+    try:
+        # 重新获取章节信息
+        chapter_result = await db_session.execute(
+            select(Chapter).where(Chapter.id == chapter_id)
+        )
+        current_chapter = chapter_result.scalar_one_or_none()
+        if not current_chapter:
+            yield f"data: {json.dumps({'type': 'error', 'error': '章节不存在'}, ensure_ascii=False)}\n\n"
+            return
+        
+        # 获取项目信息
+        project_result = await db_session.execute(
+            select(Project).where(Project.id == current_chapter.project_id)
+        )
+        project = project_result.scalar_one_or_none()
+        if not project:
+            yield f"data: {json.dumps({'type': 'error', 'error': '项目不存在'}, ensure_ascii=False)}\n\n"
+            return
+        
+        # 续写时读取已保存的草稿
+        draft_content = ""
+        if resume:
+            draft = await chapter_checkpoint.get_draft(db_session, chapter_id)
+            if not draft or not draft.content:
+                yield f"data: {json.dumps({'type': 'error', 'error': '没有可续写的草稿'}, ensure_ascii=False)}\n\n"
+                return
+            draft_content = draft.content
+        
+        # 构建提示词（各段上下文按token预算装配，预算为所用模型的输出留出 max_tokens）
+        budget = prompt_token_budget(user_ai_service.default_model, user_ai_service.default_max_tokens)
+        prompt_prefix, prompt, plan, previous_context = await _build_chapter_prompt(
+            db_session, current_chapter, project, style_id, budget, draft_content
+        )
+        # 补生成缺少的章摘要和剧情弧/卷摘要，供后续章节使用
+        for missing_id in previous_context.missing_chapter_ids:
+            schedule_chapter_summary(user_id, missing_id, user_ai_service)
+        for stale_number in previous_context.stale_chapter_numbers:
+            schedule_summary_tree_update(user_id, current_chapter.project_id, stale_number, user_ai_service)
+        
+        # 标记章节为生成中并写入初始草稿
+        checkpointer = chapter_checkpoint.ChapterCheckpointer(db_session, current_chapter)
+        await checkpointer.begin(current_chapter, draft_content)
+        
+        # 发送开始事件
+        if draft_content:
+            start_message = f'从已保存的 {len(draft_content)} 字继续创作...'
+        else:
+            start_message = '开始AI创作...'
+        yield f"data: {json.dumps({'type': 'start', 'message': start_message}, ensure_ascii=False)}\n\n"
+        
+        logger.info(f"开始AI流式创作章节 {chapter_id}（提示词约 {plan.total_tokens} tokens，草稿 {len(draft_content)} 字）")
+        
+        # 续写时先发送已有草稿，客户端按普通内容拼接即可得到完整正文
+        if draft_content:
+            content_parts.append(draft_content)
+            content_chars = len(draft_content)
+            yield f"data: {json.dumps({'type': 'content', 'content': draft_content}, ensure_ascii=False)}\n\n"
+        
+        # 流式生成内容（按时间窗口合并token，减少SSE帧数）
+        async for chunk in coalesce_text_stream(
+            user_ai_service.generate_text_stream(prompt=prompt, prompt_prefix=prompt_prefix)
+        ):
+            if chunk is None:
+                yield await SSEResponse.send_heartbeat()
+                continue
+            content_parts.append(chunk)
+            content_chars += len(chunk)
+            yield f"data: {json.dumps({'type': 'content', 'content': chunk}, ensure_ascii=False)}\n\n"
+            await checkpointer.maybe_save(content_parts, content_chars)
+        
+        full_content = "".join(content_parts)
+        
+        # 更新章节内容到数据库
+        old_word_count = current_chapter.word_count or 0
+        current_chapter.content = full_content
+        new_word_count = len(full_content)
+        current_chapter.word_count = new_word_count
+        current_chapter.status = "completed"
+        
+        # 更新项目字数
+        project.current_words = project.current_words - old_word_count + new_word_count
+        
+        # 记录生成历史
+        history = GenerationHistory(
+            project_id=current_chapter.project_id,
+            chapter_id=current_chapter.id,
+            prompt=f"创作章节: 第{current_chapter.chapter_number}章 {current_chapter.title}",
+            generated_content=full_content[:500] if len(full_content) > 500 else full_content,
+            model="default"
+        )
+        db_session.add(history)
+        await checkpointer.complete()
+        
+        await db_session.commit()
+        db_committed = True
+        await db_session.refresh(current_chapter)
+        
+        logger.info(f"成功创作章节 {chapter_id}，共 {new_word_count} 字")
+        
+        # 后台生成本章剧情摘要，供后续章节作为上下文
+        schedule_chapter_summary(user_id, current_chapter.id, user_ai_service)
+        
+        # 发送完成事件
+        yield f"data: {json.dumps({'type': 'done', 'message': '创作完成', 'word_count': new_word_count}, ensure_ascii=False)}\n\n"
+    
+    except Exception as e:
+        logger.error(f"流式创作章节失败: {str(e)}")
+        if not db_committed:
+            try:
+                if db_session.in_transaction():
+                    await db_session.rollback()
+                    logger.info("章节生成事务已回滚（异常）")
+            except Exception as rollback_error:
+                logger.error(f"回滚失败: {str(rollback_error)}")
+            # 保存中断前已生成的部分，之后可以续写
+            if checkpointer:
+                await checkpointer.save("".join(content_parts))
+        yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+    except asyncio.CancelledError:
+        # 任务被取消或服务关闭：先回滚未提交的正文修改，避免被草稿保存一并提交
+        if not db_committed:
+            try:
+                if db_session.in_transaction():
+                    await db_session.rollback()
+                    logger.info("章节生成事务已回滚（任务取消）")
+            except Exception as rollback_error:
+                logger.error(f"回滚失败: {str(rollback_error)}")
+            if checkpointer:
+                await checkpointer.save("".join(content_parts))
+        raise
+
+
 @router.post("/{chapter_id}/generate-stream", summary="AI创作章节内容（流式）")
 async def generate_chapter_content_stream(
     chapter_id: str,
@@ -262,10 +578,13 @@ async def generate_chapter_content_stream(
     请求体参数：
     - style_id: 可选，指定使用的写作风格ID。不提供则不使用任何风格
     
-    注意：此函数不使用依赖注入的db，而是在生成器内部创建独立的数据库会话
-    以避免流式响应期间的连接泄漏问题
+    创作在后台生成任务中进行，连接断开不影响生成和保存。第一个事件为
+    {"type": "job", "job_id": ...}，断线后可通过 GET /api/jobs/{job_id}/stream
+    并带上 Last-Event-ID 请求头继续接收。同一章节已有相同风格的进行中任务时直接订阅该任务，
+    使用其他风格或同一项目上有其他生成任务（如另一章节、大纲生成）时返回409。
     """
     style_id = generate_request.style_id
+    user_id = request.state.user_id
     # 预先验证章节存在性（使用临时会话）
     async for temp_db in get_db(request):
         try:
@@ -275,251 +594,115 @@ async def generate_chapter_content_stream(
             chapter = result.scalar_one_or_none()
             if not chapter:
                 raise HTTPException(status_code=404, detail="章节不存在")
+            project_id = chapter.project_id
             
             # 检查前置条件
-            can_generate, error_msg, previous_chapters = await check_prerequisites(temp_db, chapter)
+            can_generate, error_msg = await check_prerequisites(temp_db, chapter)
             if not can_generate:
                 raise HTTPException(status_code=400, detail=error_msg)
-            
-            # 保存前置章节数据供生成器使用
-            previous_chapters_data = [
-                {
-                    'id': ch.id,
-                    'chapter_number': ch.chapter_number,
-                    'title': ch.title,
-                    'content': ch.content
-                }
-                for ch in previous_chapters
-            ]
+            # 临时会话只做了读取，提交以保存可能重建的章节完成度索引
+            await temp_db.commit()
+        
         finally:
             await temp_db.close()
         break
     
-    async def event_generator():
-        # 在生成器内部创建独立的数据库会话
-        db_session = None
-        db_committed = False
+    return await generation_jobs.start_job_response(
+        user_id,
+        "chapter",
+        lambda db: chapter_generation_generator(db, user_id, chapter_id, style_id, user_ai_service),
+        project_id=project_id,
+        target_id=chapter_id,
+        params={"style_id": style_id}
+    )
+
+
+@router.post("/{chapter_id}/resume-stream", summary="从草稿续写中断的章节（流式）")
+async def resume_chapter_content_stream(
+    chapter_id: str,
+    request: Request,
+    generate_request: ChapterGenerateRequest = ChapterGenerateRequest(),
+    user_ai_service: AIService = Depends(get_user_ai_service)
+):
+    """
+    章节创作中断后（上游超时、任务取消、服务重启等），以已保存的草稿为前文继续生成本章剩余内容
+    
+    请求体参数：
+    - style_id: 可选，指定使用的写作风格ID，应与中断前保持一致
+    
+    事件格式与 generate-stream 相同，第一个 content 事件是已保存的草稿，
+    客户端按顺序拼接所有 content 即为完整正文。同一章节已有相同风格的进行中任务时直接订阅该任务。
+    """
+    style_id = generate_request.style_id
+    user_id = request.state.user_id
+    async for temp_db in get_db(request):
         try:
-            # 创建新的数据库会话
-            async for db_session in get_db(request):
-                # 重新获取章节信息
-                chapter_result = await db_session.execute(
-                    select(Chapter).where(Chapter.id == chapter_id)
-                )
-                current_chapter = chapter_result.scalar_one_or_none()
-                if not current_chapter:
-                    yield f"data: {json.dumps({'type': 'error', 'error': '章节不存在'}, ensure_ascii=False)}\n\n"
-                    return
+            result = await temp_db.execute(
+                select(Chapter).where(Chapter.id == chapter_id)
+            )
+            chapter = result.scalar_one_or_none()
+            if not chapter:
+                raise HTTPException(status_code=404, detail="章节不存在")
+            project_id = chapter.project_id
             
-                # 获取项目信息
-                project_result = await db_session.execute(
-                    select(Project).where(Project.id == current_chapter.project_id)
-                )
-                project = project_result.scalar_one_or_none()
-                if not project:
-                    yield f"data: {json.dumps({'type': 'error', 'error': '项目不存在'}, ensure_ascii=False)}\n\n"
-                    return
-                
-                # 获取对应的大纲
-                outline_result = await db_session.execute(
-                    select(Outline)
-                    .where(Outline.project_id == current_chapter.project_id)
-                    .where(Outline.order_index == current_chapter.chapter_number)
-                    .execution_options(populate_existing=True)
-                )
-                outline = outline_result.scalar_one_or_none()
-                
-                # 获取所有大纲用于上下文
-                all_outlines_result = await db_session.execute(
-                    select(Outline)
-                    .where(Outline.project_id == current_chapter.project_id)
-                    .order_by(Outline.order_index)
-                    .execution_options(populate_existing=True)
-                )
-                all_outlines = all_outlines_result.scalars().all()
-                outlines_context = "\n".join([
-                    f"第{o.order_index}章 {o.title}: {o.content[:100]}..."
-                    for o in all_outlines
-                ])
-                
-                # 获取角色信息
-                characters_result = await db_session.execute(
-                    select(Character).where(Character.project_id == current_chapter.project_id)
-                )
-                characters = characters_result.scalars().all()
-                characters_info = "\n".join([
-                    f"- {c.name}({'组织' if c.is_organization else '角色'}, {c.role_type}): {c.personality[:100] if c.personality else ''}"
-                    for c in characters
-                ])
-                
-                # 获取写作风格
-                style_content = ""
-                if style_id:
-                    # 使用指定的风格
-                    style_result = await db_session.execute(
-                        select(WritingStyle).where(WritingStyle.id == style_id)
-                    )
-                    style = style_result.scalar_one_or_none()
-                    if style:
-                        # 验证风格是否可用：全局预设风格（project_id为NULL）或者当前项目的自定义风格
-                        if style.project_id is None or style.project_id == current_chapter.project_id:
-                            style_content = style.prompt_content or ""
-                            style_type = "全局预设" if style.project_id is None else "项目自定义"
-                            logger.info(f"使用指定风格: {style.name} ({style_type})")
-                        else:
-                            logger.warning(f"风格 {style_id} 不属于当前项目，无法使用")
-                    else:
-                        logger.warning(f"未找到风格 {style_id}")
-                else:
-                    logger.info("未指定写作风格，使用原始提示词")
-                
-                # 构建前置章节内容上下文（使用之前保存的数据）
-                previous_content = ""
-                if previous_chapters_data:
-                    recent_chapters = previous_chapters_data[-3:] if len(previous_chapters_data) > 3 else previous_chapters_data
-                    early_chapters = previous_chapters_data[:-3] if len(previous_chapters_data) > 3 else []
-                    
-                    if early_chapters:
-                        early_summary = "【前期剧情概要】\n" + "\n".join([
-                            f"第{ch['chapter_number']}章《{ch['title']}》：{ch['content'][:200] if ch['content'] else ''}..."
-                            for ch in early_chapters
-                        ])
-                        previous_content += early_summary + "\n\n"
-                    
-                    if recent_chapters:
-                        recent_content = "【最近章节完整内容】\n" + "\n\n".join([
-                            f"=== 第{ch['chapter_number']}章：{ch['title']} ===\n{ch['content']}"
-                            for ch in recent_chapters
-                        ])
-                        previous_content += recent_content
-                    
-                    logger.info(f"构建前置上下文：{len(early_chapters)}章摘要 + {len(recent_chapters)}章完整内容")
+            draft = await chapter_checkpoint.get_draft(temp_db, chapter_id)
+            if (not draft or not draft.content) and not generation_jobs.find_running_job(user_id, "chapter", chapter_id):
+                raise HTTPException(status_code=404, detail="该章节没有可续写的草稿")
             
-                # 发送开始事件
-                yield f"data: {json.dumps({'type': 'start', 'message': '开始AI创作...'}, ensure_ascii=False)}\n\n"
-                
-                # 根据是否有前置内容选择不同的提示词，并应用写作风格
-                if previous_content:
-                    prompt = prompt_service.get_chapter_generation_with_context_prompt(
-                        title=project.title,
-                        theme=project.theme or '',
-                        genre=project.genre or '',
-                        narrative_perspective=project.narrative_perspective or '第三人称',
-                        time_period=project.world_time_period or '未设定',
-                        location=project.world_location or '未设定',
-                        atmosphere=project.world_atmosphere or '未设定',
-                        rules=project.world_rules or '未设定',
-                        characters_info=characters_info or '暂无角色信息',
-                        outlines_context=outlines_context,
-                        previous_content=previous_content,
-                        chapter_number=current_chapter.chapter_number,
-                        chapter_title=current_chapter.title,
-                        chapter_outline=outline.content if outline else current_chapter.summary or '暂无大纲',
-                        style_content=style_content
-                    )
-                else:
-                    prompt = prompt_service.get_chapter_generation_prompt(
-                        title=project.title,
-                        theme=project.theme or '',
-                        genre=project.genre or '',
-                        narrative_perspective=project.narrative_perspective or '第三人称',
-                        time_period=project.world_time_period or '未设定',
-                        location=project.world_location or '未设定',
-                        atmosphere=project.world_atmosphere or '未设定',
-                        rules=project.world_rules or '未设定',
-                        characters_info=characters_info or '暂无角色信息',
-                        outlines_context=outlines_context,
-                        chapter_number=current_chapter.chapter_number,
-                        chapter_title=current_chapter.title,
-                        chapter_outline=outline.content if outline else current_chapter.summary or '暂无大纲',
-                        style_content=style_content
-                    )
-                
-                logger.info(f"开始AI流式创作章节 {chapter_id}")
-                
-                # 流式生成内容
-                full_content = ""
-                async for chunk in user_ai_service.generate_text_stream(prompt=prompt):
-                    full_content += chunk
-                    yield f"data: {json.dumps({'type': 'content', 'content': chunk}, ensure_ascii=False)}\n\n"
-                    await asyncio.sleep(0)  # 让出控制权
-                
-                # 更新章节内容到数据库
-                old_word_count = current_chapter.word_count or 0
-                current_chapter.content = full_content
-                new_word_count = len(full_content)
-                current_chapter.word_count = new_word_count
-                current_chapter.status = "completed"
-                
-                # 更新项目字数
-                project.current_words = project.current_words - old_word_count + new_word_count
-                
-                # 记录生成历史
-                history = GenerationHistory(
-                    project_id=current_chapter.project_id,
-                    chapter_id=current_chapter.id,
-                    prompt=f"创作章节: 第{current_chapter.chapter_number}章 {current_chapter.title}",
-                    generated_content=full_content[:500] if len(full_content) > 500 else full_content,
-                    model="default"
-                )
-                db_session.add(history)
-                
-                await db_session.commit()
-                db_committed = True
-                await db_session.refresh(current_chapter)
-                
-                logger.info(f"成功创作章节 {chapter_id}，共 {new_word_count} 字")
-                
-                # 发送完成事件
-                yield f"data: {json.dumps({'type': 'done', 'message': '创作完成', 'word_count': new_word_count}, ensure_ascii=False)}\n\n"
-                
-                break  # 退出async for db_session循环
+            can_generate, error_msg = await check_prerequisites(temp_db, chapter)
+            if not can_generate:
+                raise HTTPException(status_code=400, detail=error_msg)
+            await temp_db.commit()
         
-        except GeneratorExit:
-            # SSE连接断开
-            logger.warning("章节生成器被提前关闭（SSE断开）")
-            if db_session and not db_committed:
-                try:
-                    if db_session.in_transaction():
-                        await db_session.rollback()
-                        logger.info("章节生成事务已回滚（GeneratorExit）")
-                except Exception as e:
-                    logger.error(f"GeneratorExit回滚失败: {str(e)}")
-        except Exception as e:
-            logger.error(f"流式创作章节失败: {str(e)}")
-            if db_session and not db_committed:
-                try:
-                    if db_session.in_transaction():
-                        await db_session.rollback()
-                        logger.info("章节生成事务已回滚（异常）")
-                except Exception as rollback_error:
-                    logger.error(f"回滚失败: {str(rollback_error)}")
-            yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
         finally:
-            # 确保数据库会话被正确关闭
-            if db_session:
-                try:
-                    # 最后检查：确保没有未提交的事务
-                    if not db_committed and db_session.in_transaction():
-                        await db_session.rollback()
-                        logger.warning("在finally中发现未提交事务，已回滚")
-                    
-                    await db_session.close()
-                    logger.info("数据库会话已关闭")
-                except Exception as close_error:
-                    logger.error(f"关闭数据库会话失败: {str(close_error)}")
-                    # 强制关闭
-                    try:
-                        await db_session.close()
-                    except:
-                        pass
-    
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+            await temp_db.close()
+        break
+    
+    return await generation_jobs.start_job_response(
+        user_id,
+        "chapter",
+        lambda db: chapter_generation_generator(db, user_id, chapter_id, style_id, user_ai_service, resume=True),
+        project_id=project_id,
+        target_id=chapter_id,
+        params={"style_id": style_id}
     )
+
+
+@router.get("/{chapter_id}/draft", summary="获取章节创作草稿")
+async def get_chapter_draft(
+    chapter_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取创作中断时保存的草稿（章节状态为 generating 时存在）"""
+    draft = await chapter_checkpoint.get_draft(db, chapter_id)
+    if not draft:
+        raise HTTPException(status_code=404, detail="该章节没有草稿")
+    return {
+        "chapter_id": draft.chapter_id,
+        "content": draft.content,
+        "word_count": draft.word_count,
+        "updated_at": draft.updated_at
+    }
+
+
+@router.delete("/{chapter_id}/draft", summary="放弃章节创作草稿")
+async def discard_chapter_draft(
+    chapter_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """删除草稿并把章节恢复为开始创作前的状态"""
+    result = await db.execute(
+        select(Chapter).where(Chapter.id == chapter_id)
+    )
+    chapter = result.scalar_one_or_none()
+    if not chapter:
+        raise HTTPException(status_code=404, detail="章节不存在")
+    
+    if generation_jobs.find_running_job(request.state.user_id, "chapter", chapter_id):
+        raise HTTPException(status_code=400, detail="章节正在创作中，请先取消创作任务")
+    
+    if not await chapter_checkpoint.discard_draft(db, chapter):
+        raise HTTPException(status_code=404, detail="该章节没有草稿")
+    
+    return {"message": "草稿已删除", "status": chapter.status}
@@ -17,8 +17,10 @@ from app.schemas.character import (
 )
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service
+from app.services import project_context_cache
 from app.logger import get_logger
 from app.api.settings import get_user_ai_service
+from app.utils.json_repair import parse_json_tolerant
 
 router = APIRouter(prefix="/characters", tags=["角色管理"])
 logger = get_logger(__name__)
@@ -155,30 +157,8 @@ async def generate_character(
         raise HTTPException(status_code=404, detail="项目不存在")
     
     try:
-        # 获取已存在的角色列表，用于关系网络
-        existing_chars_result = await db.execute(
-            select(Character)
-            .where(Character.project_id == request.project_id)
-            .order_by(Character.created_at.desc())
-        )
-        existing_characters = existing_chars_result.scalars().all()
-        
-        # 构建现有角色信息摘要（包含组织）
-        existing_chars_info = ""
-        character_list = []
-        organization_list = []
-        
-        if existing_characters:
-            for c in existing_characters[:10]:  # 最多显示10个
-                if c.is_organization:
-                    organization_list.append(f"- {c.name} [{c.organization_type or '组织'}]")
-                else:
-                    character_list.append(f"- {c.name}（{c.role_type or '未知'}）")
-            
-            if character_list:
-                existing_chars_info += "\n已有角色：\n" + "\n".join(character_list)
-            if organization_list:
-                existing_chars_info += "\n\n已有组织：\n" + "\n".join(organization_list)
+        # 构建现有角色信息摘要（包含组织，最多10个，项目未变化时直接使用缓存）
+        existing_chars_info = await project_context_cache.get_existing_characters_summary(db, request.project_id)
         
         # 构建项目上下文信息
         project_context = f"""
@@ -261,7 +241,7 @@ async def generate_character(
         # 解析AI响应
         logger.info(f"🔍 开始解析JSON")
         try:
-            character_data = json.loads(cleaned_response)
+            character_data = parse_json_tolerant(cleaned_response, source="角色")
             logger.info(f"✅ JSON解析成功")
             logger.info(f"  - 解析后的字段：{list(character_data.keys())}")
         except json.JSONDecodeError as e:
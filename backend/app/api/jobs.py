@@ -0,0 +1,92 @@
+"""后台生成任务API"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import Optional
+
+from app.database import get_db
+from app.models.generation_job import GenerationJob
+from app.services import generation_jobs
+from app.logger import get_logger
+
+router = APIRouter(prefix="/jobs", tags=["生成任务"])
+logger = get_logger(__name__)
+
+
+@router.get("", summary="获取生成任务列表")
+async def list_jobs(
+    project_id: Optional[str] = Query(None, description="只返回该项目的任务"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """按创建时间倒序返回最近的生成任务"""
+    query = select(GenerationJob.id).order_by(GenerationJob.created_at.desc()).limit(limit)
+    if project_id:
+        query = query.where(GenerationJob.project_id == project_id)
+    result = await db.execute(query)
+    
+    jobs = []
+    for job_id in result.scalars().all():
+        record = await generation_jobs.get_job_record(db, job_id)
+        if record:
+            jobs.append(record)
+    return {"total": len(jobs), "items": jobs}
+
+
+@router.get("/{job_id}", summary="获取生成任务状态")
+async def get_job_status(
+    job_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    返回任务状态：running/completed/failed/cancelled/interrupted
+    
+    replayable 为 true 时可以通过 /jobs/{job_id}/stream 重放事件
+    """
+    record = await generation_jobs.get_job_record(db, job_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return record
+
+
+@router.get("/{job_id}/stream", summary="订阅生成任务事件（断线续传）")
+async def stream_job_events(
+    job_id: str,
+    request: Request,
+    last_event_id: Optional[int] = Query(None, description="已收到的最后一个事件ID，也可以用 Last-Event-ID 请求头"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    从 Last-Event-ID 之后继续接收任务事件；任务仍在运行时持续推送，已结束时重放剩余事件后关闭
+    
+    每个事件带有 id 字段，客户端记录最后收到的ID用于下次重连
+    """
+    if last_event_id is None:
+        try:
+            last_event_id = int(last_event_id_header) if last_event_id_header else 0
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID 格式错误")
+    
+    job = generation_jobs.get_job(job_id, request.state.user_id)
+    if job is None:
+        record = await generation_jobs.get_job_record(db, job_id)
+        if not record:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        raise HTTPException(status_code=410, detail=f"任务已结束且事件已过期（状态: {record['status']}）")
+    
+    return generation_jobs.job_sse_response(job, last_event_id)
+
+
+@router.post("/{job_id}/cancel", summary="取消生成任务")
+async def cancel_job(
+    job_id: str,
+    request: Request
+):
+    """取消运行中的任务，未提交的生成结果会被回滚"""
+    job = generation_jobs.get_job(job_id, request.state.user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已结束")
+    if not generation_jobs.cancel_job(job):
+        raise HTTPException(status_code=400, detail=f"任务已结束（状态: {job.status}）")
+    return {"message": "任务取消中", "job_id": job_id}
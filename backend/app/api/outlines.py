@@ -1,14 +1,16 @@
 """大纲管理API"""
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, delete
-from typing import List, AsyncGenerator, Dict, Any
+from typing import List, AsyncGenerator, Dict, Any, Optional, Tuple
+import asyncio
 import json
 
 from app.database import get_db
 from app.models.outline import Outline
 from app.models.project import Project
 from app.models.chapter import Chapter
+from app.models.chapter_summary import ChapterSummary
 from app.models.character import Character
 from app.models.generation_history import GenerationHistory
 from app.schemas.outline import (
@@ -21,9 +23,14 @@ from app.schemas.outline import (
 )
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service
+from app.services import project_context_cache, generation_jobs
+from app.services.context_assembler import ContextSection, fit_prompt, prompt_token_budget
+from app.services.chapter_summary_service import invalidate_summaries_from
 from app.logger import get_logger
+from app.config import settings as app_settings
 from app.api.settings import get_user_ai_service
-from app.utils.sse_response import SSEResponse, create_sse_response
+from app.utils.sse_response import SSEResponse
+from app.utils.json_repair import parse_json_tolerant
 
 router = APIRouter(prefix="/outlines", tags=["大纲管理"])
 logger = get_logger(__name__)
@@ -209,7 +216,14 @@ async def delete_outline(
     project_id = outline.project_id
     deleted_order = outline.order_index
     
-    # 删除对应的章节
+    # 删除对应的章节及其摘要（SQLite未启用外键，级联删除不会生效）
+    deleted_chapter_ids = select(Chapter.id).where(
+        Chapter.project_id == project_id,
+        Chapter.chapter_number == deleted_order
+    )
+    await db.execute(
+        delete(ChapterSummary).where(ChapterSummary.chapter_id.in_(deleted_chapter_ids))
+    )
     await db.execute(
         delete(Chapter).where(
             Chapter.project_id == project_id,
@@ -244,6 +258,9 @@ async def delete_outline(
         if chapter:
             chapter.chapter_number = old_order - 1
     
+    # 之后的章节序号整体前移，从被删除章节起的剧情弧/卷汇总都已不对应原来的章节
+    await invalidate_summaries_from(db, project_id, deleted_order)
+    
     await db.commit()
     
     return {"message": "大纲删除成功"}
@@ -308,6 +325,17 @@ async def reorder_outlines(
             else:
                 logger.warning(f"章节 {old_order} 不存在，跳过")
         
+        # 序号变化的章节中最小序号起的剧情弧/卷汇总都已不对应原来的章节
+        moved = [
+            (outline.project_id, min(old_order, new_order))
+            for outline, _, old_order, new_order in outline_chapter_map.values()
+            if old_order != new_order
+        ]
+        for project_id in {pid for pid, _ in moved}:
+            await invalidate_summaries_from(
+                db, project_id, min(number for pid, number in moved if pid == project_id)
+            )
+        
         # 第三步：一次性提交所有更改
         await db.commit()
         
@@ -404,18 +432,13 @@ async def _generate_new_outline(
     logger.info(f"全新生成大纲 - 项目: {project.id}, keep_existing: {request.keep_existing}")
     
     # 获取角色信息
-    characters_result = await db.execute(
-        select(Character).where(Character.project_id == project.id)
-    )
-    characters = characters_result.scalars().all()
-    characters_info = "\n".join([
-        f"- {char.name} ({'组织' if char.is_organization else '角色'}, {char.role_type}): "
-        f"{char.personality[:100] if char.personality else '暂无描述'}"
-        for char in characters
-    ])
-    
-    # 使用完整提示词
-    prompt = prompt_service.get_complete_outline_prompt(
+    characters_info = await project_context_cache.get_characters_info(db, project.id)
+    
+    # 使用完整提示词（角色和世界规则按所用模型的token预算装配）
+    prompt = build_complete_outline_prompt(
+        prompt_token_budget(request.model or user_ai_service.default_model, user_ai_service.default_max_tokens),
+        characters_info=characters_info,
+        rules=project.world_rules,
         title=project.title,
         theme=request.theme or project.theme or "未设定",
         genre=request.genre or project.genre or "通用",
@@ -425,8 +448,6 @@ async def _generate_new_outline(
         time_period=project.world_time_period or "未设定",
         location=project.world_location or "未设定",
         atmosphere=project.world_atmosphere or "未设定",
-        rules=project.world_rules or "未设定",
-        characters_info=characters_info or "暂无角色信息",
         requirements=request.requirements or ""
     )
     
@@ -483,27 +504,108 @@ async def _continue_outline(
     """续写大纲 - 分批生成，每批5章"""
     logger.info(f"续写大纲 - 项目: {project.id}, 已有: {len(existing_outlines)} 章")
     
-    # 分析已有大纲
-    current_chapter_count = len(existing_outlines)
-    last_chapter_number = existing_outlines[-1].order_index
+    options = {
+        "chapter_count": request.chapter_count,
+        "theme": request.theme or project.theme or "未设定",
+        "genre": request.genre or project.genre or "通用",
+        "narrative_perspective": request.narrative_perspective,
+        "plot_stage": request.plot_stage,
+        "story_direction": request.story_direction or "自然延续",
+        "requirements": request.requirements or "",
+        "provider": request.provider,
+        "model": request.model,
+        "arc_parallel": request.arc_parallel
+    }
+    
+    all_new_outlines = []
+    async for _ in _run_outline_continuation(
+        project, existing_outlines, db, user_ai_service, options, all_new_outlines, history_label="批次"
+    ):
+        pass
     
-    # 计算需要生成的总章数和批次
-    total_chapters_to_generate = request.chapter_count
+    # 返回所有大纲（包括旧的和新的）
+    final_result = await db.execute(
+        select(Outline)
+        .where(Outline.project_id == project.id)
+        .order_by(Outline.order_index)
+    )
+    all_outlines = final_result.scalars().all()
+    
+    logger.info(f"续写完成 - 新增 {len(all_new_outlines)} 章，总计 {len(all_outlines)} 章")
+    return OutlineListResponse(total=len(all_outlines), items=all_outlines)
+
+
+def build_complete_outline_prompt(budget: int, characters_info: str, rules: str, **kwargs) -> str:
+    """
+    构建完整大纲提示词，角色列表和世界规则按 budget 装配，超出时截断
+    
+    kwargs 为 prompt_service.get_complete_outline_prompt 的其余参数
+    """
+    prompt, _ = fit_prompt(
+        lambda characters, world: prompt_service.get_complete_outline_prompt(
+            characters_info=characters or "暂无角色信息",
+            rules=world or "未设定",
+            **kwargs
+        ),
+        [
+            ContextSection("characters", characters_info, priority=0, max_share=0.6, strategy="lines"),
+            ContextSection("world", rules, priority=1, max_share=0.4, strategy="head"),
+        ],
+        budget,
+        label="大纲提示词"
+    )
+    return prompt
+
+
+def _outline_entry(outline: Outline) -> Dict[str, Any]:
+    """大纲的内存快照（续写时构建提示词，避免每批重新查询）"""
+    return {
+        "order_index": outline.order_index,
+        "title": outline.title,
+        "content": outline.content
+    }
+
+
+async def _run_outline_continuation(
+    project: Project,
+    existing_outlines: List[Outline],
+    db: AsyncSession,
+    user_ai_service: AIService,
+    options: Dict[str, Any],
+    new_outlines: List[Outline],
+    history_label: str = "批次"
+) -> AsyncGenerator[str, None]:
+    """
+    大纲续写引擎 - 逐步产出SSE进度消息，新生成的大纲追加到 new_outlines
+    
+    - 流水线模式（默认）：大纲列表保存在内存中，解析完一批后立即构建下一批提示词并发起AI调用，
+      与本批的保存（一次批量插入+提交）并行进行
+    - 弧段并行模式（options["arc_parallel"]）：先用一次调用生成分段剧情规划，
+      再分两轮并发生成互不相邻的章节段（先奇数段、后偶数段），第二轮可参考两侧已生成的章节
+    """
+    chapter_count = int(options["chapter_count"])
     batch_size = 5  # 每批生成5章
-    total_batches = (total_chapters_to_generate + batch_size - 1) // batch_size
+    total_batches = (chapter_count + batch_size - 1) // batch_size
     
-    logger.info(f"分批生成计划: 总共{total_chapters_to_generate}章，分{total_batches}批，每批{batch_size}章")
+    # 预先划分各批次的章节范围 [(起始章节, 章节数)]
+    ranges = []
+    next_start = existing_outlines[-1].order_index + 1
+    remaining = chapter_count
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        ranges.append((next_start, size))
+        next_start += size
+        remaining -= size
     
-    # 获取角色信息（所有批次共用）
-    characters_result = await db.execute(
-        select(Character).where(Character.project_id == project.id)
+    logger.info(f"分批生成计划: 总共{chapter_count}章，分{total_batches}批，每批{batch_size}章")
+    yield await SSEResponse.send_progress(
+        f"分批生成计划: 总共{chapter_count}章，分{total_batches}批，每批{batch_size}章",
+        25
     )
-    characters = characters_result.scalars().all()
-    characters_info = "\n".join([
-        f"- {char.name} ({'组织' if char.is_organization else '角色'}, {char.role_type}): "
-        f"{char.personality[:100] if char.personality else '暂无描述'}"
-        for char in characters
-    ])
+    
+    # 获取角色信息（所有批次共用）
+    characters_info = await project_context_cache.get_characters_info(db, project.id)
+    budget = prompt_token_budget(options["model"] or user_ai_service.default_model, user_ai_service.default_max_tokens)
     
     # 情节阶段指导
     stage_instructions = {
@@ -511,123 +613,253 @@ async def _continue_outline(
         "climax": "进入故事高潮，矛盾激化，关键冲突爆发",
         "ending": "解决主要冲突，收束伏笔，给出结局"
     }
-    stage_instruction = stage_instructions.get(request.plot_stage, "")
+    stage_instruction = stage_instructions.get(options["plot_stage"], "")
     
-    # 批量生成
-    all_new_outlines = []
-    current_start_chapter = last_chapter_number + 1
+    # 内存中的大纲列表 {章节编号: 快照}
+    entries = {o.order_index: _outline_entry(o) for o in existing_outlines}
     
-    for batch_num in range(total_batches):
-        # 计算当前批次的章节数
-        remaining_chapters = total_chapters_to_generate - len(all_new_outlines)
-        current_batch_size = min(batch_size, remaining_chapters)
-        
-        logger.info(f"开始生成第{batch_num + 1}/{total_batches}批，章节范围: {current_start_chapter}-{current_start_chapter + current_batch_size - 1}")
-        
-        # 获取最新的大纲列表（包括之前批次生成的）
-        latest_result = await db.execute(
-            select(Outline)
-            .where(Outline.project_id == project.id)
-            .order_by(Outline.order_index)
-        )
-        latest_outlines = latest_result.scalars().all()
-        
-        # 获取最近2章的剧情
-        recent_outlines = latest_outlines[-2:] if len(latest_outlines) >= 2 else latest_outlines
+    def build_context(start_chapter: int):
+        ordered = [entries[k] for k in sorted(entries)]
+        preceding = [e for e in ordered if e["order_index"] < start_chapter]
         recent_plot = "\n".join([
-            f"第{o.order_index}章《{o.title}》: {o.content}"
-            for o in recent_outlines
+            f"第{e['order_index']}章《{e['title']}》: {e['content']}"
+            for e in preceding[-2:]
         ])
-        
-        # 全部章节概览
         all_chapters_brief = "\n".join([
-            f"第{o.order_index}章: {o.title}"
-            for o in latest_outlines
+            f"第{e['order_index']}章: {e['title']}"
+            for e in ordered
         ])
-        
-        # 使用标准续写提示词模板
-        prompt = prompt_service.get_outline_continue_prompt(
-            title=project.title,
-            theme=request.theme or project.theme or "未设定",
-            genre=request.genre or project.genre or "通用",
-            narrative_perspective=request.narrative_perspective,
-            chapter_count=current_batch_size,  # 当前批次的章节数
-            time_period=project.world_time_period or "未设定",
-            location=project.world_location or "未设定",
-            atmosphere=project.world_atmosphere or "未设定",
-            rules=project.world_rules or "未设定",
-            characters_info=characters_info or "暂无角色信息",
-            current_chapter_count=len(latest_outlines),
-            all_chapters_brief=all_chapters_brief,
-            recent_plot=recent_plot,
-            plot_stage_instruction=stage_instruction,
-            start_chapter=current_start_chapter,
-            story_direction=request.story_direction or "自然延续",
-            requirements=request.requirements or ""
+        return len(ordered), all_chapters_brief, recent_plot
+    
+    def context_sections(all_chapters_brief: str, recent_plot: str) -> List[ContextSection]:
+        """
+        续写提示词的上下文段落：最近剧情优先，章节列表优先保留最近的章节；
+        角色和世界规则位于可缓存前缀中，按总预算的比例截断，各批次的前缀保持不变
+        """
+        return [
+            ContextSection("recent", recent_plot, priority=0, max_share=0.2, strategy="tail"),
+            ContextSection("characters", characters_info, priority=1, max_share=0.3, strategy="lines", stable=True),
+            ContextSection("chapters_brief", all_chapters_brief, priority=2, max_share=0.4, strategy="lines",
+                           focus=all_chapters_brief.count("\n")),
+            ContextSection("world", project.world_rules or "", priority=3, max_share=0.1, strategy="head", stable=True),
+        ]
+    
+    def build_prompt(start_chapter: int, size: int, extra_requirements: str = "") -> Tuple[str, str]:
+        """返回 (可缓存的项目资料前缀, 本批续写内容)，各批次的前缀相同"""
+        current_chapter_count, all_chapters_brief, recent_plot = build_context(start_chapter)
+        parts, _ = fit_prompt(
+            lambda recent, characters, chapters_brief, world: prompt_service.get_outline_continue_prompt_parts(
+                title=project.title,
+                theme=options["theme"],
+                genre=options["genre"],
+                narrative_perspective=options["narrative_perspective"],
+                chapter_count=size,
+                time_period=project.world_time_period or "未设定",
+                location=project.world_location or "未设定",
+                atmosphere=project.world_atmosphere or "未设定",
+                rules=world or "未设定",
+                characters_info=characters or "暂无角色信息",
+                current_chapter_count=current_chapter_count,
+                all_chapters_brief=chapters_brief,
+                recent_plot=recent,
+                plot_stage_instruction=stage_instruction,
+                start_chapter=start_chapter,
+                story_direction=options["story_direction"],
+                requirements=options["requirements"] + extra_requirements
+            ),
+            context_sections(all_chapters_brief, recent_plot),
+            budget,
+            label=f"第{start_chapter}章起的大纲续写提示词"
         )
-        
-        # 调用AI生成当前批次
-        logger.info(f"正在调用AI生成第{batch_num + 1}批...")
-        ai_response = await user_ai_service.generate_text(
+        return parts
+    
+    async def call_ai(prompt: str, prompt_prefix: Optional[str] = None) -> str:
+        return await user_ai_service.generate_text(
             prompt=prompt,
-            provider=request.provider,
-            model=request.model
+            prompt_prefix=prompt_prefix,
+            provider=options["provider"],
+            model=options["model"]
         )
-        
-        # 解析响应
+    
+    async def stage_batch(batch_num: int, prompt: str, ai_response: str, start_chapter: int,
+                          size: int, force_numbering: bool = False) -> List[Outline]:
+        """解析一批结果并加入会话（不提交），同步更新内存列表"""
         outline_data = _parse_ai_response(ai_response)
+        if force_numbering:
+            outline_data = outline_data[:size]
+            for i, chapter_data in enumerate(outline_data):
+                if isinstance(chapter_data, dict):
+                    chapter_data["chapter_number"] = start_chapter + i
         
-        # 保存当前批次的大纲
         batch_outlines = await _save_outlines(
-            project.id, outline_data, db, start_index=current_start_chapter
+            project.id, outline_data, db, start_index=start_chapter
         )
+        for outline in batch_outlines:
+            entries[outline.order_index] = _outline_entry(outline)
         
-        # 记录历史
-        history = GenerationHistory(
+        db.add(GenerationHistory(
             project_id=project.id,
-            prompt=f"[批次{batch_num + 1}/{total_batches}] {str(prompt)[:500]}",
+            prompt=f"[{history_label}{batch_num + 1}/{total_batches}] {str(prompt)[:500]}",
             generated_content=ai_response,
-            model=request.model or "default"
+            model=options["model"] or "default"
+        ))
+        new_outlines.extend(batch_outlines)
+        return batch_outlines
+    
+    # 弧段并行模式：先规划分段剧情
+    arcs = None
+    if options.get("arc_parallel") and total_batches > 1:
+        yield await SSEResponse.send_progress("🗺️ 规划分段剧情...", 27)
+        segments = [(start, start + size - 1) for start, size in ranges]
+        current_chapter_count, all_chapters_brief, recent_plot = build_context(ranges[0][0])
+        # 分段规划提示词不含世界规则，其余段落与续写相同
+        arc_prompt, _ = fit_prompt(
+            lambda recent, characters, chapters_brief: prompt_service.get_outline_arc_plan_prompt(
+                title=project.title,
+                theme=options["theme"],
+                genre=options["genre"],
+                narrative_perspective=options["narrative_perspective"],
+                characters_info=characters or "暂无角色信息",
+                current_chapter_count=current_chapter_count,
+                all_chapters_brief=chapters_brief,
+                recent_plot=recent,
+                plot_stage_instruction=stage_instruction,
+                segments=segments,
+                story_direction=options["story_direction"],
+                requirements=options["requirements"]
+            ),
+            context_sections(all_chapters_brief, recent_plot)[:3],
+            budget,
+            label="分段剧情规划提示词"
         )
-        db.add(history)
-        
-        # 提交当前批次
-        await db.commit()
-        
-        for outline in batch_outlines:
-            await db.refresh(outline)
-        
-        all_new_outlines.extend(batch_outlines)
-        current_start_chapter += current_batch_size
-        
-        logger.info(f"第{batch_num + 1}批生成完成，本批生成{len(batch_outlines)}章")
+        try:
+            arcs = _parse_arc_plan(await call_ai(arc_prompt), len(segments))
+        except Exception as e:
+            logger.warning(f"分段剧情规划失败: {e}")
+        if not arcs:
+            logger.warning("分段剧情规划不可用，回退到流水线续写")
+            yield await SSEResponse.send_progress("⚠️ 分段规划失败，改为逐批续写", 28, "warning")
     
-    # 返回所有大纲（包括旧的和新的）
-    final_result = await db.execute(
-        select(Outline)
-        .where(Outline.project_id == project.id)
-        .order_by(Outline.order_index)
-    )
-    all_outlines = final_result.scalars().all()
+    if arcs:
+        arc_overview = "\n".join(
+            f"第{start}-{end}章: {arc}" for (start, end), arc in zip(segments, arcs)
+        )
+        concurrency = max(1, app_settings.outline_arc_concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def generate_segment(batch_num: int):
+            start_chapter, size = ranges[batch_num]
+            end_chapter = start_chapter + size - 1
+            extra = f"\n\n【整体剧情规划】\n{arc_overview}\n\n【本批剧情走向】第{start_chapter}-{end_chapter}章: {arcs[batch_num]}"
+            following = entries.get(end_chapter + 1)
+            if following:
+                extra += (
+                    f"\n\n【后续章节衔接】第{end_chapter + 1}章《{following['title']}》已生成: {following['content']}"
+                    f"\n本批最后一章必须能自然衔接到该章"
+                )
+            prompt_prefix, prompt = build_prompt(start_chapter, size, extra)
+            async with semaphore:
+                ai_response = await call_ai(prompt, prompt_prefix)
+            return batch_num, prompt, ai_response
+        
+        # 两轮生成：同一轮内的章节段互不相邻，可并发生成
+        completed = 0
+        for wave in (range(0, total_batches, 2), range(1, total_batches, 2)):
+            wave_tasks = [asyncio.create_task(generate_segment(batch_num)) for batch_num in wave]
+            yield await SSEResponse.send_progress(
+                f"🤖 并行生成{len(wave_tasks)}个章节段（并发{concurrency}）...",
+                30 + completed * 55 // total_batches
+            )
+            try:
+                for next_done in asyncio.as_completed(wave_tasks):
+                    batch_num, prompt, ai_response = await next_done
+                    start_chapter, size = ranges[batch_num]
+                    batch_outlines = await stage_batch(
+                        batch_num, prompt, ai_response, start_chapter, size, force_numbering=True
+                    )
+                    completed += 1
+                    yield await SSEResponse.send_progress(
+                        f"✅ 第{batch_num + 1}/{total_batches}批完成: 第{start_chapter}-{start_chapter + size - 1}章，本批{len(batch_outlines)}章",
+                        30 + completed * 55 // total_batches
+                    )
+                    logger.info(f"弧段并行: 第{batch_num + 1}批生成完成，本批生成{len(batch_outlines)}章")
+            finally:
+                for task in wave_tasks:
+                    if not task.done():
+                        task.cancel()
+            
+            # 每轮一次提交
+            await db.commit()
+        return
     
-    logger.info(f"续写完成 - 共{total_batches}批，新增 {len(all_new_outlines)} 章，总计 {len(all_outlines)} 章")
-    return OutlineListResponse(total=len(all_outlines), items=all_outlines)
+    # 流水线模式
+    ai_task = None
+    try:
+        prompt = None
+        for batch_num, (start_chapter, size) in enumerate(ranges):
+            batch_progress = 25 + (batch_num * 60 // total_batches)
+            
+            yield await SSEResponse.send_progress(
+                f"📝 第{batch_num + 1}/{total_batches}批: 生成第{start_chapter}-{start_chapter + size - 1}章",
+                batch_progress
+            )
+            
+            if ai_task is None:
+                prompt_prefix, prompt = build_prompt(start_chapter, size)
+                ai_task = asyncio.create_task(call_ai(prompt, prompt_prefix))
+            
+            yield await SSEResponse.send_progress(
+                f"🤖 等待AI生成第{batch_num + 1}批...",
+                batch_progress + 5
+            )
+            ai_response = await ai_task
+            ai_task = None
+            
+            yield await SSEResponse.send_progress(
+                f"✅ 第{batch_num + 1}批AI生成完成，正在解析...",
+                batch_progress + 10
+            )
+            
+            batch_outlines = await stage_batch(batch_num, prompt, ai_response, start_chapter, size)
+            
+            # 下一批提示词只依赖内存中的大纲列表，先发起AI调用，再提交本批
+            if batch_num + 1 < total_batches:
+                next_start, next_size = ranges[batch_num + 1]
+                prompt_prefix, prompt = build_prompt(next_start, next_size)
+                ai_task = asyncio.create_task(call_ai(prompt, prompt_prefix))
+            
+            # 提交当前批次（一次批量插入）
+            await db.commit()
+            
+            yield await SSEResponse.send_progress(
+                f"💾 第{batch_num + 1}批保存成功！本批生成{len(batch_outlines)}章，累计新增{len(new_outlines)}章",
+                batch_progress + 15
+            )
+            logger.info(f"第{batch_num + 1}批生成完成，本批生成{len(batch_outlines)}章")
+    finally:
+        if ai_task is not None and not ai_task.done():
+            ai_task.cancel()
+
+
+def _parse_arc_plan(ai_response: str, segment_count: int) -> Optional[List[str]]:
+    """解析分段剧情规划，段数不足或内容缺失时返回None"""
+    plan = parse_json_tolerant(ai_response, source="分段规划")
+    if not isinstance(plan, list) or len(plan) < segment_count:
+        return None
+    arcs = []
+    for segment in plan[:segment_count]:
+        arc = segment.get("arc") if isinstance(segment, dict) else None
+        if not isinstance(arc, str) or not arc.strip():
+            return None
+        arcs.append(arc.strip())
+    return arcs
 
 
 def _parse_ai_response(ai_response: str) -> list:
     """解析AI响应为章节数据列表"""
     try:
-        # 清理响应文本
-        cleaned_text = ai_response.strip()
-        if cleaned_text.startswith('```json'):
-            cleaned_text = cleaned_text[7:]
-        if cleaned_text.startswith('```'):
-            cleaned_text = cleaned_text[3:]
-        if cleaned_text.endswith('```'):
-            cleaned_text = cleaned_text[:-3]
-        cleaned_text = cleaned_text.strip()
-        
-        outline_data = json.loads(cleaned_text)
+        # 容错解析（本地修复常见格式问题）
+        outline_data = parse_json_tolerant(ai_response, source="大纲")
         
         # 确保是列表格式
         if not isinstance(outline_data, list):
@@ -655,8 +887,9 @@ async def _save_outlines(
     db: AsyncSession,
     start_index: int = 1
 ) -> List[Outline]:
-    """保存大纲到数据库"""
+    """保存大纲到数据库（加入会话，由调用方提交）"""
     outlines = []
+    chapters = []
     
     for idx, chapter_data in enumerate(outline_data):
         order_idx = chapter_data.get("chapter_number", start_index + idx)
@@ -679,19 +912,20 @@ async def _save_outlines(
             structure=json.dumps(chapter_data, ensure_ascii=False),
             order_index=order_idx
         )
-        db.add(outline)
         outlines.append(outline)
         
         # 同步创建章节记录
-        chapter = Chapter(
+        chapters.append(Chapter(
             project_id=project_id,
             chapter_number=order_idx,
             title=title,
             summary=content[:500] if len(content) > 500 else content,
             status="draft"
-        )
-        db.add(chapter)
+        ))
     
+    # 一次性加入会话，提交时批量插入
+    db.add_all(outlines)
+    db.add_all(chapters)
     return outlines
 
 
@@ -722,19 +956,14 @@ async def new_outline_generator(
         yield await SSEResponse.send_progress(f"准备生成{chapter_count}章大纲...", 15)
         
         # 获取角色信息
-        characters_result = await db.execute(
-            select(Character).where(Character.project_id == project_id)
-        )
-        characters = characters_result.scalars().all()
-        characters_info = "\n".join([
-            f"- {char.name} ({'组织' if char.is_organization else '角色'}, {char.role_type}): "
-            f"{char.personality[:100] if char.personality else '暂无描述'}"
-            for char in characters
-        ])
+        characters_info = await project_context_cache.get_characters_info(db, project_id)
         
         # 使用完整提示词
         yield await SSEResponse.send_progress("准备AI提示词...", 20)
-        prompt = prompt_service.get_complete_outline_prompt(
+        prompt = build_complete_outline_prompt(
+            prompt_token_budget(data.get("model") or user_ai_service.default_model, user_ai_service.default_max_tokens),
+            characters_info=characters_info,
+            rules=project.world_rules,
             title=project.title,
             theme=data.get("theme") or project.theme or "未设定",
             genre=data.get("genre") or project.genre or "通用",
@@ -744,8 +973,6 @@ async def new_outline_generator(
             time_period=project.world_time_period or "未设定",
             location=project.world_location or "未设定",
             atmosphere=project.world_atmosphere or "未设定",
-            rules=project.world_rules or "未设定",
-            characters_info=characters_info or "暂无角色信息",
             requirements=data.get("requirements") or ""
         )
         
@@ -869,147 +1096,36 @@ async def continue_outline_generator(
             return
         
         current_chapter_count = len(existing_outlines)
-        last_chapter_number = existing_outlines[-1].order_index
         
         yield await SSEResponse.send_progress(
             f"当前已有{str(current_chapter_count)}章，将续写{str(total_chapters_to_generate)}章",
             20
         )
         
-        # 获取角色信息
-        characters_result = await db.execute(
-            select(Character).where(Character.project_id == project_id)
-        )
-        characters = characters_result.scalars().all()
-        characters_info = "\n".join([
-            f"- {char.name} ({'组织' if char.is_organization else '角色'}, {char.role_type}): "
-            f"{char.personality[:100] if char.personality else '暂无描述'}"
-            for char in characters
-        ])
-
-        # 分批配置
-        batch_size = 5
-        total_batches = (total_chapters_to_generate + batch_size - 1) // batch_size
-        yield await SSEResponse.send_progress(
-            f"分批生成计划: 总共{str(total_chapters_to_generate)}章，分{str(total_batches)}批，每批{str(batch_size)}章",
-            25
-        )
-        
-        # 情节阶段指导
-        stage_instructions = {
-            "development": "继续展开情节，深化角色关系，推进主线冲突",
-            "climax": "进入故事高潮，矛盾激化，关键冲突爆发",
-            "ending": "解决主要冲突，收束伏笔，给出结局"
+        options = {
+            "chapter_count": total_chapters_to_generate,
+            "theme": data.get("theme") or project.theme or "未设定",
+            "genre": data.get("genre") or project.genre or "通用",
+            "narrative_perspective": data.get("narrative_perspective") or project.narrative_perspective or "第三人称",
+            "plot_stage": data.get("plot_stage", "development"),
+            "story_direction": data.get("story_direction", "自然延续"),
+            "requirements": data.get("requirements", ""),
+            "provider": data.get("provider"),
+            "model": data.get("model"),
+            "arc_parallel": bool(data.get("arc_parallel", False))
         }
-        stage_instruction = stage_instructions.get(data.get("plot_stage", "development"), "")
+        total_batches = (total_chapters_to_generate + 4) // 5  # 每批5章
         
         # 批量生成
         all_new_outlines = []
-        current_start_chapter = last_chapter_number + 1
-
-        for batch_num in range(total_batches):
-            # 计算当前批次的章节数
-            remaining_chapters = int(total_chapters_to_generate) - len(all_new_outlines)
-            current_batch_size = min(batch_size, remaining_chapters)
-            
-            batch_progress = 25 + (batch_num * 60 // total_batches)
-            
-            yield await SSEResponse.send_progress(
-                f"📝 第{str(batch_num + 1)}/{str(total_batches)}批: 生成第{str(current_start_chapter)}-{str(current_start_chapter + current_batch_size - 1)}章",
-                batch_progress
-            )
-            
-            # 获取最新的大纲列表（包括之前批次生成的）
-            latest_result = await db.execute(
-                select(Outline)
-                .where(Outline.project_id == project_id)
-                .order_by(Outline.order_index)
-            )
-            latest_outlines = latest_result.scalars().all()
-            
-            # 获取最近2章的剧情
-            recent_outlines = latest_outlines[-2:] if len(latest_outlines) >= 2 else latest_outlines
-            recent_plot = "\n".join([
-                f"第{o.order_index}章《{o.title}》: {o.content}"
-                for o in recent_outlines
-            ])
-            
-            # 全部章节概览
-            all_chapters_brief = "\n".join([
-                f"第{o.order_index}章: {o.title}"
-                for o in latest_outlines
-            ])
-            
-            yield await SSEResponse.send_progress(
-                f"🤖 调用AI生成第{str(batch_num + 1)}批...",
-                batch_progress + 5
-            )
-            
-            # 使用标准续写提示词模板
-            prompt = prompt_service.get_outline_continue_prompt(
-                title=project.title,
-                theme=data.get("theme") or project.theme or "未设定",
-                genre=data.get("genre") or project.genre or "通用",
-                narrative_perspective=data.get("narrative_perspective") or project.narrative_perspective or "第三人称",
-                chapter_count=current_batch_size,
-                time_period=project.world_time_period or "未设定",
-                location=project.world_location or "未设定",
-                atmosphere=project.world_atmosphere or "未设定",
-                rules=project.world_rules or "未设定",
-                characters_info=characters_info or "暂无角色信息",
-                current_chapter_count=len(latest_outlines),
-                all_chapters_brief=all_chapters_brief,
-                recent_plot=recent_plot,
-                plot_stage_instruction=stage_instruction,
-                start_chapter=current_start_chapter,
-                story_direction=data.get("story_direction", "自然延续"),
-                requirements=data.get("requirements", "")
-            )
-            
-            # 调用AI生成当前批次
-            ai_response = await user_ai_service.generate_text(
-                prompt=prompt,
-                provider=data.get("provider"),
-                model=data.get("model")
-            )
-            
-            yield await SSEResponse.send_progress(
-                f"✅ 第{str(batch_num + 1)}批AI生成完成，正在解析...",
-                batch_progress + 10
-            )
-            
-            # 解析响应
-            outline_data = _parse_ai_response(ai_response)
-            
-            # 保存当前批次的大纲
-            batch_outlines = await _save_outlines(
-                project_id, outline_data, db, start_index=current_start_chapter
-            )
-            
-            # 记录历史
-            history = GenerationHistory(
-                project_id=project_id,
-                prompt=f"[续写批次{batch_num + 1}/{total_batches}] {str(prompt)[:500]}",
-                generated_content=ai_response,
-                model=data.get("model") or "default"
-            )
-            db.add(history)
-            
-            # 提交当前批次
-            await db.commit()
-            
-            for outline in batch_outlines:
-                await db.refresh(outline)
-            
-            all_new_outlines.extend(batch_outlines)
-            current_start_chapter += current_batch_size
-            
-            yield await SSEResponse.send_progress(
-                f"💾 第{str(batch_num + 1)}批保存成功！本批生成{str(len(batch_outlines))}章，累计新增{str(len(all_new_outlines))}章",
-                batch_progress + 15
-            )
-            
-            logger.info(f"第{str(batch_num + 1)}批生成完成，本批生成{str(len(batch_outlines))}章")
+        continuation = _run_outline_continuation(
+            project, existing_outlines, db, user_ai_service, options, all_new_outlines, history_label="续写批次"
+        )
+        try:
+            async for message in continuation:
+                yield message
+        finally:
+            await continuation.aclose()
         
         db_committed = True
         
@@ -1062,12 +1178,16 @@ async def continue_outline_generator(
 @router.post("/generate-stream", summary="AI生成/续写大纲(SSE流式)")
 async def generate_outline_stream(
     data: Dict[str, Any],
+    request: Request,
     db: AsyncSession = Depends(get_db),
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
     """
     使用SSE流式生成或续写小说大纲，实时推送批次进度
     
+    生成在后台任务中进行，断线后可通过 /api/jobs/{job_id}/stream 继续接收；
+    重复提交相同请求时订阅同一任务，同一项目上有其他生成任务时返回409
+    
     支持模式：
     - auto: 自动判断（无大纲→新建，有大纲→续写）
     - new: 全新生成
@@ -1113,16 +1233,25 @@ async def generate_outline_stream(
     
     # 根据模式选择生成器
     if mode == "new":
-        return create_sse_response(new_outline_generator(data, db, user_ai_service))
+        generator = new_outline_generator
     elif mode == "continue":
         if not existing_outlines:
             raise HTTPException(
                 status_code=400,
                 detail="续写模式需要已有大纲，当前项目没有大纲"
             )
-        return create_sse_response(continue_outline_generator(data, db, user_ai_service))
+        generator = continue_outline_generator
     else:
         raise HTTPException(
             status_code=400,
             detail=f"不支持的模式: {mode}"
-        )
\ No newline at end of file
+        )
+    
+    return await generation_jobs.start_job_response(
+        request.state.user_id,
+        "outline_generate",
+        lambda job_db: generator(data, job_db, user_ai_service),
+        project_id=project.id,
+        target_id=project.id,
+        params={**data, "mode": mode}
+    )
\ No newline at end of file
@@ -1,19 +1,153 @@
 """AI去味API - 核心特色功能"""
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+import asyncio
+import re
 
 from app.database import get_db
 from app.models.generation_history import GenerationHistory
-from app.schemas.polish import PolishRequest, PolishResponse
+from app.schemas.polish import PolishRequest, PolishResponse, PolishBatchRequest
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service
 from app.logger import get_logger
+from app.config import settings as app_settings
 from app.api.settings import get_user_ai_service
+from app.utils.sse_response import SSEResponse, create_sse_response
 
 router = APIRouter(prefix="/polish", tags=["AI去味"])
 logger = get_logger(__name__)
 
 
+# 句末标点（含其后紧跟的右引号/右括号）之后作为句子边界
+_SENTENCE_BOUNDARY = re.compile(
+    r'(?<=[。！？!?；;…])(?![”’」』）)"\'])|(?<=[。！？!?；;…][”’」』）)"\'])'
+)
+
+
+def _split_long_paragraph(paragraph: str, max_chars: int) -> List[str]:
+    """把超长段落按句子切开，单句仍超长时硬切"""
+    pieces: List[str] = []
+    current = ""
+    for sentence in filter(None, _SENTENCE_BOUNDARY.split(paragraph)):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_into_shards(text: str, max_chars: int) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    按段落边界把长文切分为不超过 max_chars 字的片段
+    
+    原文中的换行分隔符原样保留在片段的 joiner 中，拼接时不会改变段落结构。
+    
+    Returns:
+        (文本开头的空白, [{"text": 片段原文, "joiner": 片段之后的分隔符}])
+    """
+    leading = ""
+    units: List[Tuple[str, str]] = []  # (段落或段落的一部分, 之后的分隔符)
+    parts = re.split(r'(\n+)', text)
+    for i in range(0, len(parts), 2):
+        paragraph = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ""
+        if not paragraph.strip():
+            # 纯空白行并入前一个分隔符
+            if units:
+                units[-1] = (units[-1][0], units[-1][1] + paragraph + separator)
+            else:
+                leading += paragraph + separator
+            continue
+        if len(paragraph) <= max_chars:
+            units.append((paragraph, separator))
+            continue
+        pieces = _split_long_paragraph(paragraph, max_chars)
+        units.extend((piece, "") for piece in pieces[:-1])
+        units.append((pieces[-1], separator))
+    
+    shards: List[Dict[str, str]] = []
+    current: List[Tuple[str, str]] = []
+    current_len = 0
+    for content, separator in units:
+        if current and current_len + len(content) > max_chars:
+            shards.append(_close_shard(current))
+            current = []
+            current_len = 0
+        current.append((content, separator))
+        current_len += len(content) + len(separator)
+    if current:
+        shards.append(_close_shard(current))
+    return leading, shards
+
+
+def _close_shard(units: List[Tuple[str, str]]) -> Dict[str, str]:
+    """把若干段落合并为一个片段，最后一个分隔符单独保存"""
+    body = "".join(content + separator for content, separator in units[:-1]) + units[-1][0]
+    return {"text": body, "joiner": units[-1][1]}
+
+
+def _stitch_shards(leading: str, shards: List[Dict[str, str]], polished: List[str]) -> str:
+    """按原始顺序拼接去味后的片段（只去掉首尾换行，保留段首的全角缩进）"""
+    return leading + "".join(
+        text.strip("\n") + shard["joiner"] for shard, text in zip(shards, polished)
+    )
+
+
+def _build_shard_prompt(shards: List[Dict[str, str]], idx: int) -> str:
+    """构建单个片段的去味提示词，只有一个片段时与整段去味完全一致"""
+    if len(shards) == 1:
+        return prompt_service.get_denoising_prompt(original_text=shards[0]["text"])
+    context_chars = app_settings.polish_shard_context_chars
+    context_before = shards[idx - 1]["text"][-context_chars:] if idx > 0 and context_chars > 0 else ""
+    context_after = shards[idx + 1]["text"][:context_chars] if idx + 1 < len(shards) and context_chars > 0 else ""
+    return prompt_service.get_denoising_shard_prompt(
+        original_text=shards[idx]["text"],
+        context_before=context_before,
+        context_after=context_after
+    )
+
+
+async def _polish_shard(
+    user_ai_service: AIService,
+    request: PolishRequest,
+    shards: List[Dict[str, str]],
+    idx: int,
+    semaphore: asyncio.Semaphore
+) -> Tuple[int, str]:
+    """去味单个片段"""
+    async with semaphore:
+        polished_text = await user_ai_service.generate_text(
+            prompt=_build_shard_prompt(shards, idx),
+            provider=request.provider,
+            model=request.model,
+            temperature=request.temperature,
+            max_tokens=len(shards[idx]["text"]) * 2  # 预留足够token
+        )
+    return idx, polished_text
+
+
+async def _save_polish_history(db: AsyncSession, request: PolishRequest, polished_text: str):
+    """提供了项目ID时记录到生成历史"""
+    if not request.project_id:
+        return
+    db.add(GenerationHistory(
+        project_id=request.project_id,
+        prompt=f"原文: {request.original_text[:100]}...",
+        generated_content=polished_text,
+        model=request.model or "default"
+    ))
+    await db.commit()
+
+
 @router.post("", response_model=PolishResponse, summary="AI去味")
 async def polish_text(
     request: PolishRequest,
@@ -29,24 +163,21 @@ async def polish_text(
     - 优化叙事（自然节奏、简单词汇、松弛感）
     - 让对话更生活化
     
+    长文按段落切分为多个片段（每片不超过 polish_shard_max_chars 字，附带前后文）并发处理，
+    再按原顺序拼接，总耗时接近最慢的单个片段。
+    
     这是本项目的核心特色功能！
     """
     try:
-        # 构建AI去味提示词
-        prompt = prompt_service.get_denoising_prompt(
-            original_text=request.original_text
-        )
-        
-        logger.info(f"开始AI去味处理，原文长度: {len(request.original_text)}")
+        leading, shards = _split_into_shards(request.original_text, app_settings.polish_shard_max_chars)
+        logger.info(f"开始AI去味处理，原文长度: {len(request.original_text)}，切分为 {len(shards)} 个片段")
         
-        # 调用AI进行去味处理
-        polished_text = await ai_service.generate_text(
-            prompt=prompt,
-            provider=request.provider,
-            model=request.model,
-            temperature=request.temperature,
-            max_tokens=len(request.original_text) * 2  # 预留足够token
-        )
+        semaphore = asyncio.Semaphore(max(1, app_settings.polish_shard_concurrency))
+        results = await asyncio.gather(*[
+            _polish_shard(user_ai_service, request, shards, idx, semaphore)
+            for idx in range(len(shards))
+        ])
+        polished_text = _stitch_shards(leading, shards, [text for _, text in results])
         
         # 计算字数
         word_count_before = len(request.original_text)
@@ -55,17 +186,7 @@ async def polish_text(
         logger.info(f"AI去味完成，处理后长度: {word_count_after}")
         
         # 如果提供了项目ID，记录到历史
-        if request.project_id:
-            history = GenerationHistory(
-                project_id=request.project_id,
-                generation_type="polish",
-                prompt=f"原文: {request.original_text[:100]}...",
-                result=polished_text,
-                provider=request.provider or "default",
-                model=request.model or "default"
-            )
-            db.add(history)
-            await db.commit()
+        await _save_polish_history(db, request, polished_text)
         
         return PolishResponse(
             original_text=request.original_text,
@@ -79,6 +200,91 @@ async def polish_text(
         raise HTTPException(status_code=500, detail=f"AI去味失败: {str(e)}")
 
 
+async def polish_stream_generator(
+    request: PolishRequest,
+    db: AsyncSession,
+    user_ai_service: AIService
+) -> AsyncGenerator[str, None]:
+    """
+    长文AI去味SSE生成器 - 片段并发处理，每完成一个片段推送一次
+    
+    任一片段失败时取消其余片段并返回错误，不输出缺段的拼接结果。
+    """
+    tasks = []
+    try:
+        leading, shards = _split_into_shards(request.original_text, app_settings.polish_shard_max_chars)
+        total = len(shards)
+        concurrency = max(1, app_settings.polish_shard_concurrency)
+        yield await SSEResponse.send_progress(f"开始AI去味，原文{len(request.original_text)}字，共{total}个片段（并发{concurrency}）", 0)
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(_polish_shard(user_ai_service, request, shards, idx, semaphore))
+            for idx in range(total)
+        ]
+        pending = set(tasks)
+        heartbeat_interval = app_settings.sse_heartbeat_interval or None
+        polished: List[Optional[str]] = [None] * total
+        completed = 0
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=heartbeat_interval, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                yield await SSEResponse.send_heartbeat()
+                continue
+            
+            for task in done:
+                idx, text = task.result()
+                polished[idx] = text
+                completed += 1
+                yield await SSEResponse.send_item("polish_shard", {
+                    "index": idx,
+                    "polished": text,
+                    "word_count_before": len(shards[idx]["text"]),
+                    "word_count_after": len(text)
+                }, idx)
+                yield await SSEResponse.send_progress(f"已完成 {completed}/{total} 个片段", completed * 90 // total)
+        
+        polished_text = _stitch_shards(leading, shards, polished)
+        await _save_polish_history(db, request, polished_text)
+        logger.info(f"AI去味完成，{total} 个片段，处理后长度: {len(polished_text)}")
+        
+        yield await SSEResponse.send_result({
+            "original_text": request.original_text,
+            "polished_text": polished_text,
+            "word_count_before": len(request.original_text),
+            "word_count_after": len(polished_text),
+            "shards": total
+        })
+        yield await SSEResponse.send_progress("AI去味完成", 100, "success")
+        yield await SSEResponse.send_done()
+        
+    except GeneratorExit:
+        logger.warning("AI去味生成器被提前关闭")
+    except Exception as e:
+        logger.error(f"AI去味失败: {str(e)}")
+        yield await SSEResponse.send_error(f"AI去味失败: {str(e)}")
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+@router.post("/stream", summary="AI去味(SSE流式)")
+async def polish_text_stream(
+    request: PolishRequest,
+    db: AsyncSession = Depends(get_db),
+    user_ai_service: AIService = Depends(get_user_ai_service)
+):
+    """
+    长文AI去味，按片段流式返回进度
+    
+    - 每个片段完成后以 item 事件推送，data.index 为片段序号
+    - 全部完成后 result 事件中返回按原顺序拼接的完整文本
+    """
+    return create_sse_response(polish_stream_generator(request, db, user_ai_service))
+
+
 @router.post("/batch", summary="批量AI去味")
 async def polish_batch(
     texts: list[str],
@@ -124,4 +330,121 @@ async def polish_batch(
         
     except Exception as e:
         logger.error(f"批量AI去味失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"批量AI去味失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"批量AI去味失败: {str(e)}")
+
+
+async def polish_batch_generator(
+    request: PolishBatchRequest,
+    db: AsyncSession,
+    user_ai_service: AIService
+) -> AsyncGenerator[str, None]:
+    """
+    批量AI去味SSE生成器 - 有界并发处理，按完成顺序推送结果
+    
+    每个文本完成后立即推送一条item事件（带原始index），提供项目ID时同时写入生成历史；
+    结果不在内存中累积，最后只发送汇总。
+    """
+    total = len(request.texts)
+    # 请求值只能调低并发，不能超过服务端配置的上限
+    concurrency = max(1, min(request.concurrency or app_settings.polish_batch_concurrency,
+                             app_settings.polish_batch_concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def polish_one(idx: int, text: str):
+        async with semaphore:
+            try:
+                polished_text = await user_ai_service.generate_text(
+                    prompt=prompt_service.get_denoising_prompt(original_text=text),
+                    provider=request.provider,
+                    model=request.model,
+                    temperature=request.temperature
+                )
+                return idx, text, polished_text, None
+            except Exception as e:
+                logger.error(f"第 {idx+1}/{total} 个文本去味失败: {str(e)}")
+                return idx, text, None, str(e)
+    
+    tasks = set()
+    try:
+        yield await SSEResponse.send_progress(f"开始批量AI去味，共{total}个文本（并发{concurrency}）", 0)
+        
+        tasks = {asyncio.create_task(polish_one(idx, text)) for idx, text in enumerate(request.texts)}
+        pending = set(tasks)
+        heartbeat_interval = app_settings.sse_heartbeat_interval or None
+        completed = 0
+        failed = 0
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=heartbeat_interval, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                yield await SSEResponse.send_heartbeat()
+                continue
+            
+            for task in done:
+                idx, text, polished_text, error = task.result()
+                completed += 1
+                
+                if error is not None:
+                    failed += 1
+                    yield await SSEResponse.send_item("polish", {
+                        "index": idx,
+                        "status": "failed",
+                        "error": error
+                    }, idx)
+                else:
+                    # 完成一个持久化一个
+                    if request.project_id:
+                        db.add(GenerationHistory(
+                            project_id=request.project_id,
+                            prompt=f"[批量去味 {idx+1}/{total}] 原文: {text[:100]}...",
+                            generated_content=polished_text,
+                            model=request.model or "default"
+                        ))
+                        await db.commit()
+                    
+                    yield await SSEResponse.send_item("polish", {
+                        "index": idx,
+                        "status": "success",
+                        "polished": polished_text,
+                        "word_count_before": len(text),
+                        "word_count_after": len(polished_text)
+                    }, idx)
+                
+                yield await SSEResponse.send_progress(
+                    f"已完成 {completed}/{total}",
+                    completed * 100 // total
+                )
+        
+        logger.info(f"批量AI去味完成，共处理 {total} 个文本，失败 {failed} 个")
+        yield await SSEResponse.send_result({
+            "total": total,
+            "succeeded": total - failed,
+            "failed": failed
+        })
+        yield await SSEResponse.send_done()
+        
+    except GeneratorExit:
+        logger.warning("批量AI去味生成器被提前关闭")
+    except Exception as e:
+        logger.error(f"批量AI去味失败: {str(e)}")
+        yield await SSEResponse.send_error(f"批量AI去味失败: {str(e)}")
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+@router.post("/batch-stream", summary="批量AI去味(SSE流式)")
+async def polish_batch_stream(
+    request: PolishBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    user_ai_service: AIService = Depends(get_user_ai_service)
+):
+    """
+    并发处理多个文本的AI去味，按完成顺序流式返回
+    
+    - 同时处理的文本数由 concurrency 限制（默认取配置 polish_batch_concurrency，且不超过该配置）
+    - 每个结果以 item 事件推送，data.index 为文本在 texts 中的原始位置
+    - 提供 project_id 时，每个结果完成后立即写入生成历史
+    """
+    return create_sse_response(polish_batch_generator(request, db, user_ai_service))
@@ -6,6 +6,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Dict, Any, List
 from pathlib import Path
+from collections import OrderedDict
+import time
 import httpx
 
 from app.database import get_db
@@ -20,6 +22,41 @@ logger = get_logger(__name__)
 
 router = APIRouter(prefix="/settings", tags=["设置管理"])
 
+# 用户AI服务缓存：{user_id: (AIService, 缓存时间)}，LRU顺序
+# 设置写入（保存/更新/删除）时失效，另有TTL兜底数据库被外部修改的情况
+_AI_SERVICE_CACHE_MAX_SIZE = 1000
+_ai_service_cache: "OrderedDict[str, tuple[AIService, float]]" = OrderedDict()
+
+
+def invalidate_user_ai_service(user_id: str):
+    """使用户的AI服务缓存失效（设置变更后调用）"""
+    if _ai_service_cache.pop(user_id, None) is not None:
+        logger.debug(f"用户 {user_id} 的AI服务缓存已失效")
+
+
+def _get_cached_ai_service(user_id: str) -> AIService | None:
+    """获取缓存的AI服务，过期返回None"""
+    cached = _ai_service_cache.get(user_id)
+    if cached is None:
+        return None
+    
+    service, cached_at = cached
+    ttl = app_settings.ai_service_cache_ttl
+    if ttl > 0 and time.monotonic() - cached_at >= ttl:
+        _ai_service_cache.pop(user_id, None)
+        return None
+    
+    _ai_service_cache.move_to_end(user_id)
+    return service
+
+
+def _cache_ai_service(user_id: str, service: AIService):
+    """缓存用户的AI服务"""
+    _ai_service_cache[user_id] = (service, time.monotonic())
+    _ai_service_cache.move_to_end(user_id)
+    while len(_ai_service_cache) > _AI_SERVICE_CACHE_MAX_SIZE:
+        _ai_service_cache.popitem(last=False)
+
 
 def read_env_defaults() -> Dict[str, Any]:
     """从.env文件读取默认配置（仅读取，不修改）"""
@@ -46,8 +83,12 @@ async def get_user_ai_service(
 ) -> AIService:
     """
     依赖：获取当前用户的AI服务实例
-    从数据库读取用户设置并创建对应的AI服务
+    优先使用进程内缓存，未命中时从数据库读取用户设置并创建对应的AI服务
     """
+    cached_service = _get_cached_ai_service(user.user_id)
+    if cached_service is not None:
+        return cached_service
+    
     result = await db.execute(
         select(Settings).where(Settings.user_id == user.user_id)
     )
@@ -66,7 +107,7 @@ async def get_user_ai_service(
         logger.info(f"用户 {user.user_id} 首次使用AI服务，已从.env同步设置到数据库")
     
     # 使用用户设置创建AI服务实例
-    return create_user_ai_service(
+    service = create_user_ai_service(
         api_provider=settings.api_provider,
         api_key=settings.api_key,
         api_base_url=settings.api_base_url or "",
@@ -74,6 +115,8 @@ async def get_user_ai_service(
         temperature=settings.temperature,
         max_tokens=settings.max_tokens
     )
+    _cache_ai_service(user.user_id, service)
+    return service
 
 
 @router.get("", response_model=SettingsResponse)
@@ -148,6 +191,7 @@ async def save_settings(
         await db.refresh(settings)
         logger.info(f"用户 {user.user_id} 创建设置")
     
+    invalidate_user_ai_service(user.user_id)
     return settings
 
 
@@ -178,6 +222,7 @@ async def update_settings(
     await db.refresh(settings)
     logger.info(f"用户 {user.user_id} 更新设置")
     
+    invalidate_user_ai_service(user.user_id)
     return settings
 
 
@@ -199,6 +244,7 @@ async def delete_settings(
     
     await db.delete(settings)
     await db.commit()
+    invalidate_user_ai_service(user.user_id)
     logger.info(f"用户 {user.user_id} 删除设置")
     
     return {"message": "设置已删除", "user_id": user.user_id}
@@ -1,8 +1,9 @@
 """项目创建向导流式API - 使用SSE避免超时"""
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, Optional, List, Callable, Awaitable
+import asyncio
 import json
 import re
 
@@ -16,9 +17,15 @@ from app.models.writing_style import WritingStyle
 from app.models.project_default_style import ProjectDefaultStyle
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service
+from app.services import project_context_cache, generation_jobs
 from app.logger import get_logger
-from app.utils.sse_response import SSEResponse, create_sse_response
+from app.config import settings as app_settings
+from app.utils.sse_response import SSEResponse, create_sse_response, coalesce_text_stream
+from app.utils.json_stream import JSONArrayStreamParser
+from app.utils.json_repair import parse_json_tolerant
 from app.api.settings import get_user_ai_service
+from app.api.outlines import build_complete_outline_prompt
+from app.services.context_assembler import prompt_token_budget
 
 router = APIRouter(prefix="/wizard-stream", tags=["项目创建向导(流式)"])
 logger = get_logger(__name__)
@@ -63,16 +70,23 @@ async def world_building_generator(
         # 流式调用AI
         yield await SSEResponse.send_progress("正在调用AI生成...", 30)
         
-        accumulated_text = ""
+        text_parts: List[str] = []
+        text_chars = 0
         chunk_count = 0
         
-        async for chunk in user_ai_service.generate_text_stream(
+        async for chunk in coalesce_text_stream(user_ai_service.generate_text_stream(
             prompt=prompt,
             provider=provider,
             model=model
-        ):
+        )):
+            # 长时间无输出时发送心跳
+            if chunk is None:
+                yield await SSEResponse.send_heartbeat()
+                continue
+            
             chunk_count += 1
-            accumulated_text += chunk
+            text_parts.append(chunk)
+            text_chars += len(chunk)
             
             # 发送内容块
             yield await SSEResponse.send_chunk(chunk)
@@ -80,29 +94,15 @@ async def world_building_generator(
             # 定期更新进度
             if chunk_count % 5 == 0:
                 progress = min(30 + (chunk_count // 5), 70)
-                yield await SSEResponse.send_progress(f"生成中... ({len(accumulated_text)}字符)", progress)
-            
-            # 每20个块发送心跳
-            if chunk_count % 20 == 0:
-                yield await SSEResponse.send_heartbeat()
+                yield await SSEResponse.send_progress(f"生成中... ({text_chars}字符)", progress)
         
         # 解析结果
         yield await SSEResponse.send_progress("解析AI返回结果...", 80)
         
         world_data = {}
         try:
-            cleaned_text = accumulated_text.strip()
-            
-            # 移除markdown代码块标记
-            if cleaned_text.startswith('```json'):
-                cleaned_text = cleaned_text[7:].lstrip('\n\r')
-            elif cleaned_text.startswith('```'):
-                cleaned_text = cleaned_text[3:].lstrip('\n\r')
-            if cleaned_text.endswith('```'):
-                cleaned_text = cleaned_text[:-3].rstrip('\n\r')
-            cleaned_text = cleaned_text.strip()
-            
-            world_data = json.loads(cleaned_text)
+            # 容错解析（本地修复常见格式问题）
+            world_data = parse_json_tolerant("".join(text_parts), source="世界观")
                     
         except json.JSONDecodeError as e:
             logger.error(f"世界构建JSON解析失败: {e}")
@@ -191,14 +191,214 @@ async def world_building_generator(
 @router.post("/world-building", summary="流式生成世界构建")
 async def generate_world_building_stream(
     data: Dict[str, Any],
-    db: AsyncSession = Depends(get_db),
+    request: Request,
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
     """
     使用SSE流式生成世界构建，避免超时
     前端使用EventSource接收实时进度和结果
+    生成在后台任务中进行，断线后可通过 /api/jobs/{job_id}/stream 继续接收；
+    重复提交相同请求时订阅同一任务
+    """
+    return await generation_jobs.start_job_response(
+        request.state.user_id,
+        "wizard_world_building",
+        lambda db: world_building_generator(data, db, user_ai_service),
+        params=data
+    )
+
+
+def _build_relationships_text(char_data: Dict[str, Any]) -> str:
+    """从relationships_array提取文本描述以保持向后兼容"""
+    relationships_array = char_data.get("relationships_array", [])
+    if relationships_array and isinstance(relationships_array, list):
+        # 将关系数组转换为可读文本
+        rel_descriptions = []
+        for rel in relationships_array:
+            target = rel.get("target_character_name", "未知")
+            rel_type = rel.get("relationship_type", "关系")
+            desc = rel.get("description", "")
+            rel_descriptions.append(f"{target}({rel_type}): {desc}")
+        return "; ".join(rel_descriptions)
+    # 兼容旧格式
+    if isinstance(char_data.get("relationships"), dict):
+        return json.dumps(char_data.get("relationships"), ensure_ascii=False)
+    if isinstance(char_data.get("relationships"), str):
+        return char_data.get("relationships")
+    return ""
+
+
+def _validate_character_data(char_data: Any, existing_names: set) -> Optional[str]:
+    """校验流式解析出的角色数据，返回无效原因，有效时返回None"""
+    if not isinstance(char_data, dict):
+        return f"元素不是对象({type(char_data).__name__})"
+    name = char_data.get("name")
+    if not isinstance(name, str) or not name.strip():
+        return "缺少角色名称"
+    if name in existing_names:
+        return f"角色名称重复: {name}"
+    return None
+
+
+def _build_character(project_id: str, char_data: Dict[str, Any]) -> Character:
+    """根据AI返回的角色数据构建Character记录（关系文本在引用清理后补全）"""
+    return Character(
+        project_id=project_id,
+        name=char_data.get("name", "未命名角色"),
+        age=char_data.get("age"),
+        gender=char_data.get("gender"),
+        is_organization=char_data.get("is_organization", False),
+        role_type=char_data.get("role_type", "supporting"),
+        personality=char_data.get("personality", ""),
+        background=char_data.get("background", ""),
+        appearance=char_data.get("appearance", ""),
+        relationships="",
+        organization_type=char_data.get("organization_type"),
+        organization_purpose=char_data.get("organization_purpose"),
+        organization_members=json.dumps(char_data.get("organization_members", []), ensure_ascii=False),
+        traits=json.dumps(char_data.get("traits", []), ensure_ascii=False)
+    )
+
+
+async def _generate_characters_parallel(
+    user_ai_service: AIService,
+    count: int,
+    batch_size: int,
+    max_retries: int,
+    world_context: Dict[str, Any],
+    theme: str,
+    genre: str,
+    requirements: str,
+    provider: Optional[str],
+    model: Optional[str],
+    accept_character: Callable[[Any], Awaitable[Optional[str]]]
+) -> AsyncGenerator[str, None]:
     """
-    return create_sse_response(world_building_generator(data, db, user_ai_service))
+    并行生成角色：先用一次调用生成角色名单（名称+定位），再按批次并发扩写完整设定
+    
+    各批次在独立任务中流式生成并解析，解析出的角色经队列交回本生成器，
+    由 accept_character 在同一个任务中依次写入数据库（会话不支持并发使用）。
+    名单生成失败时不产出任何角色，由调用方按顺序模式补齐。
+    """
+    world_kwargs = dict(
+        time_period=world_context.get("time_period", ""),
+        location=world_context.get("location", ""),
+        atmosphere=world_context.get("atmosphere", ""),
+        rules=world_context.get("rules", ""),
+        theme=theme,
+        genre=genre
+    )
+    
+    yield await SSEResponse.send_progress(f"规划{count}个角色的名单...", 15)
+    try:
+        roster_text = await user_ai_service.generate_text(
+            prompt=prompt_service.get_character_roster_prompt(count=count, requirements=requirements, **world_kwargs),
+            provider=provider,
+            model=model
+        )
+        roster_data = parse_json_tolerant(roster_text, source="角色名单")
+    except Exception as e:
+        logger.warning(f"角色名单生成失败，回退到顺序生成: {e}")
+        yield await SSEResponse.send_progress("角色名单生成失败，改为逐批生成...", 15, "warning")
+        return
+    
+    if isinstance(roster_data, dict):
+        roster_data = [roster_data]
+    roster = []
+    roster_names = set()
+    for entry in roster_data if isinstance(roster_data, list) else []:
+        name = entry.get("name") if isinstance(entry, dict) else None
+        if isinstance(name, str) and name.strip() and name not in roster_names:
+            roster_names.add(name)
+            roster.append(entry)
+    roster = roster[:count]
+    if not roster:
+        logger.warning("角色名单为空，回退到顺序生成")
+        yield await SSEResponse.send_progress("角色名单为空，改为逐批生成...", 15, "warning")
+        return
+    
+    roster_context = "\n".join(
+        f"- {entry['name']}（{'组织' if entry.get('is_organization') else entry.get('role_type', 'supporting')}）: {entry.get('brief', '')}"
+        for entry in roster
+    )
+    batches = [roster[i:i + batch_size] for i in range(0, len(roster), batch_size)]
+    concurrency = max(1, app_settings.wizard_character_concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    yield await SSEResponse.send_progress(
+        f"名单已生成({len(roster)}个)，分{len(batches)}批并行扩写（并发{concurrency}）...",
+        20
+    )
+    
+    async def expand_batch(batch_idx: int, batch: List[Dict[str, Any]]):
+        pending = {entry["name"]: entry for entry in batch}
+        try:
+            async with semaphore:
+                for attempt in range(max_retries):
+                    if not pending:
+                        break
+                    retry_suffix = f" (重试{attempt}/{max_retries})" if attempt > 0 else ""
+                    queue.put_nowait(("progress", f"扩写第{batch_idx+1}/{len(batches)}批角色: {'、'.join(pending)}{retry_suffix}"))
+                    
+                    batch_requirements = (
+                        f"{requirements}\n\n【完整角色名单】:\n{roster_context}\n\n"
+                        f"请为名单中的以下{len(pending)}个实体生成完整设定，名称和类型必须与名单一致：{'、'.join(pending)}"
+                    )
+                    prompt = prompt_service.get_characters_batch_prompt(
+                        count=len(pending),
+                        requirements=batch_requirements,
+                        reference_scope="roster",
+                        **world_kwargs
+                    )
+                    
+                    parser = JSONArrayStreamParser()
+                    try:
+                        async for chunk in user_ai_service.generate_text_stream(
+                            prompt=prompt,
+                            provider=provider,
+                            model=model
+                        ):
+                            for char_data in parser.feed(chunk):
+                                name = char_data.get("name") if isinstance(char_data, dict) else None
+                                if not isinstance(name, str) or name not in pending:
+                                    continue
+                                entry = pending.pop(name)
+                                char_data.setdefault("role_type", entry.get("role_type", "supporting"))
+                                char_data.setdefault("is_organization", entry.get("is_organization", False))
+                                queue.put_nowait(("character", char_data))
+                    except Exception as e:
+                        logger.error(f"并行批次{batch_idx+1}生成异常(尝试{attempt+1}/{max_retries}): {e}")
+                    
+                    if pending:
+                        logger.warning(f"并行批次{batch_idx+1}缺少角色: {'、'.join(pending)}")
+        finally:
+            queue.put_nowait(("done", batch_idx))
+    
+    tasks = [asyncio.create_task(expand_batch(i, batch)) for i, batch in enumerate(batches)]
+    heartbeat_interval = app_settings.sse_heartbeat_interval or None
+    finished = 0
+    try:
+        while finished < len(tasks):
+            try:
+                kind, payload = await asyncio.wait_for(queue.get(), heartbeat_interval)
+            except asyncio.TimeoutError:
+                yield await SSEResponse.send_heartbeat()
+                continue
+            
+            if kind == "progress":
+                yield await SSEResponse.send_progress(payload, 20 + finished * 55 // len(tasks))
+            elif kind == "character":
+                item_message = await accept_character(payload)
+                if item_message:
+                    yield item_message
+            else:
+                finished += 1
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 async def characters_generator(
@@ -219,6 +419,7 @@ async def characters_generator(
         requirements = data.get("requirements", "")
         provider = data.get("provider")
         model = data.get("model")
+        parallel = data.get("parallel", False)
         
         # 验证项目
         yield await SSEResponse.send_progress("验证项目...", 10)
@@ -245,6 +446,53 @@ async def characters_generator(
         all_characters = []
         total_batches = (count + BATCH_SIZE - 1) // BATCH_SIZE
         
+        # 流式解析出的角色立即写入会话（flush获取ID），事务在全部完成后统一提交
+        created_characters = []
+        character_names = set()
+        
+        async def accept_character(char_data: Any) -> Optional[str]:
+            """校验并写入一个角色，返回条目SSE消息；无效时返回None"""
+            invalid_reason = _validate_character_data(char_data, character_names)
+            if invalid_reason:
+                logger.warning(f"跳过无效角色: {invalid_reason}")
+                return None
+            
+            character = _build_character(project_id, char_data)
+            db.add(character)
+            await db.flush()
+            
+            created_characters.append((character, char_data))
+            character_names.add(character.name)
+            all_characters.append(char_data)
+            
+            return await SSEResponse.send_item("character", {
+                "id": character.id,
+                "name": character.name,
+                "role_type": character.role_type,
+                "is_organization": character.is_organization
+            }, len(all_characters) - 1)
+        
+        # 并行模式：先生成角色名单，再并发扩写各批次；未补齐的部分由下面的顺序模式补生成
+        if parallel and total_batches > 1:
+            parallel_stream = _generate_characters_parallel(
+                user_ai_service=user_ai_service,
+                count=count,
+                batch_size=BATCH_SIZE,
+                max_retries=MAX_RETRIES,
+                world_context=world_context,
+                theme=theme or project.theme or "",
+                genre=genre or project.genre or "",
+                requirements=requirements,
+                provider=provider,
+                model=model,
+                accept_character=accept_character
+            )
+            try:
+                async for message in parallel_stream:
+                    yield message
+            finally:
+                await parallel_stream.aclose()
+        
         for batch_idx in range(total_batches):
             # 精确计算当前批次应该生成的数量
             remaining = count - len(all_characters)
@@ -257,15 +505,16 @@ async def characters_generator(
             
             batch_progress = 15 + (batch_idx * 60 // total_batches)
             
-            # 重试逻辑
+            # 重试逻辑：已解析成功的角色保留，重试只补生成缺少的数量
             retry_count = 0
-            batch_success = False
+            batch_accepted = 0
             
-            while retry_count < MAX_RETRIES and not batch_success:
+            while retry_count < MAX_RETRIES and batch_accepted < current_batch_size:
+                needed = current_batch_size - batch_accepted
                 try:
                     retry_suffix = f" (重试{retry_count}/{MAX_RETRIES})" if retry_count > 0 else ""
                     yield await SSEResponse.send_progress(
-                        f"生成第{batch_idx+1}/{total_batches}批角色 ({current_batch_size}个){retry_suffix}...",
+                        f"生成第{batch_idx+1}/{total_batches}批角色 ({needed}个){retry_suffix}...",
                         batch_progress
                     )
                     
@@ -278,20 +527,20 @@ async def characters_generator(
                         existing_chars_context += "\n请确保新角色与已有角色形成合理的关系网络和互动。\n"
                     
                     # 构建精确的批次要求,明确告诉AI要生成的数量
-                    if batch_idx == 0:
-                        if current_batch_size == 1:
+                    if not all_characters:
+                        if needed == 1:
                             batch_requirements = f"{requirements}\n请生成1个主角(protagonist)"
                         else:
-                            batch_requirements = f"{requirements}\n请精确生成{current_batch_size}个角色:1个主角(protagonist)和{current_batch_size-1}个核心配角(supporting)"
+                            batch_requirements = f"{requirements}\n请精确生成{needed}个角色:1个主角(protagonist)和{needed-1}个核心配角(supporting)"
                     else:
-                        batch_requirements = f"{requirements}\n请精确生成{current_batch_size}个角色{existing_chars_context}"
+                        batch_requirements = f"{requirements}\n请精确生成{needed}个角色{existing_chars_context}"
                         if batch_idx == total_batches - 1:
                             batch_requirements += "\n可以包含组织或反派(antagonist)"
                         else:
                             batch_requirements += "\n主要是配角(supporting)和反派(antagonist)"
                     
                     prompt = prompt_service.get_characters_batch_prompt(
-                        count=current_batch_size,  # 传递精确数量
+                        count=needed,  # 传递精确数量
                         time_period=world_context.get("time_period", ""),
                         location=world_context.get("location", ""),
                         atmosphere=world_context.get("atmosphere", ""),
@@ -301,82 +550,62 @@ async def characters_generator(
                         requirements=batch_requirements
                     )
                     
-                    # 流式生成
-                    accumulated_text = ""
-                    async for chunk in user_ai_service.generate_text_stream(
+                    # 流式生成，每个角色对象闭合后立即解析、校验并写入
+                    parser = JSONArrayStreamParser()
+                    overflow_count = 0
+                    async for chunk in coalesce_text_stream(user_ai_service.generate_text_stream(
                         prompt=prompt,
                         provider=provider,
                         model=model
-                    ):
-                        accumulated_text += chunk
+                    )):
+                        if chunk is None:
+                            yield await SSEResponse.send_heartbeat()
+                            continue
                         yield await SSEResponse.send_chunk(chunk)
-                    
-                    # 解析批次结果
-                    cleaned_text = accumulated_text.strip()
-                    # 移除markdown代码块标记
-                    if cleaned_text.startswith('```json'):
-                        cleaned_text = cleaned_text[7:].lstrip('\n\r')
-                    elif cleaned_text.startswith('```'):
-                        cleaned_text = cleaned_text[3:].lstrip('\n\r')
-                    if cleaned_text.endswith('```'):
-                        cleaned_text = cleaned_text[:-3].rstrip('\n\r')
-                    cleaned_text = cleaned_text.strip()
-                    
-                    characters_data = json.loads(cleaned_text)
-                    if not isinstance(characters_data, list):
-                        characters_data = [characters_data]
-                    
-                    # 验证生成数量是否精确
-                    if len(characters_data) != current_batch_size:
-                        logger.warning(f"批次{batch_idx+1}生成数量不匹配: 期望{current_batch_size}, 实际{len(characters_data)}")
                         
-                        # 如果数量不足,重试
-                        if len(characters_data) < current_batch_size:
-                            if retry_count < MAX_RETRIES - 1:
-                                retry_count += 1
-                                yield await SSEResponse.send_progress(
-                                    f"⚠️ 生成数量不足(期望{current_batch_size},实际{len(characters_data)}),准备重试...",
-                                    batch_progress,
-                                    "warning"
-                                )
+                        for char_data in parser.feed(chunk):
+                            if batch_accepted >= current_batch_size:
+                                overflow_count += 1
                                 continue
-                            else:
-                                # 最后一次重试仍不足，记录但继续使用
-                                logger.warning(f"批次{batch_idx+1}多次重试后仍数量不足，使用当前结果")
-                                yield await SSEResponse.send_progress(
-                                    f"⚠️ 批次{batch_idx+1}生成{len(characters_data)}个（期望{current_batch_size}），继续处理",
-                                    batch_progress,
-                                    "warning"
-                                )
-                        # 如果数量过多,只取需要的数量并发出警告
+                            
+                            item_message = await accept_character(char_data)
+                            if item_message:
+                                batch_accepted += 1
+                                yield item_message
+                    
+                    if overflow_count:
+                        # 数量过多,只取需要的数量并发出警告
+                        logger.warning(f"批次{batch_idx+1}生成过多角色(多出{overflow_count}个),只取前{current_batch_size}个")
+                        yield await SSEResponse.send_progress(
+                            f"⚠️ AI生成过多，截取前{current_batch_size}个角色",
+                            batch_progress,
+                            "warning"
+                        )
+                    if parser.truncated or parser.errors:
+                        logger.warning(f"批次{batch_idx+1}输出存在损坏元素: 解析失败{parser.errors}个, 末尾截断={parser.truncated}")
+                    
+                    # 验证生成数量是否足够
+                    if batch_accepted < current_batch_size:
+                        logger.warning(f"批次{batch_idx+1}生成数量不足: 期望{current_batch_size}, 实际{batch_accepted}")
+                        retry_count += 1
+                        if retry_count < MAX_RETRIES:
+                            yield await SSEResponse.send_progress(
+                                f"⚠️ 生成数量不足(期望{current_batch_size},实际{batch_accepted}),补生成剩余角色...",
+                                batch_progress,
+                                "warning"
+                            )
                         else:
-                            logger.warning(f"批次{batch_idx+1}生成过多角色({len(characters_data)}>{current_batch_size}),将只取前{current_batch_size}个")
+                            # 最后一次重试仍不足，记录但继续使用
+                            logger.warning(f"批次{batch_idx+1}多次重试后仍数量不足，使用当前结果")
                             yield await SSEResponse.send_progress(
-                                f"⚠️ AI生成过多，截取前{current_batch_size}个角色",
+                                f"⚠️ 批次{batch_idx+1}生成{batch_accepted}个（期望{current_batch_size}），继续处理",
                                 batch_progress,
                                 "warning"
                             )
-                            characters_data = characters_data[:current_batch_size]
+                        continue
                     
-                    all_characters.extend(characters_data)
-                    batch_success = True
-                    logger.info(f"批次{batch_idx+1}成功添加{len(characters_data)}个角色,当前总数{len(all_characters)}/{count}")
+                    logger.info(f"批次{batch_idx+1}成功添加{batch_accepted}个角色,当前总数{len(all_characters)}/{count}")
                     
-                except json.JSONDecodeError as e:
-                    logger.error(f"批次{batch_idx+1}解析失败(尝试{retry_count+1}/{MAX_RETRIES}): {e}")
-                    retry_count += 1
-                    if retry_count < MAX_RETRIES:
-                        yield await SSEResponse.send_progress(
-                            f"解析失败，准备重试...",
-                            batch_progress,
-                            "warning"
-                        )
-                    else:
-                        yield await SSEResponse.send_progress(
-                            f"批次{batch_idx+1}多次重试失败，跳过",
-                            batch_progress,
-                            "warning"
-                        )
                 except Exception as e:
                     logger.error(f"批次{batch_idx+1}生成异常(尝试{retry_count+1}/{MAX_RETRIES}): {e}")
                     retry_count += 1
@@ -446,49 +675,13 @@ async def characters_generator(
         
         yield await SSEResponse.send_progress("保存角色到数据库...", 85)
         
-        # 第一阶段：创建所有Character记录
-        created_characters = []
+        # 第一阶段：角色记录已在流式解析时创建，这里根据清理后的关系数组补全关系文本
         character_name_to_obj = {}  # 名称到对象的映射，用于后续关系创建
         
-        for char_data in all_characters:
-            # 从relationships_array提取文本描述以保持向后兼容
-            relationships_text = ""
-            relationships_array = char_data.get("relationships_array", [])
-            if relationships_array and isinstance(relationships_array, list):
-                # 将关系数组转换为可读文本
-                rel_descriptions = []
-                for rel in relationships_array:
-                    target = rel.get("target_character_name", "未知")
-                    rel_type = rel.get("relationship_type", "关系")
-                    desc = rel.get("description", "")
-                    rel_descriptions.append(f"{target}({rel_type}): {desc}")
-                relationships_text = "; ".join(rel_descriptions)
-            # 兼容旧格式
-            elif isinstance(char_data.get("relationships"), dict):
-                relationships_text = json.dumps(char_data.get("relationships"), ensure_ascii=False)
-            elif isinstance(char_data.get("relationships"), str):
-                relationships_text = char_data.get("relationships")
-            
-            character = Character(
-                project_id=project_id,
-                name=char_data.get("name", "未命名角色"),
-                age=char_data.get("age"),
-                gender=char_data.get("gender"),
-                is_organization=char_data.get("is_organization", False),
-                role_type=char_data.get("role_type", "supporting"),
-                personality=char_data.get("personality", ""),
-                background=char_data.get("background", ""),
-                appearance=char_data.get("appearance", ""),
-                relationships=relationships_text,
-                organization_type=char_data.get("organization_type"),
-                organization_purpose=char_data.get("organization_purpose"),
-                organization_members=json.dumps(char_data.get("organization_members", []), ensure_ascii=False),
-                traits=json.dumps(char_data.get("traits", []), ensure_ascii=False)
-            )
-            db.add(character)
-            created_characters.append((character, char_data))
+        for character, char_data in created_characters:
+            character.relationships = _build_relationships_text(char_data)
         
-        await db.flush()  # 获取所有角色的ID
+        await db.flush()
         
         # 刷新并建立名称映射
         for character, _ in created_characters:
@@ -718,13 +911,50 @@ async def characters_generator(
 @router.post("/characters", summary="流式批量生成角色")
 async def generate_characters_stream(
     data: Dict[str, Any],
-    db: AsyncSession = Depends(get_db),
+    request: Request,
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
     """
     使用SSE流式批量生成角色，避免超时
+    生成在后台任务中进行，断线后可通过 /api/jobs/{job_id}/stream 继续接收；
+    重复提交相同请求时订阅同一任务，同一项目上有其他生成任务时返回409
     """
-    return create_sse_response(characters_generator(data, db, user_ai_service))
+    return await generation_jobs.start_job_response(
+        request.state.user_id,
+        "wizard_characters",
+        lambda db: characters_generator(data, db, user_ai_service),
+        project_id=data.get("project_id"),
+        target_id=data.get("project_id"),
+        params=data
+    )
+
+
+def _validate_outline_data(chapter_data: Any) -> Optional[str]:
+    """校验流式解析出的章节大纲，返回无效原因，有效时返回None"""
+    if not isinstance(chapter_data, dict):
+        return f"元素不是对象({type(chapter_data).__name__})"
+    if not (chapter_data.get("title") or chapter_data.get("summary") or chapter_data.get("content")):
+        return "缺少标题和内容"
+    return None
+
+
+def _build_outline_records(project_id: str, chapter_num: int, chapter_data: Dict[str, Any]):
+    """根据AI返回的章节大纲构建Outline和对应的Chapter记录"""
+    outline = Outline(
+        project_id=project_id,
+        title=chapter_data.get("title", f"第{chapter_num}章"),
+        content=chapter_data.get("summary") or chapter_data.get("content") or "",
+        structure=json.dumps(chapter_data, ensure_ascii=False),
+        order_index=chapter_num
+    )
+    chapter = Chapter(
+        project_id=project_id,
+        chapter_number=chapter_num,
+        title=chapter_data.get("title", f"第{chapter_num}章"),
+        summary=(chapter_data.get("summary") or chapter_data.get("content") or "")[:500],
+        status="draft"
+    )
+    return outline, chapter
 
 
 async def outline_generator(
@@ -762,34 +992,31 @@ async def outline_generator(
         
         # 获取角色信息
         yield await SSEResponse.send_progress("加载角色信息...", 15)
-        result = await db.execute(
-            select(Character).where(Character.project_id == project_id)
-        )
-        characters = result.scalars().all()
-        
-        characters_info = "\n".join([
-            f"- {char.name} ({'组织' if char.is_organization else '角色'}, {char.role_type}): {char.personality[:100] if char.personality else '暂无描述'}"
-            for char in characters
-        ])
+        characters_info = await project_context_cache.get_characters_info(db, project_id)
+        budget = prompt_token_budget(model or user_ai_service.default_model, user_ai_service.default_max_tokens)
         
         # 分批生成大纲
         yield await SSEResponse.send_progress("准备分批生成大纲...", 20)
         
         all_outlines = []
+        # 流式解析出的大纲立即写入会话（flush），事务在全部完成后统一提交
+        created_outlines = []
         total_batches = (chapter_count + BATCH_SIZE - 1) // BATCH_SIZE
         
         for batch_idx in range(total_batches):
-            start_chapter = batch_idx * BATCH_SIZE + 1
+            batch_start = batch_idx * BATCH_SIZE + 1
             end_chapter = min((batch_idx + 1) * BATCH_SIZE, chapter_count)
-            current_batch_size = end_chapter - start_chapter + 1
+            current_batch_size = end_chapter - batch_start + 1
             
             batch_progress = 20 + (batch_idx * 55 // total_batches)
             
-            # 重试逻辑
+            # 重试逻辑：已解析成功的章节保留，重试只补生成缺少的章节
             retry_count = 0
-            batch_success = False
+            batch_accepted = 0
             
-            while retry_count < MAX_RETRIES and not batch_success:
+            while retry_count < MAX_RETRIES and batch_accepted < current_batch_size:
+                start_chapter = batch_start + batch_accepted
+                needed = end_chapter - start_chapter + 1
                 try:
                     retry_suffix = f" (重试{retry_count}/{MAX_RETRIES})" if retry_count > 0 else ""
                     yield await SSEResponse.send_progress(
@@ -809,89 +1036,94 @@ async def outline_generator(
                         previous_context += f"\n请确保第{start_chapter}-{end_chapter}章与前文情节自然衔接,保持故事连贯性。\n"
                     
                     # 向导专用的开局大纲要求
-                    batch_requirements = f"{requirements}\n\n【重要说明】这是小说的开局部分，请生成前5章大纲，重点关注：\n"
+                    batch_requirements = f"{requirements}\n\n【重要说明】这是小说的开局部分，请生成第{start_chapter}-{end_chapter}章大纲，重点关注：\n"
                     batch_requirements += "1. 引入主要角色和世界观设定\n"
                     batch_requirements += "2. 建立主线冲突和故事钩子\n"
                     batch_requirements += "3. 展开初期情节，为后续发展埋下伏笔\n"
                     batch_requirements += "4. 不要试图完结故事，这只是开始部分\n"
                     batch_requirements += "5. 不要在JSON字符串值中使用中文引号（""''），请使用【】或《》标记\n"
+                    batch_requirements += previous_context
                     
-                    batch_prompt = prompt_service.get_complete_outline_prompt(
+                    batch_prompt = build_complete_outline_prompt(
+                        budget,
+                        characters_info=characters_info,
+                        rules=project.world_rules,
                         title=project.title,
                         theme=project.theme or "未设定",
                         genre=project.genre or "通用",
-                        chapter_count=5,  # 固定5章
+                        chapter_count=needed,
                         narrative_perspective=narrative_perspective,
                         target_words=target_words // 20,  # 开局约占总字数的1/20
                         time_period=project.world_time_period or "未设定",
                         location=project.world_location or "未设定",
                         atmosphere=project.world_atmosphere or "未设定",
-                        rules=project.world_rules or "未设定",
-                        characters_info=characters_info or "暂无角色信息",
                         requirements=batch_requirements
                     )
                     
-                    # 流式生成
-                    accumulated_text = ""
-                    async for chunk in user_ai_service.generate_text_stream(
+                    # 流式生成，每章大纲对象闭合后立即解析、校验并写入
+                    parser = JSONArrayStreamParser()
+                    async for chunk in coalesce_text_stream(user_ai_service.generate_text_stream(
                         prompt=batch_prompt,
                         provider=provider,
                         model=model
-                    ):
-                        accumulated_text += chunk
+                    )):
+                        if chunk is None:
+                            yield await SSEResponse.send_heartbeat()
+                            continue
                         yield await SSEResponse.send_chunk(chunk)
+                        
+                        for chapter_data in parser.feed(chunk):
+                            if batch_accepted >= current_batch_size:
+                                continue
+                            
+                            invalid_reason = _validate_outline_data(chapter_data)
+                            if invalid_reason:
+                                logger.warning(f"大纲批次{batch_idx+1}跳过无效章节: {invalid_reason}")
+                                continue
+                            
+                            # 修正章节编号
+                            chapter_num = batch_start + batch_accepted
+                            chapter_data["chapter_number"] = chapter_num
+                            
+                            outline, chapter = _build_outline_records(project_id, chapter_num, chapter_data)
+                            db.add(outline)
+                            db.add(chapter)
+                            await db.flush()
+                            
+                            created_outlines.append(outline)
+                            all_outlines.append(chapter_data)
+                            batch_accepted += 1
+                            
+                            yield await SSEResponse.send_item("outline", {
+                                "id": outline.id,
+                                "order_index": outline.order_index,
+                                "title": outline.title,
+                                "content": outline.content[:100] + "..." if len(outline.content or "") > 100 else (outline.content or "")
+                            }, len(all_outlines) - 1)
                     
-                    # 解析结果
-                    cleaned_text = accumulated_text.strip()
-                    
-                    # 移除markdown代码块标记
-                    if cleaned_text.startswith('```json'):
-                        cleaned_text = cleaned_text[7:].lstrip('\n\r')
-                    elif cleaned_text.startswith('```'):
-                        cleaned_text = cleaned_text[3:].lstrip('\n\r')
-                    if cleaned_text.endswith('```'):
-                        cleaned_text = cleaned_text[:-3].rstrip('\n\r')
-                    cleaned_text = cleaned_text.strip()
-                    
-                    batch_outline_data = json.loads(cleaned_text)
-                    if not isinstance(batch_outline_data, list):
-                        batch_outline_data = [batch_outline_data]
+                    if parser.truncated or parser.errors:
+                        logger.warning(f"大纲批次{batch_idx+1}输出存在损坏元素: 解析失败{parser.errors}个, 末尾截断={parser.truncated}")
                     
                     # 验证生成数量
-                    if len(batch_outline_data) < current_batch_size:
-                        logger.warning(f"批次{batch_idx+1}生成数量不足: 期望{current_batch_size}, 实际{len(batch_outline_data)}")
-                        if retry_count < MAX_RETRIES - 1:
-                            retry_count += 1
+                    if batch_accepted < current_batch_size:
+                        logger.warning(f"批次{batch_idx+1}生成数量不足: 期望{current_batch_size}, 实际{batch_accepted}")
+                        retry_count += 1
+                        if retry_count < MAX_RETRIES:
                             yield await SSEResponse.send_progress(
-                                f"生成数量不足，准备重试...",
+                                f"生成数量不足，补生成剩余章节...",
                                 batch_progress,
                                 "warning"
                             )
-                            continue
-                    
-                    # 修正章节编号
-                    for i, chapter_data in enumerate(batch_outline_data):
-                        chapter_data["chapter_number"] = start_chapter + i
+                        else:
+                            yield await SSEResponse.send_progress(
+                                f"批次{batch_idx+1}多次重试后仍数量不足，使用当前结果",
+                                batch_progress,
+                                "warning"
+                            )
+                        continue
                     
-                    all_outlines.extend(batch_outline_data)
-                    batch_success = True
-                    logger.info(f"批次{batch_idx+1}成功生成{len(batch_outline_data)}章大纲")
+                    logger.info(f"批次{batch_idx+1}成功生成{batch_accepted}章大纲")
                     
-                except json.JSONDecodeError as e:
-                    logger.error(f"大纲生成批次{batch_idx+1} JSON解析失败(尝试{retry_count+1}/{MAX_RETRIES}): {e}")
-                    retry_count += 1
-                    if retry_count < MAX_RETRIES:
-                        yield await SSEResponse.send_progress(
-                            f"解析失败，准备重试...",
-                            batch_progress,
-                            "warning"
-                        )
-                    else:
-                        yield await SSEResponse.send_progress(
-                            f"批次{batch_idx+1}多次重试失败，跳过",
-                            batch_progress,
-                            "warning"
-                        )
                 except Exception as e:
                     logger.error(f"批次{batch_idx+1}生成异常(尝试{retry_count+1}/{MAX_RETRIES}): {e}")
                     retry_count += 1
@@ -912,34 +1144,9 @@ async def outline_generator(
             yield await SSEResponse.send_error("所有批次都生成失败，请重试")
             return
         
-        outline_data = all_outlines
-        
-        # 保存到数据库
+        # 大纲和章节记录已在流式解析时写入
         yield await SSEResponse.send_progress("保存大纲到数据库...", 90)
         
-        created_outlines = []
-        for index, chapter_data in enumerate(outline_data[:chapter_count], 1):
-            chapter_num = chapter_data.get("chapter_number", index)
-            
-            outline = Outline(
-                project_id=project_id,
-                title=chapter_data.get("title", f"第{chapter_num}章"),
-                content=chapter_data.get("summary", chapter_data.get("content", "")),
-                structure=json.dumps(chapter_data, ensure_ascii=False),
-                order_index=chapter_num
-            )
-            db.add(outline)
-            created_outlines.append(outline)
-            
-            chapter = Chapter(
-                project_id=project_id,
-                chapter_number=chapter_num,
-                title=chapter_data.get("title", f"第{chapter_num}章"),
-                summary=chapter_data.get("summary", chapter_data.get("content", ""))[:500] if chapter_data.get("summary") or chapter_data.get("content") else "",
-                status="draft"
-            )
-            db.add(chapter)
-        
         # 更新项目（向导固定生成5章作为开局）
         project.chapter_count = 5
         project.narrative_perspective = narrative_perspective
@@ -960,7 +1167,7 @@ async def outline_generator(
                 {
                     "order_index": outline.order_index,
                     "title": outline.title,
-                    "content": outline.content[:100] + "..." if len(outline.content) > 100 else outline.content
+                    "content": outline.content[:100] + "..." if len(outline.content or "") > 100 else (outline.content or "")
                 } for outline in created_outlines
             ]
         })
@@ -984,13 +1191,22 @@ async def outline_generator(
 @router.post("/outline", summary="流式生成完整大纲")
 async def generate_outline_stream(
     data: Dict[str, Any],
-    db: AsyncSession = Depends(get_db),
+    request: Request,
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
     """
     使用SSE流式生成完整大纲，避免超时
+    生成在后台任务中进行，断线后可通过 /api/jobs/{job_id}/stream 继续接收；
+    重复提交相同请求时订阅同一任务，同一项目上有其他生成任务时返回409
     """
-    return create_sse_response(outline_generator(data, db, user_ai_service))
+    return await generation_jobs.start_job_response(
+        request.state.user_id,
+        "wizard_outline",
+        lambda db: outline_generator(data, db, user_ai_service),
+        project_id=data.get("project_id"),
+        target_id=data.get("project_id"),
+        params=data
+    )
 
 
 async def update_world_building_generator(
@@ -1108,16 +1324,23 @@ async def regenerate_world_building_generator(
         # 流式调用AI
         yield await SSEResponse.send_progress("正在调用AI生成...", 30)
         
-        accumulated_text = ""
+        text_parts: List[str] = []
+        text_chars = 0
         chunk_count = 0
         
-        async for chunk in user_ai_service.generate_text_stream(
+        async for chunk in coalesce_text_stream(user_ai_service.generate_text_stream(
             prompt=prompt,
             provider=provider,
             model=model
-        ):
+        )):
+            # 长时间无输出时发送心跳
+            if chunk is None:
+                yield await SSEResponse.send_heartbeat()
+                continue
+            
             chunk_count += 1
-            accumulated_text += chunk
+            text_parts.append(chunk)
+            text_chars += len(chunk)
             
             # 发送内容块
             yield await SSEResponse.send_chunk(chunk)
@@ -1125,28 +1348,15 @@ async def regenerate_world_building_generator(
             # 定期更新进度
             if chunk_count % 5 == 0:
                 progress = min(30 + (chunk_count // 5), 70)
-                yield await SSEResponse.send_progress(f"生成中... ({len(accumulated_text)}字符)", progress)
-            
-            # 每20个块发送心跳
-            if chunk_count % 20 == 0:
-                yield await SSEResponse.send_heartbeat()
+                yield await SSEResponse.send_progress(f"生成中... ({text_chars}字符)", progress)
         
         # 解析结果
         yield await SSEResponse.send_progress("解析AI返回结果...", 80)
         
         world_data = {}
         try:
-            cleaned_text = accumulated_text.strip()
-            # 移除markdown代码块标记
-            if cleaned_text.startswith('```json'):
-                cleaned_text = cleaned_text[7:].lstrip('\n\r')
-            elif cleaned_text.startswith('```'):
-                cleaned_text = cleaned_text[3:].lstrip('\n\r')
-            if cleaned_text.endswith('```'):
-                cleaned_text = cleaned_text[:-3].rstrip('\n\r')
-            cleaned_text = cleaned_text.strip()
-            
-            world_data = json.loads(cleaned_text)
+            # 容错解析（本地修复常见格式问题）
+            world_data = parse_json_tolerant("".join(text_parts), source="世界观")
         except json.JSONDecodeError as e:
             logger.error(f"AI返回非JSON格式: {e}")
             logger.info(world_data)
@@ -1198,7 +1408,7 @@ async def regenerate_world_building_generator(
 async def regenerate_world_building_stream(
     project_id: str,
     data: Dict[str, Any],
-    db: AsyncSession = Depends(get_db),
+    request: Request,
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
     """
@@ -1208,8 +1418,17 @@ async def regenerate_world_building_stream(
         "provider": "AI提供商（可选）",
         "model": "模型名称（可选）"
     }
+    生成在后台任务中进行，断线后可通过 /api/jobs/{job_id}/stream 继续接收；
+    重复提交相同请求时订阅同一任务，同一项目上有其他生成任务时返回409
     """
-    return create_sse_response(regenerate_world_building_generator(project_id, data, db, user_ai_service))
+    return await generation_jobs.start_job_response(
+        request.state.user_id,
+        "wizard_regenerate_world_building",
+        lambda db: regenerate_world_building_generator(project_id, data, db, user_ai_service),
+        project_id=project_id,
+        target_id=project_id,
+        params=data
+    )
 
 
 async def cleanup_wizard_data_generator(
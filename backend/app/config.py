@@ -44,6 +44,10 @@ class Settings(BaseSettings):
     # 数据库配置 - 使用预先计算好的绝对路径URL
     database_url: str = DATABASE_URL
     
+    # 用户数据库引擎缓存配置
+    db_engine_cache_max_size: int = 200  # 最多同时缓存的用户引擎数，0表示不限制
+    db_engine_idle_ttl: int = 1800  # 引擎空闲超过该秒数后释放，0表示不过期
+    
     # AI服务配置
     openai_api_key: Optional[str] = None
     openai_base_url: Optional[str] = None
@@ -55,6 +59,51 @@ class Settings(BaseSettings):
     default_model: str = "gpt-4"
     default_temperature: float = 0.7
     default_max_tokens: int = 2000
+    ai_client_idle_ttl: int = 600  # 共享AI客户端无引用且空闲超过该秒数后关闭，0表示不关闭
+    ai_service_cache_ttl: int = 600  # 用户AI服务（设置）缓存有效期（秒），设置变更时立即失效，0表示不过期
+    prompt_cache_enabled: bool = True  # 是否在Anthropic请求的提示词前缀上设置缓存断点（cache_control）
+    openai_stream_usage: bool = False  # OpenAI流式请求是否要求返回usage（stream_options），用于统计命中缓存的token；需确认上游支持后再开启
+    ai_response_cache_enabled: bool = True  # 是否缓存可复用的非流式AI生成结果（调用时 use_cache=True，如剧情摘要）
+    ai_response_cache_size: int = 256  # 进程内缓存的响应条数，0表示不限制
+    ai_response_cache_ttl: int = 600  # 响应缓存有效期（秒），内存和磁盘共用，0表示不过期
+    
+    # SSE流式输出配置
+    sse_coalesce_window_ms: int = 40  # 合并上游token的时间窗口（毫秒），0表示逐token发送
+    sse_coalesce_max_bytes: int = 2048  # 单个合并块的最大字节数，达到后立即发送
+    sse_heartbeat_interval: float = 15.0  # 无输出多少秒后发送心跳，0表示不发送
+    sse_subscriber_queue_size: int = 256  # 每个订阅者的待发送事件队列长度，满后合并正文事件，无法合并时转为从重放缓冲区追赶
+
+    # 后台生成任务配置
+    job_event_buffer_size: int = 2000  # 每个任务保留的事件数，断线重连时从中重放
+    job_retention_seconds: int = 900  # 任务结束后事件继续保留的秒数，供客户端重连取回结果
+    chapter_checkpoint_interval: float = 5.0  # 章节创作中距上次保存草稿超过多少秒时再次保存
+    chapter_checkpoint_chars: int = 500  # 章节创作中新增多少字时保存草稿，两个条件满足其一即保存
+
+    # 项目向导配置
+    wizard_character_concurrency: int = 3  # 并行生成角色时同时扩写的批次数
+
+    # 大纲续写配置
+    outline_arc_concurrency: int = 3  # 弧段并行续写时同时生成的批次数
+
+    # AI去味配置
+    polish_batch_concurrency: int = 4  # 批量去味（流式）时同时处理的文本数
+    polish_shard_max_chars: int = 1500  # 长文去味时单个片段的最大字数，超过则按段落切分
+    polish_shard_context_chars: int = 200  # 每个片段附带的前后文字数（仅供参考，不改写）
+    polish_shard_concurrency: int = 6  # 长文去味时同时处理的片段数
+
+    # 章节上下文配置
+    chapter_summary_enabled: bool = True  # 章节完成后是否在后台生成剧情摘要
+    chapter_summary_max_chars: int = 300  # 单章剧情摘要的目标字数
+    chapter_summary_concurrency: int = 2  # 后台同时生成摘要的章节数
+    chapter_context_full_chapters: int = 3  # 创作章节时带入完整正文的最近章节数
+    chapter_context_token_budget: int = 16000  # 前置章节上下文的token预算，超出时优先舍弃最早的剧情
+    story_arc_size: int = 10  # 每个剧情弧包含的章节数
+    story_volume_arcs: int = 5  # 每卷包含的剧情弧数
+    story_arc_summary_max_chars: int = 500  # 剧情弧摘要的目标字数
+    story_volume_summary_max_chars: int = 800  # 卷摘要的目标字数
+    project_context_cache_size: int = 256  # 缓存的项目上下文（角色简介、大纲概览等）条目数，0表示不限制
+    prompt_token_budget: int = 24000  # 章节、大纲提示词的总token预算上限，实际还不超过模型上下文窗口减去 max_tokens
+    default_context_window: int = 32000  # 无法按模型名识别上下文窗口时使用的默认值（tokens）
     
     # LinuxDO OAuth2 配置
     LINUXDO_CLIENT_ID: Optional[str] = None
@@ -1,6 +1,9 @@
 """数据库连接和会话管理 - 支持多用户数据隔离"""
 import asyncio
-from typing import Dict, Any
+import time
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Any, List, Tuple
 from datetime import datetime
 from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
@@ -15,13 +18,33 @@ logger = get_logger(__name__)
 # 创建基类
 Base = declarative_base()
 
-# 引擎缓存：每个用户一个引擎
-_engine_cache: Dict[str, Any] = {}
+# 引擎缓存：每个用户一个引擎（LRU顺序，最近使用的在末尾）
+_engine_cache: "OrderedDict[str, Any]" = OrderedDict()
+
+# 引擎最后使用时间（用于空闲过期）
+_engine_last_used: Dict[str, float] = {}
+
+# 引擎上的活跃会话数（有活跃会话的引擎不会被淘汰）
+_engine_active_sessions: Dict[str, int] = {}
 
 # 锁管理：用于保护引擎创建过程
 _engine_locks: Dict[str, asyncio.Lock] = {}
 _cache_lock = asyncio.Lock()
 
+# 正在后台释放的引擎任务（保持引用，避免被GC回收）
+_dispose_tasks: set = set()
+
+# 引擎缓存统计
+_engine_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "expirations": 0,
+    "size": 0,
+    "max_size": settings.db_engine_cache_max_size,
+    "idle_ttl": settings.db_engine_idle_ttl
+}
+
 # 会话统计（用于监控连接泄漏）
 _session_stats = {
     "created": 0,
@@ -33,9 +56,103 @@ _session_stats = {
 }
 
 
+def _touch_engine(user_id: str):
+    """标记引擎为最近使用"""
+    _engine_cache.move_to_end(user_id)
+    _engine_last_used[user_id] = time.monotonic()
+
+
+def _pin_engine(user_id: str):
+    """增加引擎的活跃会话计数，防止被淘汰"""
+    _engine_active_sessions[user_id] = _engine_active_sessions.get(user_id, 0) + 1
+
+
+def _unpin_engine(user_id: str):
+    """减少引擎的活跃会话计数"""
+    count = _engine_active_sessions.get(user_id, 0) - 1
+    if count > 0:
+        _engine_active_sessions[user_id] = count
+    else:
+        _engine_active_sessions.pop(user_id, None)
+        # 引擎已被淘汰时顺便清理遗留的时间戳
+        if user_id not in _engine_cache:
+            _engine_last_used.pop(user_id, None)
+
+
+def _select_engines_to_evict(keep_user_id: str) -> List[Tuple[str, Any, str]]:
+    """
+    选出需要淘汰的引擎并从缓存中移除（同步执行，不会让出事件循环）
+    
+    先淘汰空闲超时的引擎，再按LRU顺序淘汰超出容量的引擎。
+    有活跃会话的引擎和本次请求的引擎永远不会被淘汰。
+    
+    Args:
+        keep_user_id: 本次请求的用户ID
+        
+    Returns:
+        [(用户ID, 引擎, 淘汰原因)]
+    """
+    now = time.monotonic()
+    max_size = settings.db_engine_cache_max_size
+    idle_ttl = settings.db_engine_idle_ttl
+    victims = []
+    
+    for user_id in list(_engine_cache.keys()):
+        if user_id == keep_user_id or _engine_active_sessions.get(user_id, 0) > 0:
+            continue
+        
+        idle_seconds = now - _engine_last_used.get(user_id, now)
+        if idle_ttl > 0 and idle_seconds >= idle_ttl:
+            reason = "expired"
+        elif max_size > 0 and len(_engine_cache) > max_size:
+            reason = "evicted"
+        else:
+            # LRU顺序：后面的引擎更新，不会再满足任一条件
+            break
+        
+        victims.append((user_id, _engine_cache.pop(user_id), reason))
+        _engine_last_used.pop(user_id, None)
+        lock = _engine_locks.get(user_id)
+        if lock is not None and not lock.locked():
+            _engine_locks.pop(user_id, None)
+    
+    for _, _, reason in victims:
+        if reason == "expired":
+            _engine_cache_stats["expirations"] += 1
+        else:
+            _engine_cache_stats["evictions"] += 1
+    _engine_cache_stats["size"] = len(_engine_cache)
+    
+    if max_size > 0 and len(_engine_cache) > max_size:
+        logger.warning(f"⚠️ 引擎缓存超出上限 {len(_engine_cache)}/{max_size}，剩余引擎均有活跃会话")
+    
+    return victims
+
+
+async def _dispose_engine(user_id: str, engine, reason: str):
+    """释放被淘汰的引擎"""
+    try:
+        await engine.dispose()
+        reason_text = "空闲超时" if reason == "expired" else "超出缓存容量"
+        logger.info(f"♻️ 用户 {user_id} 的数据库引擎已释放（{reason_text}）")
+    except Exception as e:
+        logger.error(f"❌ 释放用户 {user_id} 的数据库引擎失败: {str(e)}")
+
+
+def _schedule_dispose(victims: List[Tuple[str, Any, str]]):
+    """在后台释放被淘汰的引擎，避免阻塞当前请求"""
+    for user_id, engine, reason in victims:
+        task = asyncio.get_running_loop().create_task(_dispose_engine(user_id, engine, reason))
+        _dispose_tasks.add(task)
+        task.add_done_callback(_dispose_tasks.discard)
+
+
 async def get_engine(user_id: str):
     """获取或创建用户专属的数据库引擎（线程安全）
     
+    引擎缓存为LRU + 空闲过期策略，容量和过期时间由
+    db_engine_cache_max_size / db_engine_idle_ttl 配置。
+    
     Args:
         user_id: 用户ID
         
@@ -43,6 +160,9 @@ async def get_engine(user_id: str):
         用户专属的异步引擎
     """
     if user_id in _engine_cache:
+        _engine_cache_stats["hits"] += 1
+        _touch_engine(user_id)
+        _schedule_dispose(_select_engines_to_evict(user_id))
         return _engine_cache[user_id]
     
     async with _cache_lock:
@@ -52,6 +172,7 @@ async def get_engine(user_id: str):
     
     async with user_lock:
         if user_id not in _engine_cache:
+            _engine_cache_stats["misses"] += 1
             db_url = f"sqlite+aiosqlite:///data/ai_story_user_{user_id}.db"
             engine = create_async_engine(
                 db_url,
@@ -80,9 +201,22 @@ async def get_engine(user_id: str):
             _engine_cache[user_id] = engine
             logger.info(f"为用户 {user_id} 创建数据库引擎")
         
+        _touch_engine(user_id)
+        _schedule_dispose(_select_engines_to_evict(user_id))
         return _engine_cache[user_id]
 
 
+def get_engine_cache_stats() -> Dict[str, Any]:
+    """获取引擎缓存统计（命中/未命中/淘汰次数等）"""
+    total = _engine_cache_stats["hits"] + _engine_cache_stats["misses"]
+    return {
+        **_engine_cache_stats,
+        "size": len(_engine_cache),
+        "pinned": sum(1 for count in _engine_active_sessions.values() if count > 0),
+        "hit_rate": round(_engine_cache_stats["hits"] / total, 4) if total else None
+    }
+
+
 async def get_db(request: Request):
     """获取数据库会话的依赖函数
     
@@ -94,6 +228,8 @@ async def get_db(request: Request):
         raise HTTPException(status_code=401, detail="未登录或用户ID缺失")
     
     engine = await get_engine(user_id)
+    # 会话存活期间锁定引擎，避免被淘汰
+    _pin_engine(user_id)
     
     AsyncSessionLocal = async_sessionmaker(
         engine,
@@ -103,6 +239,7 @@ async def get_db(request: Request):
     
     session = AsyncSessionLocal()
     session_id = id(session)
+    engine_released = False
     
     global _session_stats
     _session_stats["created"] += 1
@@ -141,6 +278,8 @@ async def get_db(request: Request):
                 logger.warning(f"⚠️ finally中发现未提交事务 [User:{user_id}][ID:{session_id}]，已回滚")
             
             await session.close()
+            _unpin_engine(user_id)
+            engine_released = True
             
             _session_stats["closed"] += 1
             _session_stats["active"] -= 1
@@ -160,6 +299,27 @@ async def get_db(request: Request):
                 await session.close()
             except:
                 pass
+            if not engine_released:
+                _unpin_engine(user_id)
+
+
+@asynccontextmanager
+async def user_session(user_id: str) -> AsyncIterator[AsyncSession]:
+    """为后台任务打开指定用户的数据库会话
+    
+    不依赖请求上下文，会话存活期间同样锁定引擎，避免被淘汰。
+    
+    Args:
+        user_id: 用户ID
+    """
+    engine = await get_engine(user_id)
+    _pin_engine(user_id)
+    try:
+        async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+            yield session
+    finally:
+        _unpin_engine(user_id)
+
 
 async def _init_relationship_types(user_id: str):
     """为指定用户初始化预置的关系类型数据
@@ -291,12 +451,16 @@ async def init_db(user_id: str):
     try:
         logger.info(f"开始初始化用户 {user_id} 的数据库...")
         engine = await get_engine(user_id)
+        _pin_engine(user_id)
         
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        
-        await _init_relationship_types(user_id)
-        await _init_global_writing_styles(user_id)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            
+            await _init_relationship_types(user_id)
+            await _init_global_writing_styles(user_id)
+        finally:
+            _unpin_engine(user_id)
         
         logger.info(f"用户 {user_id} 的数据库初始化成功")
     except Exception as e:
@@ -308,10 +472,16 @@ async def close_db():
     """关闭所有数据库连接"""
     try:
         logger.info("正在关闭所有数据库连接...")
+        if _dispose_tasks:
+            await asyncio.gather(*list(_dispose_tasks), return_exceptions=True)
         for user_id, engine in _engine_cache.items():
             await engine.dispose()
             logger.info(f"用户 {user_id} 的数据库连接已关闭")
         _engine_cache.clear()
+        _engine_last_used.clear()
+        _engine_active_sessions.clear()
+        _engine_locks.clear()
+        _engine_cache_stats["size"] = 0
         logger.info("所有数据库连接已关闭")
     except Exception as e:
         logger.error(f"关闭数据库连接失败: {str(e)}", exc_info=True)
@@ -8,10 +8,20 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 
 from app.config import settings as config_settings
-from app.database import close_db, _session_stats
+from app.database import close_db, _session_stats, get_engine_cache_stats
 from app.logger import setup_logging, get_logger
-from app.middleware import RequestIDMiddleware
+from app.middleware import RequestIDMiddleware, AICacheControlMiddleware
 from app.middleware.auth_middleware import AuthMiddleware
+from app.services.ai_client_pool import ai_client_pool
+from app.services.ai_service import get_prompt_cache_stats, get_cancellation_stats
+from app.services.ai_response_cache import get_response_cache_stats, close_response_cache
+from app.utils.sse_response import get_sse_stats
+from app.utils.json_repair import get_json_repair_stats
+from app.services.chapter_summary_service import get_chapter_summary_stats
+from app.services.chapter_completion_index import get_completion_index_stats
+from app.services.project_context_cache import get_context_cache_stats
+from app.services.generation_jobs import JobConflictError, get_job_stats, shutdown_jobs
+from app.services.chapter_checkpoint import get_checkpoint_stats
 
 setup_logging(
     level=config_settings.log_level,
@@ -27,8 +37,12 @@ logger = get_logger(__name__)
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     logger.info("应用启动，等待用户登录...")
+    ai_client_pool.start_sweeper()
     
     yield
+    await shutdown_jobs()
+    await ai_client_pool.close_all()
+    await close_response_cache()
     await close_db()
     logger.info("应用已关闭")
 
@@ -52,6 +66,18 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         }
     )
 
+@app.exception_handler(JobConflictError)
+async def job_conflict_exception_handler(request: Request, exc: JobConflictError):
+    """同一目标上已有其他生成任务在运行"""
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={
+            "detail": str(exc),
+            "job_id": exc.job.id,
+            "kind": exc.job.kind
+        }
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """处理所有未捕获的异常"""
@@ -65,6 +91,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 app.add_middleware(RequestIDMiddleware)
+app.add_middleware(AICacheControlMiddleware)
 app.add_middleware(AuthMiddleware)
 
 if config_settings.debug:
@@ -111,10 +138,234 @@ async def db_session_stats():
     }
 
 
+@app.get("/health/db-engines")
+async def db_engine_stats():
+    """
+    数据库引擎缓存统计
+    
+    返回：
+    - hits / misses: 引擎缓存命中/未命中次数
+    - evictions: 因超出容量被淘汰的次数
+    - expirations: 因空闲超时被释放的次数
+    - size / max_size: 当前缓存引擎数 / 容量上限
+    - pinned: 有活跃会话（不可淘汰）的引擎数
+    - hit_rate: 命中率
+    """
+    return {
+        "status": "ok",
+        "engine_stats": get_engine_cache_stats()
+    }
+
+
+@app.get("/health/ai-clients")
+async def ai_client_pool_stats():
+    """
+    AI客户端池统计
+    
+    返回：
+    - clients: 池中的SDK客户端数（按 provider + base_url + API密钥 区分）
+    - clients_in_use: 仍被AIService实例引用的客户端数
+    - transports: 共享的HTTP连接池数（每个上游地址一个）
+    - created / reused / closed: 创建、复用、关闭次数
+    """
+    return {
+        "status": "ok",
+        "pool_stats": ai_client_pool.get_stats()
+    }
+
+
+@app.get("/health/prompt-cache")
+async def prompt_cache_stats():
+    """
+    提示词前缀缓存统计（按提供商）
+    
+    返回：
+    - calls / calls_with_usage: 调用次数 / 上游返回了usage的次数
+    - input_tokens: 输入token总数（含命中缓存的部分）
+    - cached_input_tokens / uncached_input_tokens: 命中 / 未命中前缀缓存的输入token数
+    - cache_write_input_tokens: 写入缓存的输入token数（仅Anthropic）
+    - output_tokens: 输出token总数
+    - cached_ratio: 输入token中命中缓存的比例
+    """
+    return {
+        "status": "ok",
+        "prompt_cache_stats": get_prompt_cache_stats()
+    }
+
+
+@app.get("/health/ai-cancellations")
+async def ai_cancellation_stats():
+    """
+    AI调用中途取消统计（按提供商，客户端断开或任务取消时上游连接立即关闭）
+    
+    返回：
+    - cancelled_calls / cancelled_streams: 取消的非流式 / 流式调用数
+    - input_tokens / output_tokens: 取消前已消耗的输入 / 已生成的输出token数（估算）
+    """
+    return {
+        "status": "ok",
+        "ai_cancellation_stats": get_cancellation_stats()
+    }
+
+
+@app.get("/health/ai-response-cache")
+async def ai_response_cache_stats():
+    """
+    AI响应缓存统计（非流式生成）
+    
+    返回：
+    - memory_hits / disk_hits: 内存 / 磁盘命中次数
+    - misses: 未命中次数
+    - bypassed: 按请求跳过缓存的次数
+    - stores / expired: 写入次数 / 过期淘汰次数
+    - disk_errors: 磁盘缓存读写失败次数
+    - memory_size / memory_max_size / ttl: 内存条目数 / 容量上限 / 有效期（秒）
+    - hit_rate: 命中率（内存+磁盘）
+    """
+    return {
+        "status": "ok",
+        "ai_response_cache_stats": get_response_cache_stats()
+    }
+
+
+@app.get("/health/sse")
+async def sse_stream_stats():
+    """
+    SSE流量统计
+    
+    返回：
+    - streams: 累计SSE流数
+    - active: 当前打开的SSE流数
+    - disconnects: 客户端中途断开的次数（未在后台任务中运行的生成随之取消）
+    - frames / bytes: 累计发送的帧数 / 字节数
+    - broadcast_subscribers: 当前收听实时广播的订阅者数
+    - broadcast_coalesced: 订阅者队列已满时合并正文事件的次数
+    - broadcast_dropped: 订阅者队列已满且无法合并、被移出广播的次数
+    """
+    return {
+        "status": "ok",
+        "sse_stats": get_sse_stats()
+    }
+
+
+@app.get("/health/json-repair")
+async def json_repair_stats():
+    """
+    AI输出JSON容错解析统计
+    
+    返回：
+    - calls: 累计解析次数
+    - clean: 无需修复直接解析成功的次数
+    - repaired: 本地修复后解析成功的次数（每次都省去一次AI重新生成）
+    - failed: 修复后仍失败的次数
+    - repairs: 各修复步骤的生效次数
+    """
+    return {
+        "status": "ok",
+        "json_repair_stats": get_json_repair_stats()
+    }
+
+
+@app.get("/health/chapter-summaries")
+async def chapter_summary_stats():
+    """
+    章节剧情摘要统计
+    
+    返回：
+    - scheduled: 累计调度的后台摘要任务数
+    - generated: 成功生成的摘要数
+    - unchanged: 正文未变化、跳过生成的次数
+    - failed: 生成失败次数
+    - fallbacks: 创作时缺少摘要、回退为正文开头的章节数
+    - nodes_generated / nodes_unchanged: 剧情弧/卷摘要重新汇总 / 无变化跳过的次数
+    - context_items_dropped: 因超出token预算未带入上下文的条目数
+    - running: 当前未完成的摘要任务数
+    """
+    return {
+        "status": "ok",
+        "chapter_summary_stats": get_chapter_summary_stats()
+    }
+
+
+@app.get("/health/chapter-completion")
+async def chapter_completion_index_stats():
+    """
+    章节完成度索引统计
+    
+    返回：
+    - hits: 直接命中索引的前置条件检查次数
+    - rebuilds: 索引缺失或失效后重建的次数
+    - incremental_updates: 章节新增/正文变化时增量更新索引的次数
+    - invalidations: 删除章节、修改章节序号或批量修改导致索引失效的次数
+    """
+    return {
+        "status": "ok",
+        "completion_index_stats": get_completion_index_stats()
+    }
+
+
+@app.get("/health/project-context-cache")
+async def project_context_cache_stats():
+    """
+    项目上下文缓存统计
+    
+    返回：
+    - hits / misses: 缓存命中/未命中次数
+    - bypassed: 当前事务有未提交修改、绕过缓存的次数
+    - invalidations: 写入提交后项目版本号递增的次数
+    - size / max_size: 当前条目数 / 容量上限
+    - hit_rate: 命中率
+    """
+    return {
+        "status": "ok",
+        "project_context_cache_stats": get_context_cache_stats()
+    }
+
+
+@app.get("/health/generation-jobs")
+async def generation_job_stats():
+    """
+    后台生成任务统计
+    
+    返回：
+    - started / completed / failed / cancelled: 累计启动、成功、失败、取消的任务数
+    - events: 累计写入重放缓冲区的事件数
+    - deduplicated: 重复请求直接订阅进行中任务的次数（每次省去一次AI生成）
+    - conflicts: 因同一目标上已有其他任务而被拒绝（409）的请求数
+    - subscriptions / resumes: 累计订阅数 / 带 Last-Event-ID 的续传订阅数
+    - replay_gaps: 重连时所需事件已被挤出缓冲区的次数
+    - catch_ups: 订阅者处理过慢被移出实时广播、改为追赶重放缓冲区的次数
+    - running / retained: 运行中 / 已结束但仍保留事件的任务数
+    - subscribers: 当前连接的订阅者数
+    """
+    return {
+        "status": "ok",
+        "generation_job_stats": get_job_stats()
+    }
+
+
+@app.get("/health/chapter-checkpoints")
+async def chapter_checkpoint_stats():
+    """
+    章节创作草稿统计
+    
+    返回：
+    - started / resumes: 开始创作 / 从草稿续写的次数
+    - checkpoints: 创作过程中保存草稿的次数
+    - completed / discarded: 创作完成后删除 / 手动放弃的草稿数
+    - errors: 保存草稿失败次数
+    - interval / chars: 保存间隔（秒）/ 保存字数阈值
+    """
+    return {
+        "status": "ok",
+        "chapter_checkpoint_stats": get_checkpoint_stats()
+    }
+
+
 from app.api import (
     projects, outlines, characters, chapters,
     wizard_stream, relationships, organizations,
-    auth, users, settings, writing_styles
+    auth, users, settings, writing_styles, jobs, polish
 )
 
 app.include_router(auth.router, prefix="/api")
@@ -129,6 +380,8 @@ app.include_router(chapters.router, prefix="/api")
 app.include_router(relationships.router, prefix="/api")
 app.include_router(organizations.router, prefix="/api")
 app.include_router(writing_styles.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(polish.router, prefix="/api")
 
 static_dir = Path(__file__).parent.parent / "static"
 if static_dir.exists():
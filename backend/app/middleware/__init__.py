@@ -1,4 +1,5 @@
 """中间件模块"""
 from .request_id import RequestIDMiddleware
+from .ai_cache_control import AICacheControlMiddleware
 
-__all__ = ['RequestIDMiddleware']
\ No newline at end of file
+__all__ = ['RequestIDMiddleware', 'AICacheControlMiddleware']
\ No newline at end of file
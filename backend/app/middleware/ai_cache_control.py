@@ -0,0 +1,36 @@
+"""AI响应缓存控制中间件"""
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from typing import Callable
+
+from app.services.ai_response_cache import bypass_response_cache
+
+
+class AICacheControlMiddleware(BaseHTTPMiddleware):
+    """
+    AI响应缓存控制中间件
+    
+    请求头带有 Cache-Control: no-cache 或 X-AI-Cache: bypass 时，
+    本次请求中开启了缓存的非流式AI调用跳过读取（强制重新生成）
+    """
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        """
+        处理请求，按请求头设置是否跳过AI响应缓存
+        
+        Args:
+            request: 请求对象
+            call_next: 下一个处理器
+            
+        Returns:
+            响应对象
+        """
+        cache_control = request.headers.get('Cache-Control', '').lower()
+        bypass = 'no-cache' in cache_control or request.headers.get('X-AI-Cache', '').lower() == 'bypass'
+        
+        token = bypass_response_cache.set(bypass)
+        try:
+            return await call_next(request)
+        finally:
+            bypass_response_cache.reset(token)
@@ -18,6 +18,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         
         # 注入到 request.state
         if user_id:
+            # 从用户管理器的内存索引中查询，不读取磁盘
             user = await user_manager.get_user(user_id)
             if user:
                 request.state.user_id = user_id
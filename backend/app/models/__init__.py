@@ -3,7 +3,12 @@ from app.models.project import Project
 from app.models.outline import Outline
 from app.models.character import Character
 from app.models.chapter import Chapter
+from app.models.chapter_draft import ChapterDraft
+from app.models.chapter_summary import ChapterSummary
+from app.models.story_summary import StorySummaryNode
+from app.models.chapter_completion import ChapterCompletionIndex
 from app.models.generation_history import GenerationHistory
+from app.models.generation_job import GenerationJob
 from app.models.settings import Settings
 from app.models.writing_style import WritingStyle
 from app.models.project_default_style import ProjectDefaultStyle
@@ -19,7 +24,12 @@ __all__ = [
     "Outline",
     "Character",
     "Chapter",
+    "ChapterDraft",
+    "ChapterSummary",
+    "StorySummaryNode",
+    "ChapterCompletionIndex",
     "GenerationHistory",
+    "GenerationJob",
     "Settings",
     "WritingStyle",
     "ProjectDefaultStyle",
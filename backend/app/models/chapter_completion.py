@@ -0,0 +1,18 @@
+"""章节完成度索引数据模型"""
+from sqlalchemy import Column, String, Integer, LargeBinary, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ChapterCompletionIndex(Base):
+    """章节完成度索引表（每个项目一行，按章节序号记录章节是否存在、是否已有正文）"""
+    __tablename__ = "chapter_completion_index"
+    
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    existing_bitmap = Column(LargeBinary, nullable=False, default=b"", comment="第n位表示第n+1章是否存在")
+    completed_bitmap = Column(LargeBinary, nullable=False, default=b"", comment="第n位表示第n+1章是否已有正文")
+    first_incomplete = Column(Integer, nullable=True, comment="第一个没有正文的章节序号，NULL表示全部完成")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    
+    def __repr__(self):
+        return f"<ChapterCompletionIndex(project_id={self.project_id}, first_incomplete={self.first_incomplete})>"
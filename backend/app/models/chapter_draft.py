@@ -0,0 +1,19 @@
+"""章节生成草稿数据模型"""
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ChapterDraft(Base):
+    """章节生成草稿表（流式创作过程中定期保存已生成的部分，中断后可从这里续写）"""
+    __tablename__ = "chapter_drafts"
+    
+    chapter_id = Column(String(36), ForeignKey("chapters.id", ondelete="CASCADE"), primary_key=True)
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    content = Column(Text, nullable=False, default="", comment="已生成的正文")
+    word_count = Column(Integer, nullable=False, default=0, comment="已生成字数")
+    previous_status = Column(String(20), nullable=True, comment="开始生成前的章节状态，放弃草稿时恢复")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="最后保存时间")
+    
+    def __repr__(self):
+        return f"<ChapterDraft(chapter_id={self.chapter_id}, word_count={self.word_count})>"
@@ -0,0 +1,22 @@
+"""章节剧情摘要数据模型"""
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+import uuid
+
+
+class ChapterSummary(Base):
+    """章节剧情摘要表（根据已完成的正文生成，用于后续章节的上下文）"""
+    __tablename__ = "chapter_summaries"
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    chapter_id = Column(String(36), ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False, unique=True)
+    chapter_number = Column(Integer, nullable=False, comment="章节序号")
+    summary = Column(Text, nullable=False, comment="剧情摘要")
+    content_hash = Column(String(64), nullable=False, comment="生成摘要时正文的哈希，正文变化后需要重新生成")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    
+    def __repr__(self):
+        return f"<ChapterSummary(chapter_id={self.chapter_id}, chapter_number={self.chapter_number})>"
@@ -0,0 +1,22 @@
+"""后台生成任务数据模型"""
+from sqlalchemy import Column, String, Text, Integer, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class GenerationJob(Base):
+    """后台生成任务表（记录任务状态，事件本身只保存在进程内存中用于断线重放）"""
+    __tablename__ = "generation_jobs"
+    
+    id = Column(String(36), primary_key=True)
+    project_id = Column(String(36), nullable=True, index=True, comment="所属项目ID（创建项目的任务开始时为空）")
+    kind = Column(String(50), nullable=False, comment="任务类型，如 chapter / wizard_outline")
+    target_id = Column(String(36), nullable=True, comment="任务目标ID，如章节ID")
+    status = Column(String(20), nullable=False, default="running", comment="running/completed/failed/cancelled/interrupted")
+    last_event_id = Column(Integer, nullable=False, default=0, comment="最后一个事件的ID")
+    error = Column(Text, nullable=True, comment="失败原因")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    finished_at = Column(DateTime, nullable=True, comment="结束时间")
+    
+    def __repr__(self):
+        return f"<GenerationJob(id={self.id}, kind={self.kind}, status={self.status})>"
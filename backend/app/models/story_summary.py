@@ -0,0 +1,26 @@
+"""剧情摘要树数据模型"""
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+import uuid
+
+
+class StorySummaryNode(Base):
+    """剧情摘要树节点表（剧情弧由若干章摘要汇总而成，卷由若干剧情弧汇总而成）"""
+    __tablename__ = "story_summary_nodes"
+    __table_args__ = (
+        UniqueConstraint("project_id", "level", "start_chapter", name="uq_story_summary_node"),
+    )
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    level = Column(String(20), nullable=False, comment="节点层级：arc/volume")
+    start_chapter = Column(Integer, nullable=False, comment="起始章节序号")
+    end_chapter = Column(Integer, nullable=False, comment="结束章节序号")
+    summary = Column(Text, nullable=False, comment="剧情摘要")
+    source_hash = Column(String(64), nullable=False, comment="生成时下级摘要的哈希，下级变化后需要重新生成")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    
+    def __repr__(self):
+        return f"<StorySummaryNode(level={self.level}, chapters={self.start_chapter}-{self.end_chapter})>"
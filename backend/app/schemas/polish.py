@@ -1,12 +1,12 @@
 """AI去味相关的Pydantic模型"""
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 
 
 class PolishRequest(BaseModel):
     """AI去味请求模型"""
     original_text: str = Field(..., description="原始文本（AI生成的文本）")
-    project_id: Optional[int] = Field(None, description="项目ID（可选，用于记录历史）")
+    project_id: Optional[str] = Field(None, description="项目ID（可选，用于记录历史）")
     provider: Optional[str] = Field(None, description="AI提供商")
     model: Optional[str] = Field(None, description="AI模型")
     temperature: Optional[float] = Field(0.8, description="温度参数，建议0.7-0.9")
@@ -17,4 +17,14 @@ class PolishResponse(BaseModel):
     original_text: str = Field(..., description="原始文本")
     polished_text: str = Field(..., description="去味后的文本")
     word_count_before: int = Field(..., description="处理前字数")
-    word_count_after: int = Field(..., description="处理后字数")
\ No newline at end of file
+    word_count_after: int = Field(..., description="处理后字数")
+
+
+class PolishBatchRequest(BaseModel):
+    """批量AI去味（流式）请求模型"""
+    texts: List[str] = Field(..., min_length=1, description="待处理的文本列表")
+    project_id: Optional[str] = Field(None, description="项目ID（可选，每个文本完成后记录到生成历史）")
+    provider: Optional[str] = Field(None, description="AI提供商")
+    model: Optional[str] = Field(None, description="AI模型")
+    temperature: Optional[float] = Field(0.8, description="温度参数，建议0.7-0.9")
+    concurrency: Optional[int] = Field(None, ge=1, le=16, description="同时处理的文本数，默认取配置 polish_batch_concurrency，且不超过该配置")
@@ -0,0 +1,210 @@
+"""AI客户端连接池 - 进程内共享的httpx/SDK客户端"""
+import asyncio
+import hashlib
+import time
+from typing import Optional, Dict, Any, Tuple
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
+from app.config import settings as app_settings
+from app.logger import get_logger
+import httpx
+
+logger = get_logger(__name__)
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    """
+    创建带超时和连接池配置的httpx客户端
+    
+    - 超时：连接10s，读取180s（适合长文本生成），写入10s，连接池10s
+    - 连接池：50个保活连接，最大100个并发，30秒后过期未使用的连接
+    """
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            connect=10.0,
+            read=180.0,
+            write=10.0,
+            pool=10.0
+        ),
+        limits=httpx.Limits(
+            max_keepalive_connections=50,
+            max_connections=100,
+            keepalive_expiry=30.0
+        )
+    )
+
+
+def _hash_api_key(api_key: str) -> str:
+    """API密钥只以哈希形式作为池的键，避免明文驻留在键和日志中"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class AIClientPool:
+    """
+    AI客户端池
+    
+    - SDK客户端按 (provider, base_url, api_key哈希) 复用
+    - 同一上游 (provider, base_url) 的所有SDK客户端共享一个httpx连接池，复用TLS连接
+    - 引用计数归零且空闲超过 ai_client_idle_ttl 秒的客户端会被关闭：
+      acquire()/release() 时顺带清理，另有后台任务定期清理（没有新请求时也能关闭）
+    """
+    
+    def __init__(self, idle_ttl: int):
+        self.idle_ttl = idle_ttl
+        # {(provider, base_url, key_hash): {"client", "transport_key", "ref_count", "last_used"}}
+        self._clients: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        # {(provider, base_url): {"http_client", "ref_count"}}
+        self._transports: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._close_tasks: set = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "closed": 0
+        }
+    
+    def acquire(self, provider: str, api_key: str, base_url: Optional[str]) -> Tuple[Any, Tuple[str, str, str]]:
+        """
+        获取（或创建）共享客户端，引用计数+1
+        
+        Args:
+            provider: openai/anthropic
+            api_key: API密钥
+            base_url: API基础URL，为空时使用SDK默认地址
+        
+        Returns:
+            (SDK客户端, 池键)，池键用于 release()
+        """
+        base_url = base_url or ""
+        key = (provider, base_url, _hash_api_key(api_key))
+        
+        entry = self._clients.get(key)
+        if entry is not None:
+            self._stats["reused"] += 1
+        else:
+            transport_key = (provider, base_url)
+            transport = self._transports.get(transport_key)
+            if transport is None:
+                transport = {"http_client": _create_http_client(), "ref_count": 0}
+                self._transports[transport_key] = transport
+                logger.info(f"✅ 创建共享HTTP连接池: {provider} {base_url or '(默认地址)'}")
+            
+            client_kwargs = {
+                "api_key": api_key,
+                "http_client": transport["http_client"]
+            }
+            if base_url:
+                client_kwargs["base_url"] = base_url
+            
+            if provider == "openai":
+                client = AsyncOpenAI(**client_kwargs)
+            elif provider == "anthropic":
+                client = AsyncAnthropic(**client_kwargs)
+            else:
+                raise ValueError(f"不支持的AI提供商: {provider}")
+            
+            transport["ref_count"] += 1
+            entry = {
+                "client": client,
+                "transport_key": transport_key,
+                "ref_count": 0,
+                "last_used": time.monotonic()
+            }
+            self._clients[key] = entry
+            self._stats["created"] += 1
+        
+        entry["ref_count"] += 1
+        entry["last_used"] = time.monotonic()
+        self._sweep_idle()
+        return entry["client"], key
+    
+    def release(self, key: Tuple[str, str, str]):
+        """引用计数-1（AIService被回收时调用）"""
+        entry = self._clients.get(key)
+        if entry is None:
+            return
+        entry["ref_count"] = max(0, entry["ref_count"] - 1)
+        entry["last_used"] = time.monotonic()
+        self._sweep_idle()
+    
+    def start_sweeper(self):
+        """启动定期清理空闲客户端的后台任务（应用启动时调用）"""
+        if self.idle_ttl <= 0 or (self._sweeper is not None and not self._sweeper.done()):
+            return
+        self._sweeper = asyncio.get_running_loop().create_task(self._sweep_periodically())
+    
+    async def _sweep_periodically(self):
+        """每隔 idle_ttl 的一半检查一次空闲客户端"""
+        interval = max(1, self.idle_ttl // 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self._sweep_idle()
+            except Exception as e:
+                logger.error(f"❌ 清理空闲AI客户端失败: {str(e)}")
+    
+    def _sweep_idle(self):
+        """移除空闲超时的客户端，无引用的httpx连接池在后台关闭"""
+        if self.idle_ttl <= 0:
+            return
+        
+        now = time.monotonic()
+        idle_keys = [
+            key for key, entry in self._clients.items()
+            if entry["ref_count"] == 0 and now - entry["last_used"] >= self.idle_ttl
+        ]
+        for key in idle_keys:
+            entry = self._clients.pop(key)
+            transport_key = entry["transport_key"]
+            transport = self._transports[transport_key]
+            transport["ref_count"] -= 1
+            if transport["ref_count"] <= 0:
+                del self._transports[transport_key]
+                self._schedule_close(transport_key, transport["http_client"])
+    
+    def _schedule_close(self, transport_key: Tuple[str, str], http_client: httpx.AsyncClient):
+        """在后台关闭httpx客户端"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环（如模块导入阶段），交给GC处理
+            return
+        task = loop.create_task(self._close_transport(transport_key, http_client))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+    
+    async def _close_transport(self, transport_key: Tuple[str, str], http_client: httpx.AsyncClient):
+        """关闭httpx客户端"""
+        try:
+            await http_client.aclose()
+            self._stats["closed"] += 1
+            logger.info(f"♻️ 空闲HTTP连接池已关闭: {transport_key[0]} {transport_key[1] or '(默认地址)'}")
+        except Exception as e:
+            logger.error(f"❌ 关闭HTTP连接池失败: {str(e)}")
+    
+    async def close_all(self):
+        """关闭所有客户端（应用关闭时调用）"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        if self._close_tasks:
+            await asyncio.gather(*list(self._close_tasks), return_exceptions=True)
+        for transport_key, transport in list(self._transports.items()):
+            await self._close_transport(transport_key, transport["http_client"])
+        self._transports.clear()
+        self._clients.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池统计"""
+        return {
+            **self._stats,
+            "clients": len(self._clients),
+            "clients_in_use": sum(1 for entry in self._clients.values() if entry["ref_count"] > 0),
+            "transports": len(self._transports),
+            "idle_ttl": self.idle_ttl
+        }
+
+
+# 全局AI客户端池
+ai_client_pool = AIClientPool(idle_ttl=app_settings.ai_client_idle_ttl)
@@ -0,0 +1,203 @@
+"""
+AI响应缓存 - 按请求内容寻址的非流式生成结果缓存
+
+键为 (上游客户端, 提供商, 模型, 温度, 最大tokens, 系统提示词, 提示词) 的SHA-256，
+上游客户端区分 base_url 和API密钥哈希，不同密钥之间不共享结果。
+两级存储：进程内LRU + 磁盘SQLite（data/ai_response_cache.db），两级共用同一个TTL。
+缓存按调用点开启（generate_text 的 use_cache=True），只用于结果可以复用的调用（如剧情摘要），
+调用方提供 validate 时只缓存通过校验的结果；请求头 Cache-Control: no-cache / X-AI-Cache: bypass
+可以让本次请求中开启了缓存的调用也跳过读取。
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.config import settings, DATA_DIR
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 磁盘缓存文件（与用户数据库分开，不随用户库创建）
+CACHE_DB_FILE = DATA_DIR / "ai_response_cache.db"
+
+_metadata = MetaData()
+_responses = Table(
+    "ai_responses",
+    _metadata,
+    Column("key", String(64), primary_key=True),
+    Column("response", Text, nullable=False),
+    Column("created_at", Float, nullable=False, index=True)
+)
+
+# 当前请求是否跳过缓存（由 AICacheControlMiddleware 根据请求头设置）
+bypass_response_cache: ContextVar[bool] = ContextVar("bypass_response_cache", default=False)
+
+# 进程内缓存：键 -> (写入时间, 响应)，LRU顺序
+_memory_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+_engine: Optional[AsyncEngine] = None
+_engine_lock = asyncio.Lock()
+
+# 每写入多少次清理一次磁盘上的过期条目
+_PURGE_EVERY = 100
+_stores_since_purge = 0
+
+# AI响应缓存统计（累计值）
+_response_cache_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "bypassed": 0,
+    "stores": 0,
+    "expired": 0,
+    "disk_errors": 0
+}
+
+
+def get_response_cache_stats() -> Dict[str, Any]:
+    """获取AI响应缓存统计"""
+    hits = _response_cache_stats["memory_hits"] + _response_cache_stats["disk_hits"]
+    total = hits + _response_cache_stats["misses"]
+    return {
+        **_response_cache_stats,
+        "enabled": settings.ai_response_cache_enabled,
+        "memory_size": len(_memory_cache),
+        "memory_max_size": settings.ai_response_cache_size,
+        "ttl": settings.ai_response_cache_ttl,
+        "hit_rate": round(hits / total, 4) if total else None
+    }
+
+
+def should_read_cache() -> bool:
+    """
+    开启了缓存的调用本次是否读取缓存（当前请求要求跳过时不读取）
+    
+    跳过缓存的调用仍会写入新结果，之后相同的请求复用最新一次生成的内容。
+    """
+    if bypass_response_cache.get():
+        _response_cache_stats["bypassed"] += 1
+        return False
+    return True
+
+
+def make_cache_key(
+    client_key: Any,
+    provider: str,
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    system_prompt: Optional[str],
+    prompt: str
+) -> str:
+    """计算请求的缓存键"""
+    payload = json.dumps(
+        [list(client_key) if client_key else None, provider, model, temperature, max_tokens, system_prompt or "", prompt],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _get_engine() -> AsyncEngine:
+    """懒加载磁盘缓存引擎并建表"""
+    global _engine
+    if _engine is not None:
+        return _engine
+    async with _engine_lock:
+        if _engine is None:
+            db_url = f"sqlite+aiosqlite:///{str(CACHE_DB_FILE.absolute()).replace(chr(92), '/')}"
+            engine = create_async_engine(db_url, echo=False, connect_args={"timeout": 30})
+            async with engine.begin() as conn:
+                await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                await conn.run_sync(_metadata.create_all)
+            _engine = engine
+            logger.info(f"✅ AI响应磁盘缓存已就绪: {CACHE_DB_FILE}")
+    return _engine
+
+
+def _remember(key: str, created_at: float, response: str):
+    """写入进程内LRU"""
+    _memory_cache[key] = (created_at, response)
+    _memory_cache.move_to_end(key)
+    max_size = settings.ai_response_cache_size
+    while max_size > 0 and len(_memory_cache) > max_size:
+        _memory_cache.popitem(last=False)
+
+
+async def get_cached_response(key: str) -> Optional[str]:
+    """读取缓存的响应，先查内存再查磁盘，过期条目视为未命中"""
+    ttl = settings.ai_response_cache_ttl
+    now = time.time()
+    
+    cached = _memory_cache.get(key)
+    if cached is not None:
+        if ttl <= 0 or now - cached[0] < ttl:
+            _memory_cache.move_to_end(key)
+            _response_cache_stats["memory_hits"] += 1
+            return cached[1]
+        del _memory_cache[key]
+        _response_cache_stats["expired"] += 1
+    
+    try:
+        engine = await _get_engine()
+        async with engine.begin() as conn:
+            row = (await conn.execute(
+                select(_responses.c.response, _responses.c.created_at).where(_responses.c.key == key)
+            )).first()
+            if row is not None and ttl > 0 and now - row.created_at >= ttl:
+                await conn.execute(delete(_responses).where(_responses.c.key == key))
+                _response_cache_stats["expired"] += 1
+                row = None
+    except Exception as e:
+        _response_cache_stats["disk_errors"] += 1
+        logger.warning(f"⚠️ 读取AI响应磁盘缓存失败: {e}")
+        row = None
+    
+    if row is None:
+        _response_cache_stats["misses"] += 1
+        return None
+    
+    _remember(key, row.created_at, row.response)
+    _response_cache_stats["disk_hits"] += 1
+    return row.response
+
+
+async def store_response(key: str, response: str):
+    """保存响应到内存和磁盘（磁盘写入失败只记录日志）"""
+    global _stores_since_purge
+    now = time.time()
+    _remember(key, now, response)
+    _response_cache_stats["stores"] += 1
+    
+    try:
+        engine = await _get_engine()
+        async with engine.begin() as conn:
+            await conn.execute(
+                sqlite_insert(_responses)
+                .values(key=key, response=response, created_at=now)
+                .on_conflict_do_update(index_elements=["key"], set_={"response": response, "created_at": now})
+            )
+            _stores_since_purge += 1
+            ttl = settings.ai_response_cache_ttl
+            if ttl > 0 and _stores_since_purge >= _PURGE_EVERY:
+                _stores_since_purge = 0
+                result = await conn.execute(delete(_responses).where(_responses.c.created_at < now - ttl))
+                if result.rowcount:
+                    logger.info(f"🧹 已清理 {result.rowcount} 条过期的AI响应缓存")
+    except Exception as e:
+        _response_cache_stats["disk_errors"] += 1
+        logger.warning(f"⚠️ 写入AI响应磁盘缓存失败: {e}")
+
+
+async def close_response_cache():
+    """关闭磁盘缓存引擎"""
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
@@ -1,13 +1,138 @@
 """AI服务封装 - 统一的OpenAI和Claude接口"""
-from typing import Optional, AsyncGenerator, List, Dict, Any
-from openai import AsyncOpenAI
-from anthropic import AsyncAnthropic
+from typing import Optional, AsyncGenerator, Callable, List, Dict, Any
 from app.config import settings as app_settings
 from app.logger import get_logger
+from app.services.ai_client_pool import ai_client_pool
+from app.services import ai_response_cache
+from app.utils.token_estimator import estimate_tokens
+import asyncio
 import httpx
+import weakref
 
 logger = get_logger(__name__)
 
+# 提示词缓存统计（累计值，按提供商区分）
+# input_tokens 为全部输入token，cached_input_tokens 为命中上游前缀缓存的部分，
+# cache_write_input_tokens 为写入缓存的部分（仅Anthropic）
+_prompt_cache_stats: Dict[str, Dict[str, int]] = {
+    provider: {
+        "calls": 0,
+        "calls_with_usage": 0,
+        "input_tokens": 0,
+        "cached_input_tokens": 0,
+        "cache_write_input_tokens": 0,
+        "output_tokens": 0
+    }
+    for provider in ("openai", "anthropic")
+}
+
+
+def get_prompt_cache_stats() -> Dict[str, Any]:
+    """获取提示词缓存统计"""
+    result: Dict[str, Any] = {}
+    for provider, stats in _prompt_cache_stats.items():
+        input_tokens = stats["input_tokens"]
+        result[provider] = {
+            **stats,
+            "uncached_input_tokens": input_tokens - stats["cached_input_tokens"],
+            "cached_ratio": round(stats["cached_input_tokens"] / input_tokens, 4) if input_tokens else None
+        }
+    return result
+
+
+def _record_usage(provider: str, usage: Any):
+    """记录一次调用的输入/缓存token数（上游未返回usage时只计调用次数）"""
+    stats = _prompt_cache_stats[provider]
+    stats["calls"] += 1
+    if usage is None:
+        return
+    
+    if provider == "anthropic":
+        # Anthropic 的 input_tokens 不含缓存读取和写入的部分
+        cached = getattr(usage, "cache_read_input_tokens", None) or 0
+        written = getattr(usage, "cache_creation_input_tokens", None) or 0
+        input_tokens = (getattr(usage, "input_tokens", None) or 0) + cached + written
+        output_tokens = getattr(usage, "output_tokens", None) or 0
+    else:
+        # OpenAI 的 prompt_tokens 已包含命中缓存的部分
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        written = 0
+        input_tokens = getattr(usage, "prompt_tokens", None) or 0
+        output_tokens = getattr(usage, "completion_tokens", None) or 0
+    
+    stats["calls_with_usage"] += 1
+    stats["input_tokens"] += input_tokens
+    stats["cached_input_tokens"] += cached
+    stats["cache_write_input_tokens"] += written
+    stats["output_tokens"] += output_tokens
+    logger.info(
+        f"🧊 输入 {input_tokens} tokens，命中缓存 {cached}"
+        + (f"，写入缓存 {written}" if written else "")
+    )
+
+
+# 中途取消的调用统计（客户端断开、任务取消等，按提供商区分）
+# 上游不会为中断的请求返回usage，token数为本地估算值
+_cancellation_stats: Dict[str, Dict[str, int]] = {
+    provider: {
+        "cancelled_calls": 0,
+        "cancelled_streams": 0,
+        "input_tokens": 0,
+        "output_tokens": 0
+    }
+    for provider in ("openai", "anthropic")
+}
+
+
+def get_cancellation_stats() -> Dict[str, Any]:
+    """获取中途取消的调用统计"""
+    return {provider: dict(stats) for provider, stats in _cancellation_stats.items()}
+
+
+def _record_cancellation(
+    provider: str,
+    prompt: str,
+    system_prompt: Optional[str],
+    prompt_prefix: Optional[str],
+    output_tokens: int,
+    streaming: bool
+):
+    """记录一次中途取消的调用及取消前已消耗的token（估算）"""
+    input_tokens = estimate_tokens((system_prompt or "") + (prompt_prefix or "") + prompt)
+    stats = _cancellation_stats[provider]
+    stats["cancelled_streams" if streaming else "cancelled_calls"] += 1
+    stats["input_tokens"] += input_tokens
+    stats["output_tokens"] += output_tokens
+    logger.info(
+        f"🛑 {provider} {'流式' if streaming else ''}调用已取消，上游连接已关闭"
+        f"（输入约 {input_tokens} tokens，已生成约 {output_tokens} tokens）"
+    )
+
+
+def _openai_messages(prompt: str, system_prompt: Optional[str], prompt_prefix: Optional[str]) -> List[Dict[str, Any]]:
+    """构建OpenAI消息；前缀与正文拼接为同一条用户消息，前缀不变即可命中上游的自动前缀缓存"""
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": (prompt_prefix or "") + prompt})
+    return messages
+
+
+def _anthropic_messages(prompt: str, prompt_prefix: Optional[str]) -> List[Dict[str, Any]]:
+    """构建Anthropic消息；有前缀时拆成两个文本块，并在前缀块上设置缓存断点"""
+    if not prompt_prefix:
+        return [{"role": "user", "content": prompt}]
+    if not app_settings.prompt_cache_enabled:
+        return [{"role": "user", "content": prompt_prefix + prompt}]
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": prompt_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt}
+        ]
+    }]
+
 
 class AIService:
     """AI服务统一接口 - 支持从用户设置或全局配置初始化"""
@@ -38,49 +163,18 @@ class AIService:
         self.default_temperature = default_temperature or app_settings.default_temperature
         self.default_max_tokens = default_max_tokens or app_settings.default_max_tokens
         
+        # 从进程级客户端池获取共享客户端（同一上游复用连接池）
+        self._pool_keys = []
+        
         # 初始化OpenAI客户端
         openai_key = api_key if api_provider == "openai" else app_settings.openai_api_key
         if openai_key:
-            # 创建自定义的httpx客户端来避免proxies参数问题
             try:
-                # 配置连接池限制，支持高并发
-                # max_keepalive_connections: 保持活跃的连接数（提高复用率）
-                # max_connections: 最大并发连接数（防止资源耗尽）
-                limits = httpx.Limits(
-                    max_keepalive_connections=50,  # 保持50个活跃连接
-                    max_connections=100,            # 最多100个并发连接
-                    keepalive_expiry=30.0          # 30秒后过期未使用的连接
-                )
-                
-                # 使用httpx.AsyncClient并设置超时和连接池
-                # connect: 连接超时10秒
-                # read: 读取超时180秒（3分钟，适合长文本生成）
-                # write: 写入超时10秒
-                # pool: 连接池超时10秒
-                http_client = httpx.AsyncClient(
-                    timeout=httpx.Timeout(
-                        connect=10.0,
-                        read=180.0,
-                        write=10.0,
-                        pool=10.0
-                    ),
-                    limits=limits
-                )
-                
-                client_kwargs = {
-                    "api_key": openai_key,
-                    "http_client": http_client
-                }
-                
                 # 优先使用用户提供的base_url，否则使用全局配置
                 base_url = api_base_url if api_provider == "openai" else app_settings.openai_base_url
-                if base_url:
-                    client_kwargs["base_url"] = base_url
-                
-                self.openai_client = AsyncOpenAI(**client_kwargs)
-                logger.info("✅ OpenAI客户端初始化成功")
-                logger.info("   - 超时设置：连接10s，读取180s")
-                logger.info("   - 连接池：50个保活连接，最大100个并发")
+                self.openai_client, pool_key = ai_client_pool.acquire("openai", openai_key, base_url)
+                self._pool_keys.append(pool_key)
+                logger.info("✅ OpenAI客户端已就绪（共享连接池）")
             except Exception as e:
                 logger.error(f"OpenAI客户端初始化失败: {e}")
                 self.openai_client = None
@@ -92,43 +186,21 @@ class AIService:
         anthropic_key = api_key if api_provider == "anthropic" else app_settings.anthropic_api_key
         if anthropic_key:
             try:
-                # 为Anthropic设置相同的超时和连接池配置
-                limits = httpx.Limits(
-                    max_keepalive_connections=50,
-                    max_connections=100,
-                    keepalive_expiry=30.0
-                )
-                
-                http_client = httpx.AsyncClient(
-                    timeout=httpx.Timeout(
-                        connect=10.0,
-                        read=180.0,
-                        write=10.0,
-                        pool=10.0
-                    ),
-                    limits=limits
-                )
-                
-                client_kwargs = {
-                    "api_key": anthropic_key,
-                    "http_client": http_client
-                }
-                
                 # 优先使用用户提供的base_url，否则使用全局配置
                 base_url = api_base_url if api_provider == "anthropic" else app_settings.anthropic_base_url
-                if base_url:
-                    client_kwargs["base_url"] = base_url
-                
-                self.anthropic_client = AsyncAnthropic(**client_kwargs)
-                logger.info("✅ Anthropic客户端初始化成功")
-                logger.info("   - 超时设置：连接10s，读取180s")
-                logger.info("   - 连接池：50个保活连接，最大100个并发")
+                self.anthropic_client, pool_key = ai_client_pool.acquire("anthropic", anthropic_key, base_url)
+                self._pool_keys.append(pool_key)
+                logger.info("✅ Anthropic客户端已就绪（共享连接池）")
             except Exception as e:
                 logger.error(f"Anthropic客户端初始化失败: {e}")
                 self.anthropic_client = None
         else:
             self.anthropic_client = None
             logger.warning("Anthropic API key未配置")
+        
+        # 实例被回收时归还客户端引用
+        for pool_key in self._pool_keys:
+            weakref.finalize(self, ai_client_pool.release, pool_key)
     
     async def generate_text(
         self,
@@ -137,11 +209,17 @@ class AIService:
         model: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        prompt_prefix: Optional[str] = None,
+        use_cache: bool = False,
+        validate: Optional[Callable[[str], bool]] = None
     ) -> str:
         """
         生成文本
         
+        use_cache=True 时相同请求（提供商、模型、参数、提示词均相同）的结果在 AI_RESPONSE_CACHE_TTL 内复用，
+        只用于结果可以复用的调用（如剧情摘要）；用户主动生成、重新生成的调用不使用缓存。
+        
         Args:
             prompt: 用户提示词
             provider: AI提供商 (openai/anthropic)
@@ -149,6 +227,9 @@ class AIService:
             temperature: 温度参数
             max_tokens: 最大token数
             system_prompt: 系统提示词
+            prompt_prefix: 可缓存的提示词前缀，拼接在 prompt 之前作为同一条用户消息
+            use_cache: 是否使用响应缓存（请求头 Cache-Control: no-cache / X-AI-Cache: bypass 时仍跳过读取）
+            validate: 结果校验函数，只有通过校验的结果才写入缓存
             
         Returns:
             生成的文本
@@ -159,15 +240,33 @@ class AIService:
         max_tokens = max_tokens or self.default_max_tokens
         
         if provider == "openai":
-            return await self._generate_openai(
-                prompt, model, temperature, max_tokens, system_prompt
-            )
+            generate = self._generate_openai
         elif provider == "anthropic":
-            return await self._generate_anthropic(
-                prompt, model, temperature, max_tokens, system_prompt
-            )
+            generate = self._generate_anthropic
         else:
             raise ValueError(f"不支持的AI提供商: {provider}")
+        
+        cache_key = None
+        if use_cache and app_settings.ai_response_cache_enabled:
+            client_key = next((key for key in self._pool_keys if key[0] == provider), None)
+            cache_key = ai_response_cache.make_cache_key(
+                client_key, provider, model, temperature, max_tokens,
+                system_prompt, (prompt_prefix or "") + prompt
+            )
+            if ai_response_cache.should_read_cache():
+                cached = await ai_response_cache.get_cached_response(cache_key)
+                if cached is not None:
+                    logger.info(f"♻️ 命中AI响应缓存（{provider}/{model}，{len(cached)} 字符）")
+                    return cached
+        
+        try:
+            content = await generate(prompt, model, temperature, max_tokens, system_prompt, prompt_prefix)
+        except asyncio.CancelledError:
+            _record_cancellation(provider, prompt, system_prompt, prompt_prefix, 0, streaming=False)
+            raise
+        if cache_key and content and (validate is None or validate(content)):
+            await ai_response_cache.store_response(cache_key, content)
+        return content
     
     async def generate_text_stream(
         self,
@@ -176,7 +275,8 @@ class AIService:
         model: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        prompt_prefix: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """
         流式生成文本
@@ -188,6 +288,7 @@ class AIService:
             temperature: 温度参数
             max_tokens: 最大token数
             system_prompt: 系统提示词
+            prompt_prefix: 可缓存的提示词前缀，拼接在 prompt 之前作为同一条用户消息
             
         Yields:
             生成的文本片段
@@ -199,12 +300,12 @@ class AIService:
         
         if provider == "openai":
             async for chunk in self._generate_openai_stream(
-                prompt, model, temperature, max_tokens, system_prompt
+                prompt, model, temperature, max_tokens, system_prompt, prompt_prefix
             ):
                 yield chunk
         elif provider == "anthropic":
             async for chunk in self._generate_anthropic_stream(
-                prompt, model, temperature, max_tokens, system_prompt
+                prompt, model, temperature, max_tokens, system_prompt, prompt_prefix
             ):
                 yield chunk
         else:
@@ -216,23 +317,21 @@ class AIService:
         model: str,
         temperature: float,
         max_tokens: int,
-        system_prompt: Optional[str]
+        system_prompt: Optional[str],
+        prompt_prefix: Optional[str] = None
     ) -> str:
         """使用OpenAI生成文本"""
         if not self.openai_client:
             raise ValueError("OpenAI客户端未初始化，请检查API key配置")
         
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        messages = _openai_messages(prompt, system_prompt, prompt_prefix)
         
         try:
             logger.info(f"🔵 开始调用OpenAI API")
             logger.info(f"  - 模型: {model}")
             logger.info(f"  - 温度: {temperature}")
             logger.info(f"  - 最大tokens: {max_tokens}")
-            logger.info(f"  - Prompt长度: {len(prompt)} 字符")
+            logger.info(f"  - Prompt长度: {len(prompt_prefix or '') + len(prompt)} 字符（可缓存前缀 {len(prompt_prefix or '')}）")
             logger.info(f"  - 消息数量: {len(messages)}")
             
             response = await self.openai_client.chat.completions.create(
@@ -243,6 +342,7 @@ class AIService:
             )
             
             logger.info(f"✅ OpenAI API调用成功")
+            _record_usage("openai", getattr(response, "usage", None))
             logger.info(f"  - 响应ID: {response.id if hasattr(response, 'id') else 'N/A'}")
             logger.info(f"  - 选项数量: {len(response.choices)}")
             
@@ -274,42 +374,55 @@ class AIService:
         model: str,
         temperature: float,
         max_tokens: int,
-        system_prompt: Optional[str]
+        system_prompt: Optional[str],
+        prompt_prefix: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """使用OpenAI流式生成文本"""
         if not self.openai_client:
             raise ValueError("OpenAI客户端未初始化，请检查API key配置")
         
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        messages = _openai_messages(prompt, system_prompt, prompt_prefix)
+        stream = None
+        output_tokens = 0
         
         try:
             logger.info(f"🔵 开始调用OpenAI流式API")
             logger.info(f"  - 模型: {model}")
-            logger.info(f"  - Prompt长度: {len(prompt)} 字符")
+            logger.info(f"  - Prompt长度: {len(prompt_prefix or '') + len(prompt)} 字符（可缓存前缀 {len(prompt_prefix or '')}）")
             logger.info(f"  - 最大tokens: {max_tokens}")
             
+            # 请求在最后一个chunk中返回usage，用于统计命中缓存的输入token
+            # （当前固定的SDK版本不支持 stream_options 参数，通过 extra_body 透传）
+            extra_body = {"stream_options": {"include_usage": True}} if app_settings.openai_stream_usage else None
             stream = await self.openai_client.chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                stream=True
+                stream=True,
+                extra_body=extra_body
             )
             
             logger.info(f"✅ OpenAI流式API连接成功，开始接收数据...")
             
             chunk_count = 0
+            usage = None
             async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
                 if chunk.choices and len(chunk.choices) > 0:
                     if chunk.choices[0].delta.content:
                         chunk_count += 1
+                        output_tokens += estimate_tokens(chunk.choices[0].delta.content)
                         yield chunk.choices[0].delta.content
             
+            _record_usage("openai", usage)
             logger.info(f"✅ OpenAI流式生成完成，共接收 {chunk_count} 个chunk")
             
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开或任务取消
+            _record_cancellation("openai", prompt, system_prompt, prompt_prefix, output_tokens, streaming=True)
+            raise
         except httpx.TimeoutException as e:
             logger.error(f"❌ OpenAI流式API超时")
             logger.error(f"  - 错误: {str(e)}")
@@ -319,6 +432,10 @@ class AIService:
             logger.error(f"❌ OpenAI流式API调用失败: {str(e)}")
             logger.error(f"  - 错误类型: {type(e).__name__}")
             raise
+        finally:
+            if stream is not None:
+                # 提前结束时立即关闭上游响应，停止生成并释放连接（正常读完时已自动关闭）
+                await stream.close()
     
     async def _generate_anthropic(
         self,
@@ -326,7 +443,8 @@ class AIService:
         model: str,
         temperature: float,
         max_tokens: int,
-        system_prompt: Optional[str]
+        system_prompt: Optional[str],
+        prompt_prefix: Optional[str] = None
     ) -> str:
         """使用Anthropic生成文本"""
         if not self.anthropic_client:
@@ -338,8 +456,9 @@ class AIService:
                 max_tokens=max_tokens,
                 temperature=temperature,
                 system=system_prompt or "",
-                messages=[{"role": "user", "content": prompt}]
+                messages=_anthropic_messages(prompt, prompt_prefix)
             )
+            _record_usage("anthropic", getattr(response, "usage", None))
             return response.content[0].text
         except Exception as e:
             logger.error(f"Anthropic API调用失败: {str(e)}")
@@ -351,16 +470,18 @@ class AIService:
         model: str,
         temperature: float,
         max_tokens: int,
-        system_prompt: Optional[str]
+        system_prompt: Optional[str],
+        prompt_prefix: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """使用Anthropic流式生成文本"""
         if not self.anthropic_client:
             raise ValueError("Anthropic客户端未初始化，请检查API key配置")
         
+        output_tokens = 0
         try:
             logger.info(f"🔵 开始调用Anthropic流式API")
             logger.info(f"  - 模型: {model}")
-            logger.info(f"  - Prompt长度: {len(prompt)} 字符")
+            logger.info(f"  - Prompt长度: {len(prompt_prefix or '') + len(prompt)} 字符（可缓存前缀 {len(prompt_prefix or '')}）")
             logger.info(f"  - 最大tokens: {max_tokens}")
             
             async with self.anthropic_client.messages.stream(
@@ -368,17 +489,24 @@ class AIService:
                 max_tokens=max_tokens,
                 temperature=temperature,
                 system=system_prompt or "",
-                messages=[{"role": "user", "content": prompt}]
+                messages=_anthropic_messages(prompt, prompt_prefix)
             ) as stream:
                 logger.info(f"✅ Anthropic流式API连接成功，开始接收数据...")
                 
                 chunk_count = 0
                 async for text in stream.text_stream:
                     chunk_count += 1
+                    output_tokens += estimate_tokens(text)
                     yield text
                 
+                final_message = await stream.get_final_message()
+                _record_usage("anthropic", getattr(final_message, "usage", None))
                 logger.info(f"✅ Anthropic流式生成完成，共接收 {chunk_count} 个chunk")
                 
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开或任务取消（退出 async with 时已关闭上游响应）
+            _record_cancellation("anthropic", prompt, system_prompt, prompt_prefix, output_tokens, streaming=True)
+            raise
         except httpx.TimeoutException as e:
             logger.error(f"❌ Anthropic流式API超时")
             logger.error(f"  - 错误: {str(e)}")
@@ -0,0 +1,141 @@
+"""
+章节创作草稿 - 流式创作过程中定期保存已生成的部分
+
+创作开始时章节状态改为 generating，之后每隔 CHAPTER_CHECKPOINT_INTERVAL 秒
+或每新增 CHAPTER_CHECKPOINT_CHARS 字，用一条 UPDATE 把已生成的正文写入 chapter_drafts 表。
+上游超时、任务取消或服务中断时已生成的内容不会丢失，可以通过续写接口以草稿为前文继续生成；
+创作完成时草稿在同一事务中删除。
+"""
+import time
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.chapter import Chapter
+from app.models.chapter_draft import ChapterDraft
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 章节草稿统计（累计值）
+_checkpoint_stats = {
+    "started": 0,
+    "checkpoints": 0,
+    "resumes": 0,
+    "completed": 0,
+    "discarded": 0,
+    "errors": 0
+}
+
+
+def get_checkpoint_stats() -> Dict[str, Any]:
+    """获取章节草稿统计"""
+    return {
+        **_checkpoint_stats,
+        "interval": settings.chapter_checkpoint_interval,
+        "chars": settings.chapter_checkpoint_chars
+    }
+
+
+async def get_draft(db: AsyncSession, chapter_id: str) -> Optional[ChapterDraft]:
+    """读取章节草稿"""
+    result = await db.execute(select(ChapterDraft).where(ChapterDraft.chapter_id == chapter_id))
+    return result.scalar_one_or_none()
+
+
+class ChapterCheckpointer:
+    """一次章节创作的草稿保存器（使用创作所在的数据库会话）"""
+    
+    def __init__(self, db: AsyncSession, chapter: Chapter):
+        self.db = db
+        self.chapter_id = chapter.id
+        self.project_id = chapter.project_id
+        self.saved_chars = 0
+        self.saved_at = time.monotonic()
+    
+    async def begin(self, chapter: Chapter, draft_content: str = ""):
+        """
+        开始创作：写入初始草稿并把章节标记为 generating
+        
+        Args:
+            chapter: 章节
+            draft_content: 续写时已有的草稿内容
+        """
+        # 续写时章节已是 generating，保留第一次开始前的状态
+        await self.db.execute(
+            sqlite_insert(ChapterDraft)
+            .values(
+                chapter_id=self.chapter_id,
+                project_id=self.project_id,
+                content=draft_content,
+                word_count=len(draft_content),
+                previous_status=chapter.status if chapter.status != "generating" else None
+            )
+            .on_conflict_do_update(
+                index_elements=["chapter_id"],
+                set_={"content": draft_content, "word_count": len(draft_content)}
+            )
+        )
+        chapter.status = "generating"
+        await self.db.commit()
+        self.saved_chars = len(draft_content)
+        self.saved_at = time.monotonic()
+        _checkpoint_stats["resumes" if draft_content else "started"] += 1
+    
+    async def maybe_save(self, parts: List[str], length: int):
+        """
+        距上次保存超过时间间隔或新增字数达到阈值时保存草稿
+        
+        Args:
+            parts: 已生成的文本片段（只在需要保存时拼接）
+            length: 已生成的总字数
+        """
+        new_chars = length - self.saved_chars
+        if new_chars <= 0:
+            return
+        if (new_chars >= settings.chapter_checkpoint_chars
+                or time.monotonic() - self.saved_at >= settings.chapter_checkpoint_interval):
+            await self.save("".join(parts))
+    
+    async def save(self, content: str):
+        """保存草稿（失败只记录日志，不影响创作）"""
+        if len(content) <= self.saved_chars:
+            return
+        try:
+            await self.db.execute(
+                update(ChapterDraft)
+                .where(ChapterDraft.chapter_id == self.chapter_id)
+                .values(content=content, word_count=len(content))
+            )
+            await self.db.commit()
+            self.saved_chars = len(content)
+            _checkpoint_stats["checkpoints"] += 1
+        except Exception as e:
+            _checkpoint_stats["errors"] += 1
+            logger.warning(f"⚠️ 保存章节 {self.chapter_id} 草稿失败: {e}")
+            try:
+                await self.db.rollback()
+            except Exception:
+                pass
+        finally:
+            self.saved_at = time.monotonic()
+    
+    async def complete(self):
+        """创作完成：删除草稿（与正文在同一事务中提交）"""
+        await self.db.execute(delete(ChapterDraft).where(ChapterDraft.chapter_id == self.chapter_id))
+        _checkpoint_stats["completed"] += 1
+
+
+async def discard_draft(db: AsyncSession, chapter: Chapter) -> bool:
+    """放弃草稿并恢复章节开始生成前的状态"""
+    draft = await get_draft(db, chapter.id)
+    if draft is None:
+        return False
+    if chapter.status == "generating":
+        chapter.status = draft.previous_status or "draft"
+    await db.delete(draft)
+    await db.commit()
+    _checkpoint_stats["discarded"] += 1
+    return True
@@ -0,0 +1,220 @@
+"""
+章节完成度索引 - 每个项目维护"章节是否存在/是否已有正文"的位图和第一个未完成章节序号
+
+章节的新增、正文修改（含AI创作）在flush时增量更新索引；删除章节、修改章节序号以及
+批量 update/delete 语句只让索引失效，下次查询时用一次不含正文的投影查询重建。
+判断某章能否生成只需比较 first_incomplete，不再扫描前置章节。
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import event, inspect, select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.chapter import Chapter
+from app.models.chapter_completion import ChapterCompletionIndex
+from app.services import chapter_context_repository
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 章节完成度索引统计（累计值）
+_completion_index_stats = {
+    "hits": 0,
+    "rebuilds": 0,
+    "incremental_updates": 0,
+    "invalidations": 0
+}
+
+
+def get_completion_index_stats() -> Dict[str, Any]:
+    """获取章节完成度索引统计"""
+    return dict(_completion_index_stats)
+
+
+def _set_bit(bitmap: bytearray, chapter_number: int, value: bool):
+    """设置第 chapter_number 章对应的位"""
+    pos = chapter_number - 1
+    byte_index = pos >> 3
+    if byte_index >= len(bitmap):
+        if not value:
+            return
+        bitmap.extend(b"\x00" * (byte_index + 1 - len(bitmap)))
+    if value:
+        bitmap[byte_index] |= 1 << (pos & 7)
+    else:
+        bitmap[byte_index] &= ~(1 << (pos & 7)) & 0xFF
+
+
+def _incomplete_numbers(existing: bytes, completed: bytes, before: Optional[int] = None) -> List[int]:
+    """存在但没有正文的章节序号（可限定在 before 之前）"""
+    numbers = []
+    for byte_index, byte in enumerate(existing):
+        if before is not None and byte_index * 8 + 1 >= before:
+            break
+        pending = byte & ~(completed[byte_index] if byte_index < len(completed) else 0) & 0xFF
+        while pending:
+            low = pending & -pending
+            number = byte_index * 8 + low.bit_length()
+            if before is not None and number >= before:
+                return numbers
+            numbers.append(number)
+            pending ^= low
+    return numbers
+
+
+def _first_incomplete(existing: bytes, completed: bytes) -> Optional[int]:
+    """第一个存在但没有正文的章节序号"""
+    for byte_index, byte in enumerate(existing):
+        pending = byte & ~(completed[byte_index] if byte_index < len(completed) else 0) & 0xFF
+        if pending:
+            return byte_index * 8 + (pending & -pending).bit_length()
+    return None
+
+
+async def _rebuild_index(db: AsyncSession, project_id: str) -> Tuple[bytes, bytes, Optional[int]]:
+    """
+    用一次不含正文的投影查询重建索引
+    
+    索引行写入调用方的事务，随调用方提交；这里不提交，以免把调用方未完成的修改一并提交。
+    用户库使用 StaticPool 共享同一连接，另开会话也无法得到独立事务。
+    """
+    existing = bytearray()
+    completed = bytearray()
+    for row in await chapter_context_repository.list_chapter_completion(db, project_id):
+        if row.chapter_number is None or row.chapter_number < 1:
+            continue
+        _set_bit(existing, row.chapter_number, True)
+        _set_bit(completed, row.chapter_number, bool(row.has_content))
+    first = _first_incomplete(existing, completed)
+    
+    values = {
+        "existing_bitmap": bytes(existing),
+        "completed_bitmap": bytes(completed),
+        "first_incomplete": first
+    }
+    await db.execute(
+        sqlite_insert(ChapterCompletionIndex)
+        .values(project_id=project_id, **values)
+        .on_conflict_do_update(index_elements=["project_id"], set_=values)
+    )
+    _completion_index_stats["rebuilds"] += 1
+    logger.info(f"🗂️ 项目 {project_id} 的章节完成度索引已重建（首个未完成章节: {first or '无'}）")
+    return values["existing_bitmap"], values["completed_bitmap"], first
+
+
+async def _load_index(db: AsyncSession, project_id: str) -> Tuple[bytes, bytes, Optional[int]]:
+    """读取项目索引，不存在（或已失效）时重建"""
+    result = await db.execute(
+        select(
+            ChapterCompletionIndex.existing_bitmap,
+            ChapterCompletionIndex.completed_bitmap,
+            ChapterCompletionIndex.first_incomplete
+        ).where(ChapterCompletionIndex.project_id == project_id)
+    )
+    row = result.first()
+    if row is None:
+        return await _rebuild_index(db, project_id)
+    _completion_index_stats["hits"] += 1
+    return row.existing_bitmap or b"", row.completed_bitmap or b"", row.first_incomplete
+
+
+async def check_chapter_prerequisites(
+    db: AsyncSession,
+    project_id: str,
+    chapter_number: int
+) -> Tuple[bool, str, Optional[int]]:
+    """
+    判断第 chapter_number 章的前置章节是否都已完成
+    
+    Returns:
+        (可否生成, 错误信息, 项目中第一个未完成的章节序号)
+    """
+    existing, completed, first = await _load_index(db, project_id)
+    if first is None or first >= chapter_number:
+        return True, "", first
+    
+    missing_numbers = _incomplete_numbers(existing, completed, before=chapter_number)
+    error_msg = f"需要先完成前置章节：第 {', '.join(str(n) for n in missing_numbers)} 章"
+    return False, error_msg, first
+
+
+# ==================== 索引维护（Session事件） ====================
+
+def _after_flush(session: Session, flush_context):
+    """flush后按本次变更的章节增量更新索引；无法增量处理的变更让索引失效"""
+    bit_updates: Dict[str, List[Tuple[int, bool]]] = {}
+    invalidated: Set[str] = set()
+    
+    for obj in session.new:
+        if isinstance(obj, Chapter) and obj.project_id and obj.chapter_number:
+            bit_updates.setdefault(obj.project_id, []).append(
+                (obj.chapter_number, bool(obj.content and obj.content.strip()))
+            )
+    
+    for obj in session.dirty:
+        if not isinstance(obj, Chapter):
+            continue
+        attrs = inspect(obj).attrs
+        if attrs.chapter_number.history.has_changes() or attrs.project_id.history.has_changes():
+            invalidated.update(filter(None, attrs.project_id.history.sum()))
+            continue
+        if attrs.content.history.has_changes() and obj.chapter_number:
+            bit_updates.setdefault(obj.project_id, []).append(
+                (obj.chapter_number, bool(obj.content and obj.content.strip()))
+            )
+    
+    for obj in session.deleted:
+        if isinstance(obj, Chapter) and obj.project_id:
+            invalidated.add(obj.project_id)
+    
+    if not bit_updates and not invalidated:
+        return
+    
+    connection = session.connection()
+    if invalidated:
+        connection.execute(
+            delete(ChapterCompletionIndex).where(ChapterCompletionIndex.project_id.in_(invalidated))
+        )
+        _completion_index_stats["invalidations"] += len(invalidated)
+    
+    for project_id, changes in bit_updates.items():
+        if project_id in invalidated:
+            continue
+        row = connection.execute(
+            select(ChapterCompletionIndex.existing_bitmap, ChapterCompletionIndex.completed_bitmap)
+            .where(ChapterCompletionIndex.project_id == project_id)
+        ).first()
+        if row is None:
+            # 尚未建立索引，下次查询时再重建
+            continue
+        existing = bytearray(row.existing_bitmap or b"")
+        completed = bytearray(row.completed_bitmap or b"")
+        for chapter_number, has_content in changes:
+            _set_bit(existing, chapter_number, True)
+            _set_bit(completed, chapter_number, has_content)
+        connection.execute(
+            update(ChapterCompletionIndex)
+            .where(ChapterCompletionIndex.project_id == project_id)
+            .values(
+                existing_bitmap=bytes(existing),
+                completed_bitmap=bytes(completed),
+                first_incomplete=_first_incomplete(existing, completed)
+            )
+        )
+        _completion_index_stats["incremental_updates"] += 1
+
+
+def _on_orm_execute(orm_execute_state):
+    """批量 update/delete 章节时无法得知受影响的章节，让整个用户库的索引失效"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Chapter:
+        return
+    orm_execute_state.session.execute(delete(ChapterCompletionIndex))
+    _completion_index_stats["invalidations"] += 1
+
+
+event.listen(Session, "after_flush", _after_flush)
+event.listen(Session, "do_orm_execute", _on_orm_execute)
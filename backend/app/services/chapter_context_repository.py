@@ -0,0 +1,190 @@
+"""章节上下文查询 - 只查询需要的列，正文只为真正放入提示词的章节加载"""
+from typing import List, Sequence, Tuple
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.chapter import Chapter
+from app.models.chapter_summary import ChapterSummary
+from app.models.character import Character
+from app.models.outline import Outline
+from app.models.story_summary import StorySummaryNode
+
+# 判断正文是否为空时去除的空白字符
+_BLANK_CHARS = " \t\r\n　"
+
+
+def _trimmed_length():
+    """去除首尾空白后的正文长度（在数据库中计算，不把正文读入内存）"""
+    return func.length(func.trim(func.coalesce(Chapter.content, ""), _BLANK_CHARS))
+
+
+async def list_previous_chapter_briefs(
+    db: AsyncSession,
+    project_id: str,
+    chapter_number: int
+) -> Sequence[Row]:
+    """
+    查询某章之前所有章节的概况（不含正文）
+    
+    Returns:
+        行列表，字段：id, chapter_number, title, word_count, has_content
+    """
+    result = await db.execute(
+        select(
+            Chapter.id,
+            Chapter.chapter_number,
+            Chapter.title,
+            Chapter.word_count,
+            (_trimmed_length() > 0).label("has_content")
+        )
+        .where(Chapter.project_id == project_id)
+        .where(Chapter.chapter_number < chapter_number)
+        .order_by(Chapter.chapter_number)
+    )
+    return result.all()
+
+
+async def list_chapter_completion(
+    db: AsyncSession,
+    project_id: str
+) -> Sequence[Row]:
+    """
+    查询项目所有章节的序号和是否已有正文（不加载正文）
+    
+    Returns:
+        行列表，字段：chapter_number, has_content
+    """
+    result = await db.execute(
+        select(Chapter.chapter_number, (_trimmed_length() > 0).label("has_content"))
+        .where(Chapter.project_id == project_id)
+    )
+    return result.all()
+
+
+async def list_chapter_texts(
+    db: AsyncSession,
+    project_id: str,
+    start: int,
+    end: int
+) -> Sequence[Row]:
+    """
+    查询 [start, end) 范围内章节的完整正文
+    
+    Returns:
+        行列表，字段：chapter_number, title, content
+    """
+    result = await db.execute(
+        select(Chapter.chapter_number, Chapter.title, Chapter.content)
+        .where(Chapter.project_id == project_id)
+        .where(Chapter.chapter_number >= start)
+        .where(Chapter.chapter_number < end)
+        .order_by(Chapter.chapter_number)
+    )
+    return result.all()
+
+
+async def list_chapter_summary_rows(
+    db: AsyncSession,
+    project_id: str,
+    ranges: List[Tuple[int, int]],
+    prefix_chars: int
+) -> Sequence[Row]:
+    """
+    查询若干 [start, end) 范围内章节的摘要，没有摘要的章节附带正文开头
+    
+    Returns:
+        行列表，字段：id, chapter_number, title, summary, prefix
+    """
+    if not ranges:
+        return []
+    result = await db.execute(
+        select(
+            Chapter.id,
+            Chapter.chapter_number,
+            Chapter.title,
+            ChapterSummary.summary,
+            func.substr(Chapter.content, 1, prefix_chars).label("prefix")
+        )
+        .outerjoin(ChapterSummary, ChapterSummary.chapter_id == Chapter.id)
+        .where(Chapter.project_id == project_id)
+        .where(or_(*[
+            and_(Chapter.chapter_number >= start, Chapter.chapter_number < end)
+            for start, end in ranges
+        ]))
+        .order_by(Chapter.chapter_number)
+    )
+    return result.all()
+
+
+async def list_story_nodes(
+    db: AsyncSession,
+    project_id: str,
+    level: str,
+    ranges: List[Tuple[int, int]]
+) -> Sequence[Row]:
+    """
+    查询起始章节落在若干 [start, end) 范围内的剧情弧/卷摘要
+    
+    Returns:
+        行列表，字段：start_chapter, end_chapter, summary
+    """
+    if not ranges:
+        return []
+    result = await db.execute(
+        select(StorySummaryNode.start_chapter, StorySummaryNode.end_chapter, StorySummaryNode.summary)
+        .where(StorySummaryNode.project_id == project_id)
+        .where(StorySummaryNode.level == level)
+        .where(or_(*[
+            and_(StorySummaryNode.start_chapter >= start, StorySummaryNode.start_chapter < end)
+            for start, end in ranges
+        ]))
+        .order_by(StorySummaryNode.start_chapter)
+    )
+    return result.all()
+
+
+async def list_outline_briefs(
+    db: AsyncSession,
+    project_id: str,
+    prefix_chars: int = 100
+) -> Sequence[Row]:
+    """
+    查询项目全部大纲的标题和内容开头
+    
+    Returns:
+        行列表，字段：order_index, title, prefix
+    """
+    result = await db.execute(
+        select(
+            Outline.order_index,
+            Outline.title,
+            func.substr(Outline.content, 1, prefix_chars).label("prefix")
+        )
+        .where(Outline.project_id == project_id)
+        .order_by(Outline.order_index)
+    )
+    return result.all()
+
+
+async def list_character_briefs(
+    db: AsyncSession,
+    project_id: str,
+    prefix_chars: int = 100
+) -> Sequence[Row]:
+    """
+    查询项目角色/组织的名称、类型和性格开头
+    
+    Returns:
+        行列表，字段：name, is_organization, role_type, personality
+    """
+    result = await db.execute(
+        select(
+            Character.name,
+            Character.is_organization,
+            Character.role_type,
+            func.substr(Character.personality, 1, prefix_chars).label("personality")
+        )
+        .where(Character.project_id == project_id)
+    )
+    return result.all()
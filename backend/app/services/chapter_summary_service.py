@@ -0,0 +1,562 @@
+"""
+章节剧情摘要服务 - 章节完成后在后台生成摘要，创作后续章节时用摘要代替前置章节正文
+
+摘要按 章 → 剧情弧 → 卷 三级汇总成树：每 story_arc_size 章汇总为一个剧情弧，
+每 story_volume_arcs 个剧情弧汇总为一卷。某章摘要变化时只重新汇总它所在的剧情弧和卷。
+"""
+import asyncio
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import user_session
+from app.models.chapter import Chapter
+from app.models.chapter_summary import ChapterSummary
+from app.models.story_summary import StorySummaryNode
+from app.services.ai_service import AIService
+from app.services.prompt_service import prompt_service
+from app.services import chapter_context_repository
+from app.utils.token_estimator import estimate_tokens
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 没有摘要时回退使用的正文开头字数
+FALLBACK_PREFIX_CHARS = 200
+
+# 正在运行的摘要任务：(用户ID, 章节ID) -> Task（保持引用，避免被GC回收）
+_summary_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+
+# 限制后台同时生成摘要的章节数
+_summary_semaphore = asyncio.Semaphore(max(1, settings.chapter_summary_concurrency))
+
+# 摘要树更新锁：(用户ID, 项目ID) -> Lock，同一项目的汇总串行执行，避免重复创建节点
+_tree_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+# 摘要树层级
+LEVEL_ARC = "arc"
+LEVEL_VOLUME = "volume"
+
+# 章节摘要统计（累计值）
+_chapter_summary_stats = {
+    "scheduled": 0,
+    "generated": 0,
+    "unchanged": 0,
+    "failed": 0,
+    "fallbacks": 0,
+    "nodes_generated": 0,
+    "nodes_unchanged": 0,
+    "context_items_dropped": 0
+}
+
+
+def get_chapter_summary_stats() -> Dict[str, Any]:
+    """获取章节摘要统计"""
+    return {**_chapter_summary_stats, "running": len(_summary_tasks)}
+
+
+def content_hash(content: str) -> str:
+    """计算正文哈希，用于判断摘要是否需要重新生成"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _arc_size() -> int:
+    return max(1, settings.story_arc_size)
+
+
+def _volume_size() -> int:
+    return _arc_size() * max(1, settings.story_volume_arcs)
+
+
+def _node_range(chapter_number: int, size: int) -> Tuple[int, int]:
+    """章节所在节点的章节范围（闭区间）"""
+    start = (chapter_number - 1) // size * size + 1
+    return start, start + size - 1
+
+
+async def summarize_chapter(
+    db: AsyncSession,
+    ai_service: AIService,
+    chapter: Chapter
+) -> Optional[ChapterSummary]:
+    """
+    为章节生成剧情摘要并保存（正文未变化时直接返回已有摘要）
+    
+    Returns:
+        章节摘要记录，章节没有正文时返回None
+    """
+    content = chapter.content or ""
+    if not content.strip():
+        return None
+    
+    digest = content_hash(content)
+    result = await db.execute(
+        select(ChapterSummary).where(ChapterSummary.chapter_id == chapter.id)
+    )
+    record = result.scalar_one_or_none()
+    if record and record.content_hash == digest:
+        _chapter_summary_stats["unchanged"] += 1
+        return record
+    
+    max_chars = settings.chapter_summary_max_chars
+    prompt = prompt_service.get_chapter_summary_prompt(
+        chapter_number=chapter.chapter_number,
+        chapter_title=chapter.title,
+        content=content,
+        max_chars=max_chars
+    )
+    summary = (await ai_service.generate_text(
+        prompt=prompt,
+        max_tokens=max_chars * 2,
+        use_cache=True,
+        validate=lambda text: bool(text.strip())
+    )).strip()
+    if not summary:
+        raise ValueError("AI返回的摘要为空")
+    
+    if record is None:
+        record = ChapterSummary(project_id=chapter.project_id, chapter_id=chapter.id)
+        db.add(record)
+    record.chapter_number = chapter.chapter_number
+    record.summary = summary
+    record.content_hash = digest
+    await db.commit()
+    
+    _chapter_summary_stats["generated"] += 1
+    logger.info(f"📝 第{chapter.chapter_number}章剧情摘要已生成（{len(summary)}字）")
+    return record
+
+
+async def _refresh_node(
+    db: AsyncSession,
+    ai_service: AIService,
+    project_id: str,
+    level: str,
+    start: int,
+    end: int
+) -> Optional[StorySummaryNode]:
+    """
+    重新汇总一个剧情弧/卷节点（下级摘要齐全且有变化时才调用AI）
+    
+    Returns:
+        节点记录，下级摘要不齐全时返回None
+    """
+    if level == LEVEL_ARC:
+        result = await db.execute(
+            select(Chapter.chapter_number, Chapter.title, ChapterSummary.summary)
+            .join(ChapterSummary, ChapterSummary.chapter_id == Chapter.id)
+            .where(Chapter.project_id == project_id)
+            .where(Chapter.chapter_number >= start)
+            .where(Chapter.chapter_number <= end)
+            .order_by(Chapter.chapter_number)
+        )
+        rows = result.all()
+        expected = end - start + 1
+        children = [f"第{number}章《{title}》：{summary}" for number, title, summary in rows]
+        level_name, max_chars = "剧情弧", settings.story_arc_summary_max_chars
+    else:
+        result = await db.execute(
+            select(StorySummaryNode.start_chapter, StorySummaryNode.end_chapter, StorySummaryNode.summary)
+            .where(StorySummaryNode.project_id == project_id)
+            .where(StorySummaryNode.level == LEVEL_ARC)
+            .where(StorySummaryNode.start_chapter >= start)
+            .where(StorySummaryNode.start_chapter <= end)
+            .order_by(StorySummaryNode.start_chapter)
+        )
+        rows = result.all()
+        expected = max(1, settings.story_volume_arcs)
+        children = [f"第{arc_start}-{arc_end}章：{summary}" for arc_start, arc_end, summary in rows]
+        level_name, max_chars = "卷", settings.story_volume_summary_max_chars
+    
+    if len(rows) < expected:
+        return None
+    
+    children_text = "\n".join(children)
+    digest = content_hash(children_text)
+    result = await db.execute(
+        select(StorySummaryNode)
+        .where(StorySummaryNode.project_id == project_id)
+        .where(StorySummaryNode.level == level)
+        .where(StorySummaryNode.start_chapter == start)
+    )
+    node = result.scalar_one_or_none()
+    if node and node.source_hash == digest:
+        _chapter_summary_stats["nodes_unchanged"] += 1
+        return node
+    
+    prompt = prompt_service.get_story_summary_rollup_prompt(
+        level_name=level_name,
+        start_chapter=start,
+        end_chapter=end,
+        children=children_text,
+        max_chars=max_chars
+    )
+    summary = (await ai_service.generate_text(
+        prompt=prompt,
+        max_tokens=max_chars * 2,
+        use_cache=True,
+        validate=lambda text: bool(text.strip())
+    )).strip()
+    if not summary:
+        raise ValueError(f"AI返回的{level_name}摘要为空")
+    
+    if node is None:
+        node = StorySummaryNode(project_id=project_id, level=level, start_chapter=start)
+        db.add(node)
+    node.end_chapter = end
+    node.summary = summary
+    node.source_hash = digest
+    await db.commit()
+    
+    _chapter_summary_stats["nodes_generated"] += 1
+    logger.info(f"📚 第{start}-{end}章{level_name}摘要已汇总（{len(summary)}字）")
+    return node
+
+
+async def update_summary_tree(
+    db: AsyncSession,
+    ai_service: AIService,
+    project_id: str,
+    chapter_number: int
+):
+    """沿某章所在路径自底向上更新摘要树：只重新汇总该章所在的剧情弧和卷"""
+    arc_start, arc_end = _node_range(chapter_number, _arc_size())
+    arc = await _refresh_node(db, ai_service, project_id, LEVEL_ARC, arc_start, arc_end)
+    if arc is None:
+        return
+    volume_start, volume_end = _node_range(chapter_number, _volume_size())
+    await _refresh_node(db, ai_service, project_id, LEVEL_VOLUME, volume_start, volume_end)
+
+
+def _tree_lock(user_id: str, project_id: str) -> asyncio.Lock:
+    key = (user_id, project_id)
+    if key not in _tree_locks:
+        _tree_locks[key] = asyncio.Lock()
+    return _tree_locks[key]
+
+
+async def _run_summary_task(user_id: str, chapter_id: str, ai_service: AIService):
+    """后台摘要任务：使用独立会话，失败只记录日志"""
+    try:
+        async with _summary_semaphore:
+            async with user_session(user_id) as db:
+                result = await db.execute(select(Chapter).where(Chapter.id == chapter_id))
+                chapter = result.scalar_one_or_none()
+                if chapter is None:
+                    return
+                await summarize_chapter(db, ai_service, chapter)
+                async with _tree_lock(user_id, chapter.project_id):
+                    await update_summary_tree(db, ai_service, chapter.project_id, chapter.chapter_number)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        _chapter_summary_stats["failed"] += 1
+        logger.error(f"❌ 章节 {chapter_id} 剧情摘要生成失败: {str(e)}")
+
+
+def schedule_chapter_summary(user_id: str, chapter_id: str, ai_service: AIService):
+    """
+    在后台为章节生成剧情摘要，不阻塞当前请求
+    
+    同一章节已有未完成的任务时先取消旧任务（正文可能已经变化）。
+    """
+    if not settings.chapter_summary_enabled:
+        return
+    
+    key = (user_id, chapter_id)
+    previous = _summary_tasks.get(key)
+    if previous is not None and not previous.done():
+        previous.cancel()
+    
+    task = asyncio.get_running_loop().create_task(_run_summary_task(user_id, chapter_id, ai_service))
+    _summary_tasks[key] = task
+    _chapter_summary_stats["scheduled"] += 1
+    
+    def _forget(finished: asyncio.Task):
+        if _summary_tasks.get(key) is finished:
+            _summary_tasks.pop(key, None)
+    
+    task.add_done_callback(_forget)
+
+
+async def _run_tree_task(user_id: str, project_id: str, chapter_number: int, ai_service: AIService):
+    """后台摘要树补汇总任务"""
+    try:
+        async with _summary_semaphore:
+            async with _tree_lock(user_id, project_id):
+                async with user_session(user_id) as db:
+                    # 先补齐剧情弧内缺少的章摘要
+                    arc_start, arc_end = _node_range(chapter_number, _arc_size())
+                    result = await db.execute(
+                        select(Chapter)
+                        .outerjoin(ChapterSummary, ChapterSummary.chapter_id == Chapter.id)
+                        .where(Chapter.project_id == project_id)
+                        .where(Chapter.chapter_number >= arc_start)
+                        .where(Chapter.chapter_number <= arc_end)
+                        .where(ChapterSummary.id.is_(None))
+                    )
+                    for chapter in result.scalars().all():
+                        await summarize_chapter(db, ai_service, chapter)
+                    await update_summary_tree(db, ai_service, project_id, chapter_number)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        _chapter_summary_stats["failed"] += 1
+        logger.error(f"❌ 项目 {project_id} 第{chapter_number}章所在剧情弧汇总失败: {str(e)}")
+
+
+def schedule_summary_tree_update(user_id: str, project_id: str, chapter_number: int, ai_service: AIService):
+    """在后台补汇总某章所在的剧情弧和卷（已有相同任务在运行时跳过）"""
+    if not settings.chapter_summary_enabled:
+        return
+    
+    key = (user_id, f"{project_id}:arc:{_node_range(chapter_number, _arc_size())[0]}")
+    running = _summary_tasks.get(key)
+    if running is not None and not running.done():
+        return
+    
+    task = asyncio.get_running_loop().create_task(
+        _run_tree_task(user_id, project_id, chapter_number, ai_service)
+    )
+    _summary_tasks[key] = task
+    _chapter_summary_stats["scheduled"] += 1
+    
+    def _forget(finished: asyncio.Task):
+        if _summary_tasks.get(key) is finished:
+            _summary_tasks.pop(key, None)
+    
+    task.add_done_callback(_forget)
+
+
+async def invalidate_chapter_summary(db: AsyncSession, chapter: Chapter, old_chapter_number: Optional[int] = None):
+    """
+    正文被修改后删除旧摘要及其所在剧情弧、卷的汇总（在调用方的事务中执行）
+    
+    下次创作时这些位置回退为正文开头/下级摘要，并由 schedule_chapter_summary 沿路径重新生成。
+    
+    Args:
+        chapter: 被修改的章节
+        old_chapter_number: 修改前的章节序号（序号也变化时，原位置的汇总同样失效）
+    """
+    result = await db.execute(
+        select(ChapterSummary).where(ChapterSummary.chapter_id == chapter.id)
+    )
+    record = result.scalar_one_or_none()
+    if record is not None:
+        await db.delete(record)
+    
+    numbers = {chapter.chapter_number, old_chapter_number or chapter.chapter_number}
+    deleted = await _delete_summary_nodes(db, chapter.project_id, numbers)
+    if deleted:
+        logger.info(f"🧹 第{chapter.chapter_number}章正文已修改，{deleted} 个剧情弧/卷摘要待重新汇总")
+
+
+async def invalidate_summaries_from(db: AsyncSession, project_id: str, from_chapter: int):
+    """
+    章节被删除或重新编号后，删除 from_chapter 所在及之后的全部剧情弧、卷汇总（在调用方的事务中执行）
+    
+    汇总节点按起始章节序号定位，序号移动后原有汇总对应的已不是同一批章节。
+    章摘要按章节ID关联，不受重新编号影响。
+    
+    Args:
+        from_chapter: 受影响的最小章节序号
+    """
+    deleted = await _delete_summary_nodes(db, project_id, {from_chapter}, onward=True)
+    if deleted:
+        logger.info(f"🧹 第{from_chapter}章起的章节序号已变化，{deleted} 个剧情弧/卷摘要待重新汇总")
+
+
+async def _delete_summary_nodes(db: AsyncSession, project_id: str, numbers: Iterable[int], onward: bool = False) -> int:
+    """
+    删除包含指定章节的剧情弧、卷汇总
+    
+    Args:
+        numbers: 章节序号
+        onward: 为True时同时删除这些节点之后的所有节点
+    
+    Returns:
+        删除的节点数
+    """
+    conditions = []
+    for number in numbers:
+        for level, size in ((LEVEL_ARC, _arc_size()), (LEVEL_VOLUME, _volume_size())):
+            start = _node_range(number, size)[0]
+            conditions.append(and_(
+                StorySummaryNode.level == level,
+                StorySummaryNode.start_chapter >= start if onward else StorySummaryNode.start_chapter == start
+            ))
+    result = await db.execute(
+        delete(StorySummaryNode)
+        .where(StorySummaryNode.project_id == project_id)
+        .where(or_(*conditions))
+    )
+    return result.rowcount or 0
+
+
+class PreviousContext:
+    """前置章节上下文的构建结果"""
+    
+    def __init__(self, text: str, missing_chapter_ids: List[str], stale_chapter_numbers: List[int]):
+        self.text = text
+        # 缺少章摘要的章节ID（需要补生成）
+        self.missing_chapter_ids = missing_chapter_ids
+        # 所在剧情弧/卷缺少汇总的章节序号（每个节点一个代表章节，需要补汇总）
+        self.stale_chapter_numbers = stale_chapter_numbers
+
+
+def _fit_budget(items: List[Tuple[int, str]], budget: int) -> Tuple[List[Tuple[int, str]], int, int]:
+    """
+    按顺序（越靠前越重要）装入预算，遇到装不下的条目时连同其后的条目一起舍弃
+    
+    Returns:
+        (装入的条目, 剩余预算, 舍弃的条目数)
+    """
+    kept = []
+    for idx, (order, text) in enumerate(items):
+        cost = estimate_tokens(text)
+        if cost > budget:
+            return kept, budget, len(items) - idx
+        kept.append((order, text))
+        budget -= cost
+    return kept, budget, 0
+
+
+async def build_previous_context(
+    db: AsyncSession,
+    project_id: str,
+    chapter_number: int
+) -> PreviousContext:
+    """
+    构建创作第 chapter_number 章时的前置章节上下文
+    
+    - 最近 chapter_context_full_chapters 章：完整正文
+    - 当前剧情弧内更早的章节：章摘要（没有摘要的回退为正文开头）
+    - 本卷内更早的剧情弧：剧情弧摘要（尚未汇总的回退为章摘要）
+    - 更早的卷：卷摘要（尚未汇总的回退为剧情弧摘要）
+    
+    总长度受 chapter_context_token_budget 限制，按上面的顺序优先保留，
+    同一层级内越近的越优先；放不下的最早剧情会被舍弃。上下文长度随章节数对数级增长。
+    """
+    if chapter_number <= 1:
+        return PreviousContext("", [], [])
+    
+    arc_size = _arc_size()
+    volume_size = _volume_size()
+    full_start = max(1, chapter_number - max(0, settings.chapter_context_full_chapters))
+    arc_start = _node_range(chapter_number, arc_size)[0]
+    volume_start = _node_range(chapter_number, volume_size)[0]
+    
+    # 已汇总的卷和本卷内的剧情弧
+    volume_starts = list(range(1, volume_start, volume_size))
+    volume_nodes = {
+        row.start_chapter: row
+        for row in await chapter_context_repository.list_story_nodes(
+            db, project_id, LEVEL_VOLUME, [(1, volume_start)]
+        )
+    }
+    arc_nodes = {
+        row.start_chapter: row
+        for row in await chapter_context_repository.list_story_nodes(
+            db, project_id, LEVEL_ARC, [(volume_start, arc_start)]
+        )
+    }
+    
+    # 尚未汇总的卷回退为其中的剧情弧摘要
+    stale_numbers: List[int] = []
+    volume_items: List[Tuple[int, str]] = []
+    fallback_volumes = [start for start in volume_starts if start not in volume_nodes]
+    for start in volume_starts:
+        node = volume_nodes.get(start)
+        if node:
+            volume_items.append((start, f"第{start}-{node.end_chapter}章（第{(start - 1) // volume_size + 1}卷）：{node.summary}"))
+    if fallback_volumes:
+        rows = await chapter_context_repository.list_story_nodes(
+            db, project_id, LEVEL_ARC, [(start, start + volume_size) for start in fallback_volumes]
+        )
+        arc_starts = set()
+        for row in rows:
+            volume_items.append((row.start_chapter, f"第{row.start_chapter}-{row.end_chapter}章：{row.summary}"))
+            arc_starts.add(row.start_chapter)
+        # 卷内缺少的剧情弧先补汇总，剧情弧齐全时顺带汇总卷
+        for volume in fallback_volumes:
+            missing_arcs = [start for start in range(volume, volume + volume_size, arc_size) if start not in arc_starts]
+            stale_numbers.extend(missing_arcs or [volume])
+    
+    # 尚未汇总的剧情弧回退为其中的章摘要
+    arc_items: List[Tuple[int, str]] = []
+    chapter_ranges = [(arc_start, full_start)] if arc_start < full_start else []
+    for start in range(volume_start, arc_start, arc_size):
+        node = arc_nodes.get(start)
+        if node:
+            arc_items.append((start, f"第{start}-{node.end_chapter}章：{node.summary}"))
+        else:
+            chapter_ranges.append((start, start + arc_size))
+            stale_numbers.append(start)
+    
+    chapter_items: List[Tuple[int, str]] = []
+    missing_ids: List[str] = []
+    for row in await chapter_context_repository.list_chapter_summary_rows(
+        db, project_id, chapter_ranges, FALLBACK_PREFIX_CHARS
+    ):
+        number = row.chapter_number
+        if row.summary:
+            line = f"第{number}章《{row.title}》：{row.summary}"
+        else:
+            # 更早剧情弧中缺少的章摘要由补汇总任务一并生成
+            if number >= arc_start:
+                missing_ids.append(row.id)
+            line = f"第{number}章《{row.title}》：{row.prefix or ''}..."
+        # 回退展开的章摘要归入剧情弧层级
+        (chapter_items if number >= arc_start else arc_items).append((number, line))
+    
+    # 只有最近几章加载完整正文
+    recent_items = [
+        (row.chapter_number, f"=== 第{row.chapter_number}章：{row.title} ===\n{row.content or ''}")
+        for row in await chapter_context_repository.list_chapter_texts(db, project_id, full_start, chapter_number)
+    ]
+    
+    # 按优先级装入预算：最近正文 > 当前剧情弧章摘要 > 本卷剧情弧 > 更早的卷，同层级内由近及远
+    budget = max(0, settings.chapter_context_token_budget)
+    dropped = 0
+    kept_recent = []
+    for order, text in reversed(recent_items):
+        cost = estimate_tokens(text)
+        if cost <= budget:
+            kept_recent.append((order, text))
+            budget -= cost
+            continue
+        if not kept_recent and budget > 0:
+            # 最近一章本身超出预算时只保留结尾部分
+            kept_recent.append((order, "（前略）" + text[-budget:]))
+            budget = 0
+        dropped += 1
+    
+    kept_summaries = []
+    for items in (chapter_items, arc_items, volume_items):
+        if dropped:
+            dropped += len(items)
+            continue
+        kept, budget, tier_dropped = _fit_budget(sorted(items, reverse=True), budget)
+        kept_summaries.extend(kept)
+        dropped += tier_dropped
+    
+    sections = []
+    if kept_summaries:
+        kept_summaries.sort()
+        lines = [text for _, text in kept_summaries]
+        if kept_summaries[0][0] > 1:
+            lines.insert(0, f"（第1-{kept_summaries[0][0] - 1}章剧情从略）")
+        sections.append("【前期剧情概要】\n" + "\n".join(lines))
+    if kept_recent:
+        sections.append("【最近章节完整内容】\n" + "\n\n".join(text for _, text in reversed(kept_recent)))
+    
+    _chapter_summary_stats["fallbacks"] += len(missing_ids)
+    _chapter_summary_stats["context_items_dropped"] += dropped
+    logger.info(
+        f"构建前置上下文：{len(volume_items)}条卷级 + {len(arc_items)}条剧情弧级 + {len(chapter_items)}章摘要"
+        f"（{len(missing_ids)}章无摘要） + {len(kept_recent)}章完整内容，超出预算舍弃{dropped}条，"
+        f"剩余预算{budget}"
+    )
+    return PreviousContext("\n\n".join(sections), missing_ids, stale_numbers)
@@ -0,0 +1,272 @@
+"""
+提示词上下文装配器 - 按token预算分配各段上下文，超出时按优先级截断
+
+各段先按 max_share（占可用预算的比例上限）依优先级分配，剩余预算再按优先级补给仍不够的段落。
+stable 段落位于提示词的可缓存前缀中，只按占总预算的比例分配、不参与剩余预算的补给，
+这样同一项目不同章节的前缀不会因为其他段落长短变化而被截断到不同位置。
+分到的预算小于所需时按段落的截断方式处理：
+- head: 保留开头（世界观、写作风格）
+- tail: 保留结尾（前置章节内容，越近越重要）
+- lines: 按行保留，离 focus 行越近越优先（角色列表、大纲列表）
+
+总预算取 PROMPT_TOKEN_BUDGET 与"模型上下文窗口 - max_tokens"中较小的一个，见 prompt_token_budget。
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.utils.token_estimator import estimate_tokens
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 截断标记
+TRUNCATED_MARK = "……（已截断）"
+OMITTED_MARK = "……"
+
+# 常见模型的上下文窗口（tokens），按模型名前缀匹配，更具体的前缀在前
+MODEL_CONTEXT_WINDOWS = (
+    ("gpt-4.1", 1047576),
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4-1106", 128000),
+    ("gpt-4-0125", 128000),
+    ("gpt-4-32k", 32768),
+    ("gpt-4", 8192),
+    ("gpt-3.5-turbo", 16385),
+    ("o1", 128000),
+    ("claude", 200000),
+    ("gemini", 1048576),
+    ("deepseek", 64000),
+    ("moonshot-v1-8k", 8192),
+    ("moonshot-v1-32k", 32768),
+    ("moonshot-v1-128k", 131072),
+    ("glm-4", 128000),
+    ("qwen", 32768),
+)
+
+
+def model_context_window(model: Optional[str]) -> int:
+    """按模型名识别上下文窗口，无法识别时使用 DEFAULT_CONTEXT_WINDOW"""
+    name = (model or "").lower().rsplit("/", 1)[-1]
+    for prefix, window in MODEL_CONTEXT_WINDOWS:
+        if name.startswith(prefix):
+            return window
+    return settings.default_context_window
+
+
+def prompt_token_budget(model: Optional[str], max_tokens: int) -> int:
+    """
+    提示词的token预算：不超过 PROMPT_TOKEN_BUDGET，并为模型输出留出 max_tokens
+    
+    为输出预留的部分最多占上下文窗口的一半，max_tokens 配置得很大时提示词仍有可用预算。
+    
+    Args:
+        model: 实际调用的模型名
+        max_tokens: 本次调用的最大输出token数
+    """
+    window = model_context_window(model)
+    return max(0, min(settings.prompt_token_budget, window - min(max_tokens, window // 2)))
+
+
+class ContextSection:
+    """一段待装配的上下文"""
+    
+    __slots__ = ("name", "text", "priority", "max_share", "strategy", "focus", "stable")
+    
+    def __init__(
+        self,
+        name: str,
+        text: str,
+        priority: int,
+        max_share: float = 1.0,
+        strategy: str = "head",
+        focus: Optional[int] = None,
+        stable: bool = False
+    ):
+        """
+        Args:
+            name: 段落名称
+            text: 原始文本
+            priority: 优先级，数字越小越优先
+            max_share: 首轮分配时占可用预算的比例上限
+            strategy: 截断方式 head/tail/lines
+            focus: lines 方式下最优先保留的行号
+            stable: 是否位于可缓存前缀中（分配结果只取决于总预算和自身长度）
+        """
+        self.name = name
+        self.text = text or ""
+        self.priority = priority
+        self.max_share = max_share
+        self.strategy = strategy
+        self.focus = focus
+        self.stable = stable
+
+
+class ContextPlan:
+    """装配结果：各段截断后的文本和预算明细"""
+    
+    def __init__(self, budget: int, fixed_tokens: int):
+        self.budget = budget
+        self.fixed_tokens = fixed_tokens
+        self.texts: Dict[str, str] = {}
+        self.sections: Dict[str, Dict[str, Any]] = {}
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.fixed_tokens + sum(s["final_tokens"] for s in self.sections.values())
+    
+    @property
+    def truncated(self) -> List[str]:
+        return [name for name, s in self.sections.items() if s["truncated"]]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "fixed_tokens": self.fixed_tokens,
+            "total_tokens": self.total_tokens,
+            "truncated_sections": self.truncated,
+            "sections": self.sections
+        }
+
+
+def _cut(text: str, max_tokens: int, keep_tail: bool) -> str:
+    """按字符截取开头或结尾，使估算token数不超过 max_tokens（含截断标记）"""
+    mark = TRUNCATED_MARK if not keep_tail else "（前略）" + OMITTED_MARK
+    limit = max_tokens - estimate_tokens(mark)
+    if limit <= 0:
+        return ""
+    total = estimate_tokens(text)
+    size = max(1, len(text) * limit // max(total, 1))
+    while size > 0:
+        piece = text[-size:] if keep_tail else text[:size]
+        if estimate_tokens(piece) <= limit:
+            return mark + piece if keep_tail else piece + mark
+        size = size * 9 // 10
+    return ""
+
+
+def _keep_lines(text: str, max_tokens: int, focus: Optional[int]) -> str:
+    """按行保留，离 focus 越近越优先，被省略的连续行用省略号代替"""
+    lines = text.split("\n")
+    focus = min(max(focus or 0, 0), len(lines) - 1)
+    mark_cost = estimate_tokens(OMITTED_MARK) + 1
+    budget = max_tokens
+    kept = set()
+    for idx in sorted(range(len(lines)), key=lambda i: (abs(i - focus), i)):
+        cost = estimate_tokens(lines[idx]) + 1
+        # 为省略号预留位置
+        if cost + 2 * mark_cost > budget:
+            break
+        kept.add(idx)
+        budget -= cost
+    
+    result = []
+    omitted = False
+    for idx, line in enumerate(lines):
+        if idx in kept:
+            result.append(line)
+            omitted = False
+        elif not omitted:
+            result.append(OMITTED_MARK)
+            omitted = True
+    return "\n".join(result) if kept else ""
+
+
+def truncate_to_tokens(text: str, max_tokens: int, strategy: str = "head", focus: Optional[int] = None) -> str:
+    """把文本截断到估算token数不超过 max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    if strategy == "lines":
+        return _keep_lines(text, max_tokens, focus)
+    return _cut(text, max_tokens, keep_tail=(strategy == "tail"))
+
+
+def assemble_context(sections: List[ContextSection], budget: int, fixed_tokens: int = 0) -> ContextPlan:
+    """
+    在总预算内装配各段上下文
+    
+    Args:
+        sections: 待装配的段落
+        budget: 提示词总token预算
+        fixed_tokens: 模板等不可截断部分的token数
+    
+    Returns:
+        装配结果（plan.texts[name] 为截断后的文本）
+    """
+    plan = ContextPlan(budget, fixed_tokens)
+    available = max(0, budget - fixed_tokens)
+    ordered = sorted(sections, key=lambda s: s.priority)
+    needs = {s.name: estimate_tokens(s.text) for s in sections}
+    
+    # 稳定段落按占总预算的比例分配，与模板长度和其他段落无关
+    allocations: Dict[str, int] = {}
+    for section in ordered:
+        if section.stable:
+            allocations[section.name] = min(needs[section.name], int(budget * section.max_share))
+    remaining = max(0, available - sum(allocations.values()))
+    
+    # 首轮：其余段落按优先级分配，每段不超过其比例上限
+    for section in ordered:
+        if section.stable:
+            continue
+        share = int(available * section.max_share)
+        allocations[section.name] = min(needs[section.name], share, remaining)
+        remaining -= allocations[section.name]
+    
+    # 次轮：剩余预算按优先级补给仍不够的段落
+    for section in ordered:
+        if remaining <= 0:
+            break
+        if section.stable:
+            continue
+        extra = min(needs[section.name] - allocations[section.name], remaining)
+        if extra > 0:
+            allocations[section.name] += extra
+            remaining -= extra
+    
+    for section in sections:
+        need = needs[section.name]
+        allocated = allocations[section.name]
+        text = section.text if allocated >= need else truncate_to_tokens(
+            section.text, allocated, section.strategy, section.focus
+        )
+        plan.texts[section.name] = text
+        plan.sections[section.name] = {
+            "priority": section.priority,
+            "chars": len(section.text),
+            "tokens": need,
+            "allocated": allocated,
+            "final_tokens": estimate_tokens(text) if allocated < need else need,
+            "truncated": allocated < need
+        }
+    return plan
+
+
+def fit_prompt(
+    render: Callable[..., Any],
+    sections: List[ContextSection],
+    budget: int,
+    label: str = "提示词"
+) -> Tuple[Any, ContextPlan]:
+    """
+    按预算装配各段上下文并渲染提示词
+    
+    Args:
+        render: 以各段名称为关键字参数渲染提示词，返回字符串或字符串元组（前缀, 正文）
+        sections: 待装配的段落
+        budget: 提示词总token预算
+        label: 日志中的提示词名称
+    
+    Returns:
+        (渲染结果, 装配明细)；模板本身的token数用空段落渲染一次估算
+    """
+    empty = render(**{section.name: "" for section in sections})
+    fixed_tokens = estimate_tokens(empty if isinstance(empty, str) else "".join(empty))
+    plan = assemble_context(sections, budget, fixed_tokens)
+    if plan.truncated:
+        logger.info(
+            f"✂️ {label}超出预算 {plan.budget}，"
+            f"已截断: {', '.join(plan.truncated)}（约 {plan.total_tokens} tokens）"
+        )
+    return render(**plan.texts), plan
@@ -0,0 +1,470 @@
+"""
+后台生成任务 - 生成过程与SSE连接解耦
+
+生成器作为独立的 asyncio 任务运行，使用自己的数据库会话，产生的SSE事件写入有界的重放缓冲区，
+每个事件带单调递增的ID。SSE接口只是订阅者：连接断开不会中断生成，生成完成后照常提交；
+客户端重连时带上 Last-Event-ID 即可从断点继续接收。
+
+任务状态记录在用户库的 generation_jobs 表中；事件只保存在进程内存里，
+任务结束后保留 JOB_RETENTION_SECONDS 秒供重连，进程重启后未结束的任务标记为 interrupted。
+
+同一用户的每个项目同时只运行一个任务（single-flight，以项目为冲突范围）：
+大纲生成（mode=new 会删除章节）不能与章节创作并行，两个章节创作也会同时改写 project.current_words。
+类型、目标和参数都相同的重复请求（双击、多个标签页）直接订阅进行中的任务，不再调用AI；
+同一项目或同一目标上的其他请求抛出 JobConflictError（接口返回409）。
+不属于任何项目的任务（如创建项目）只合并类型和参数完全相同的请求。
+"""
+import asyncio
+import hashlib
+import json
+import uuid
+from collections import deque
+from itertools import islice
+from datetime import datetime
+from typing import Any, AsyncGenerator, Callable, Deque, Dict, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.database import user_session
+from app.models.generation_job import GenerationJob
+from app.utils.sse_response import SSEResponse, SSEBroadcaster, create_sse_response
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 生成器工厂：接收任务专用的数据库会话，返回SSE消息生成器
+JobFactory = Callable[[AsyncSession], AsyncGenerator[str, None]]
+
+# 已结束的任务状态
+FINISHED_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+
+# 后台生成任务统计（累计值）
+_job_stats = {
+    "started": 0,
+    "completed": 0,
+    "failed": 0,
+    "cancelled": 0,
+    "events": 0,
+    "deduplicated": 0,
+    "conflicts": 0,
+    "subscriptions": 0,
+    "resumes": 0,
+    "replay_gaps": 0,
+    "catch_ups": 0
+}
+
+
+# 任务类型的显示名称（冲突提示用）
+JOB_KIND_LABELS = {
+    "chapter": "章节创作",
+    "outline_generate": "大纲生成",
+    "wizard_world_building": "世界观生成",
+    "wizard_characters": "角色生成",
+    "wizard_outline": "向导大纲生成",
+    "wizard_regenerate_world_building": "世界观重新生成"
+}
+
+
+class JobConflictError(Exception):
+    """同一项目或同一目标上已有其他任务在运行"""
+    
+    def __init__(self, job: "JobRuntime"):
+        self.job = job
+        label = JOB_KIND_LABELS.get(job.kind, job.kind)
+        super().__init__(f"{label}正在进行中，请等待完成或先取消该任务（任务ID: {job.id}）")
+
+
+class JobRuntime:
+    """进程内的任务运行状态和事件重放缓冲区"""
+    
+    def __init__(self, job_id: str, user_id: str, kind: str,
+                 project_id: Optional[str], target_id: Optional[str],
+                 fingerprint: Optional[str] = None):
+        self.id = job_id
+        self.user_id = user_id
+        self.kind = kind
+        self.project_id = project_id
+        self.target_id = target_id
+        self.fingerprint = fingerprint
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=max(1, settings.job_event_buffer_size))
+        self.last_event_id = 0
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.broadcaster = SSEBroadcaster()
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+    
+    def publish(self, frame: str):
+        """追加一个SSE事件到重放缓冲区，并广播给正在收听的订阅者"""
+        self.last_event_id += 1
+        self.events.append((self.last_event_id, frame))
+        _job_stats["events"] += 1
+        self.broadcaster.publish(self.last_event_id, frame)
+    
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.broadcaster.close()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "project_id": self.project_id,
+            "target_id": self.target_id,
+            "status": self.status,
+            "error": self.error,
+            "last_event_id": self.last_event_id,
+            "subscribers": self.subscribers
+        }
+
+
+# 运行中及刚结束（保留期内）的任务：任务ID -> 运行状态
+_jobs: Dict[str, JobRuntime] = {}
+
+
+def get_job_stats() -> Dict[str, Any]:
+    """获取后台生成任务统计"""
+    return {
+        **_job_stats,
+        "running": sum(1 for job in _jobs.values() if not job.finished),
+        "retained": sum(1 for job in _jobs.values() if job.finished),
+        "subscribers": sum(job.subscribers for job in _jobs.values())
+    }
+
+
+def get_job(job_id: str, user_id: str) -> Optional[JobRuntime]:
+    """获取内存中的任务（只返回属于该用户的任务）"""
+    job = _jobs.get(job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+
+def find_running_job(user_id: str, kind: str, target_id: str) -> Optional[JobRuntime]:
+    """查找同一目标上仍在运行的指定类型任务"""
+    for job in _jobs.values():
+        if job.user_id == user_id and job.kind == kind and job.target_id == target_id and not job.finished:
+            return job
+    return None
+
+
+def job_fingerprint(kind: str, params: Any = None) -> str:
+    """任务类型和请求参数的指纹，相同指纹的请求视为同一次生成"""
+    payload = json.dumps([kind, params], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _find_in_flight(
+    user_id: str,
+    kind: str,
+    project_id: Optional[str],
+    target_id: Optional[str],
+    fingerprint: str
+) -> Optional[JobRuntime]:
+    """
+    查找可以合并或与之冲突的进行中任务
+    
+    优先返回类型、目标和指纹都相同的任务（可以直接合并）；
+    否则返回同一项目或同一目标上任意进行中的任务（冲突）。
+    """
+    conflict: Optional[JobRuntime] = None
+    for job in _jobs.values():
+        if job.user_id != user_id or job.finished:
+            continue
+        if job.kind == kind and job.target_id == target_id and job.fingerprint == fingerprint:
+            return job
+        if conflict is None and (
+            (project_id is not None and job.project_id == project_id)
+            or (target_id is not None and job.target_id == target_id)
+        ):
+            conflict = job
+    return conflict
+
+
+def _frame_error(frame: str) -> Optional[str]:
+    """若SSE消息是错误事件，返回错误信息"""
+    for line in frame.split("\n"):
+        if line.startswith("data: ") and '"type": "error"' in line:
+            try:
+                return str(json.loads(line[6:]).get("error") or "生成失败")
+            except ValueError:
+                return "生成失败"
+    return None
+
+
+async def _save_job_status(job: JobRuntime, created: bool = False):
+    """写入任务状态（失败只记录日志，不影响生成）"""
+    try:
+        async with user_session(job.user_id) as db:
+            if created:
+                db.add(GenerationJob(
+                    id=job.id,
+                    project_id=job.project_id,
+                    kind=job.kind,
+                    target_id=job.target_id,
+                    status=job.status
+                ))
+            else:
+                await db.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job.id)
+                    .values(
+                        project_id=job.project_id,
+                        status=job.status,
+                        last_event_id=job.last_event_id,
+                        error=job.error,
+                        finished_at=datetime.now() if job.finished else None
+                    )
+                )
+            await db.commit()
+    except Exception as e:
+        logger.error(f"❌ 保存任务状态失败 [{job.id}]: {e}")
+
+
+def _forget_later(job: JobRuntime):
+    """保留期结束后从内存中移除任务"""
+    def forget():
+        if _jobs.get(job.id) is job:
+            del _jobs[job.id]
+    asyncio.get_running_loop().call_later(max(0, settings.job_retention_seconds), forget)
+
+
+async def _run_job(job: JobRuntime, factory: JobFactory):
+    """在独立的数据库会话中运行生成器，把产生的事件写入缓冲区"""
+    status = "completed"
+    error = None
+    try:
+        async with user_session(job.user_id) as db:
+            generator = factory(db)
+            try:
+                async for frame in generator:
+                    if frame.startswith(":"):
+                        # 心跳由订阅端按需发送，不进入重放缓冲区
+                        continue
+                    job.publish(frame)
+                    frame_error = _frame_error(frame)
+                    if frame_error:
+                        status, error = "failed", frame_error
+                    if job.project_id is None and '"project_id"' in frame:
+                        # 创建项目的任务在生成过程中才知道项目ID
+                        job.project_id = _find_project_id(frame)
+            finally:
+                await generator.aclose()
+    except asyncio.CancelledError:
+        status, error = "cancelled", "任务已取消"
+        job.publish(await SSEResponse.send_error("任务已取消", 499))
+    except Exception as e:
+        logger.error(f"❌ 后台生成任务失败 [{job.kind}:{job.id}]: {e}", exc_info=True)
+        status, error = "failed", str(e)
+        job.publish(await SSEResponse.send_error(f"生成失败: {e}"))
+    finally:
+        job.finish(status, error)
+        _job_stats[status] += 1
+        logger.info(f"🏁 后台生成任务结束 [{job.kind}:{job.id}] 状态: {status}，事件数: {job.last_event_id}")
+        await _save_job_status(job)
+        _forget_later(job)
+
+
+def _find_project_id(frame: str) -> Optional[str]:
+    """从结果事件中取出项目ID"""
+    for line in frame.split("\n"):
+        if line.startswith("data: "):
+            try:
+                data = json.loads(line[6:]).get("data")
+            except ValueError:
+                return None
+            if isinstance(data, dict) and isinstance(data.get("project_id"), str):
+                return data["project_id"]
+    return None
+
+
+async def start_job(
+    user_id: str,
+    kind: str,
+    factory: JobFactory,
+    project_id: Optional[str] = None,
+    target_id: Optional[str] = None,
+    fingerprint: Optional[str] = None
+) -> JobRuntime:
+    """
+    启动后台生成任务
+    
+    Args:
+        user_id: 用户ID
+        kind: 任务类型
+        factory: 生成器工厂，接收任务专用的数据库会话
+        project_id: 所属项目ID
+        target_id: 任务目标ID（如章节ID）
+        fingerprint: 请求指纹（见 job_fingerprint）
+    
+    Returns:
+        任务运行状态；第一个事件（ID为1）是 {"type": "job", "job_id": ...}
+    """
+    job = JobRuntime(str(uuid.uuid4()), user_id, kind, project_id, target_id, fingerprint)
+    _jobs[job.id] = job
+    _job_stats["started"] += 1
+    await _save_job_status(job, created=True)
+    job.publish(SSEResponse.format_sse({"type": "job", "job_id": job.id, "kind": kind}))
+    job.task = asyncio.create_task(_run_job(job, factory))
+    logger.info(f"🚀 后台生成任务已启动 [{kind}:{job.id}]")
+    return job
+
+
+def cancel_job(job: JobRuntime) -> bool:
+    """取消运行中的任务"""
+    if job.finished or job.task is None or job.task.done():
+        return False
+    job.task.cancel()
+    return True
+
+
+async def subscribe(job: JobRuntime, last_event_id: int = 0) -> AsyncGenerator[str, None]:
+    """
+    订阅任务事件：先重放 last_event_id 之后缓冲区中的事件，再接收实时广播，任务结束后退出
+    
+    同一任务可以有任意多个订阅者，各自有独立的有界队列。订阅者处理过慢、
+    队列中出现无法合并的事件时会被移出广播，改为从重放缓冲区追赶后重新收听。
+    
+    Args:
+        job: 任务
+        last_event_id: 客户端已收到的最后一个事件ID（来自 Last-Event-ID）
+    """
+    cursor = max(0, last_event_id)
+    job.subscribers += 1
+    _job_stats["subscriptions"] += 1
+    if cursor:
+        _job_stats["resumes"] += 1
+        logger.info(f"🔁 任务 {job.id} 从事件 {cursor} 之后恢复订阅")
+    heartbeat = settings.sse_heartbeat_interval or None
+    try:
+        while True:
+            # 登记实时订阅和取出缓冲区快照在同一时刻完成，两者之间不会漏掉或重复事件
+            subscription = None if job.finished else job.broadcaster.subscribe()
+            try:
+                pending = []
+                if job.events:
+                    first_id = job.events[0][0]
+                    if first_id > cursor + 1:
+                        # 断开太久，部分事件已被挤出缓冲区
+                        _job_stats["replay_gaps"] += 1
+                        yield SSEResponse.format_sse({
+                            "type": "replay_gap",
+                            "missed_from": cursor + 1,
+                            "missed_to": first_id - 1
+                        })
+                        cursor = first_id - 1
+                    pending = list(islice(job.events, cursor - first_id + 1, None))
+                for event_id, frame in pending:
+                    yield f"id: {event_id}\n{frame}"
+                    cursor = event_id
+                
+                if subscription is None:
+                    break
+                while True:
+                    try:
+                        item = await subscription.next(heartbeat)
+                    except StopAsyncIteration:
+                        break
+                    if item is None:
+                        yield await SSEResponse.send_heartbeat()
+                        continue
+                    event_id, frame = item
+                    yield f"id: {event_id}\n{frame}"
+                    cursor = event_id
+            finally:
+                if subscription is not None:
+                    subscription.close()
+            
+            if not subscription.dropped:
+                break
+            _job_stats["catch_ups"] += 1
+            logger.info(f"🐢 任务 {job.id} 的订阅者处理过慢，从事件 {cursor} 之后改为追赶重放缓冲区")
+    finally:
+        job.subscribers -= 1
+
+
+def job_sse_response(job: JobRuntime, last_event_id: int = 0) -> StreamingResponse:
+    """订阅任务的SSE响应，响应头 X-Job-ID 为任务ID"""
+    response = create_sse_response(subscribe(job, last_event_id))
+    response.headers["X-Job-ID"] = job.id
+    return response
+
+
+async def start_job_response(
+    user_id: str,
+    kind: str,
+    factory: JobFactory,
+    project_id: Optional[str] = None,
+    target_id: Optional[str] = None,
+    params: Any = None
+) -> StreamingResponse:
+    """
+    启动后台生成任务并返回订阅它的SSE响应
+    
+    已有类型、目标和参数相同的进行中任务时直接订阅该任务；
+    同一项目或同一目标上有其他任务时抛出 JobConflictError。
+    
+    Args:
+        params: 影响生成结果的请求参数，用于判断重复请求
+    """
+    fingerprint = job_fingerprint(kind, params)
+    job = _find_in_flight(user_id, kind, project_id, target_id, fingerprint)
+    if job is not None:
+        if job.kind != kind or job.target_id != target_id or job.fingerprint != fingerprint:
+            _job_stats["conflicts"] += 1
+            logger.warning(f"⚠️ {kind} 请求与进行中的任务冲突 [{job.kind}:{job.id}]")
+            raise JobConflictError(job)
+        _job_stats["deduplicated"] += 1
+        logger.info(f"🔗 {kind} 已有相同的进行中任务 {job.id}，直接订阅（第 {job.subscribers + 1} 个订阅者）")
+    else:
+        job = await start_job(
+            user_id, kind, factory,
+            project_id=project_id, target_id=target_id, fingerprint=fingerprint
+        )
+    return job_sse_response(job)
+
+
+async def get_job_record(db: AsyncSession, job_id: str) -> Optional[Dict[str, Any]]:
+    """读取任务状态：优先取内存中的实时状态，否则取数据库记录"""
+    result = await db.execute(select(GenerationJob).where(GenerationJob.id == job_id))
+    record = result.scalar_one_or_none()
+    if record is None:
+        return None
+    job = _jobs.get(job_id)
+    if job is not None:
+        return {**job.to_dict(), "replayable": True, "created_at": record.created_at, "finished_at": record.finished_at}
+    if record.status == "running":
+        # 进程重启前未结束的任务
+        record.status = "interrupted"
+        record.error = "服务重启，任务已中断"
+        await db.commit()
+    return {
+        "job_id": record.id,
+        "kind": record.kind,
+        "project_id": record.project_id,
+        "target_id": record.target_id,
+        "status": record.status,
+        "error": record.error,
+        "last_event_id": record.last_event_id,
+        "subscribers": 0,
+        "replayable": False,
+        "created_at": record.created_at,
+        "finished_at": record.finished_at
+    }
+
+
+async def shutdown_jobs():
+    """应用关闭时取消仍在运行的任务"""
+    tasks = [job.task for job in _jobs.values() if job.task and not job.task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"已取消 {len(tasks)} 个未完成的后台生成任务")
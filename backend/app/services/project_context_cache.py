@@ -0,0 +1,225 @@
+"""
+项目上下文缓存 - 缓存由角色、大纲拼接出的提示词上下文（characters_info / outlines_context 等）
+
+每个项目有一个进程内版本号。角色、大纲、写作风格的写入以及项目的新增、删除、
+标题/主题/世界观等设定的修改在事务提交后使版本号加一；只改动 current_words、wizard_step
+等统计或状态字段不会让缓存失效。缓存条目带着生成时的版本号，版本不一致即视为失效。
+项目未变化时重复生成可以跳过查询和拼接。
+
+版本号只在当前进程内维护；多进程部署时各进程分别缓存，其他进程的写入不会让本进程失效。
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Set, Tuple
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.character import Character
+from app.models.outline import Outline
+from app.models.project import Project
+from app.models.writing_style import WritingStyle
+from app.services import chapter_context_repository
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 影响项目上下文的模型
+_TRACKED_MODELS = (Character, Outline, Project, WritingStyle)
+
+# 影响项目上下文的项目字段；其他字段（current_words、wizard_step、status 等）的修改不使缓存失效
+_PROJECT_CONTEXT_COLUMNS = (
+    "title", "description", "theme", "genre", "narrative_perspective",
+    "world_time_period", "world_location", "world_atmosphere", "world_rules"
+)
+
+# 会话中待提交的项目ID集合（保存在 session.info 中），"*" 表示无法确定项目
+_DIRTY_KEY = "project_context_dirty"
+_ALL_PROJECTS = "*"
+
+# 项目版本号：项目ID -> 版本
+_project_versions: Dict[str, int] = {}
+
+# 全局版本号：无法确定受影响项目时（批量语句、全局预设风格）整体失效
+_global_version = 0
+
+# 缓存条目：(项目ID, 类型) -> ((全局版本, 项目版本), 值)，LRU顺序
+_context_cache: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], str]]" = OrderedDict()
+
+# 项目上下文缓存统计（累计值）
+_context_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "bypassed": 0,
+    "invalidations": 0
+}
+
+
+def get_context_cache_stats() -> Dict[str, Any]:
+    """获取项目上下文缓存统计"""
+    total = _context_cache_stats["hits"] + _context_cache_stats["misses"]
+    return {
+        **_context_cache_stats,
+        "size": len(_context_cache),
+        "max_size": settings.project_context_cache_size,
+        "hit_rate": round(_context_cache_stats["hits"] / total, 4) if total else None
+    }
+
+
+def _version(project_id: str) -> Tuple[int, int]:
+    return _global_version, _project_versions.get(project_id, 0)
+
+
+def bump_project_version(project_id: str):
+    """让项目的缓存上下文失效"""
+    global _global_version
+    if project_id == _ALL_PROJECTS:
+        _global_version += 1
+    else:
+        _project_versions[project_id] = _project_versions.get(project_id, 0) + 1
+    _context_cache_stats["invalidations"] += 1
+
+
+async def _get_or_build(
+    db: AsyncSession,
+    project_id: str,
+    kind: str,
+    builder: Callable[[], Awaitable[str]]
+) -> str:
+    """读取缓存，版本不一致或缺失时重新构建"""
+    pending = db.sync_session.info.get(_DIRTY_KEY)
+    if pending and (project_id in pending or _ALL_PROJECTS in pending):
+        # 当前事务里有尚未提交的修改，缓存的内容已经过时，也不能把未提交的内容写入缓存
+        _context_cache_stats["bypassed"] += 1
+        return await builder()
+    
+    key = (project_id, kind)
+    version = _version(project_id)
+    cached = _context_cache.get(key)
+    if cached is not None and cached[0] == version:
+        _context_cache.move_to_end(key)
+        _context_cache_stats["hits"] += 1
+        return cached[1]
+    
+    _context_cache_stats["misses"] += 1
+    value = await builder()
+    _context_cache[key] = (version, value)
+    _context_cache.move_to_end(key)
+    max_size = settings.project_context_cache_size
+    while max_size > 0 and len(_context_cache) > max_size:
+        _context_cache.popitem(last=False)
+    return value
+
+
+async def get_characters_info(db: AsyncSession, project_id: str) -> str:
+    """项目全部角色/组织的简介（名称、类型、性格开头），用于章节和大纲生成"""
+    async def build() -> str:
+        characters = await chapter_context_repository.list_character_briefs(db, project_id, 100)
+        return "\n".join([
+            f"- {c.name} ({'组织' if c.is_organization else '角色'}, {c.role_type}): {c.personality or '暂无描述'}"
+            for c in characters
+        ])
+    
+    return await _get_or_build(db, project_id, "characters_info", build)
+
+
+async def get_outlines_context(db: AsyncSession, project_id: str) -> str:
+    """项目全部大纲的标题和内容开头，用于章节生成"""
+    async def build() -> str:
+        outlines = await chapter_context_repository.list_outline_briefs(db, project_id, 100)
+        return "\n".join([
+            f"第{o.order_index}章 {o.title}: {o.prefix or ''}..."
+            for o in outlines
+        ])
+    
+    return await _get_or_build(db, project_id, "outlines_context", build)
+
+
+async def get_existing_characters_summary(db: AsyncSession, project_id: str) -> str:
+    """最近创建的10个角色/组织的名称和类型，用于生成新角色时避免重复"""
+    async def build() -> str:
+        result = await db.execute(
+            select(Character.name, Character.is_organization, Character.role_type, Character.organization_type)
+            .where(Character.project_id == project_id)
+            .order_by(Character.created_at.desc())
+            .limit(10)
+        )
+        character_list = []
+        organization_list = []
+        for c in result.all():
+            if c.is_organization:
+                organization_list.append(f"- {c.name} [{c.organization_type or '组织'}]")
+            else:
+                character_list.append(f"- {c.name}（{c.role_type or '未知'}）")
+        
+        summary = ""
+        if character_list:
+            summary += "\n已有角色：\n" + "\n".join(character_list)
+        if organization_list:
+            summary += "\n\n已有组织：\n" + "\n".join(organization_list)
+        return summary
+    
+    return await _get_or_build(db, project_id, "existing_characters", build)
+
+
+# ==================== 版本维护（Session事件） ====================
+
+def _project_context_changed(project: Project) -> bool:
+    """项目中影响上下文的字段是否被修改"""
+    attrs = inspect(project).attrs
+    return any(attrs[name].history.has_changes() for name in _PROJECT_CONTEXT_COLUMNS)
+
+
+def _tracked_project_id(obj, modified: bool = False) -> Any:
+    """
+    对象所属的项目ID；不相关的对象返回None
+    
+    Args:
+        modified: 对象是否为修改（而非新增/删除）；修改的项目只有上下文相关字段变化时才计入
+    """
+    if isinstance(obj, Project):
+        if modified and not _project_context_changed(obj):
+            return None
+        return obj.id
+    if isinstance(obj, WritingStyle) and obj.project_id is None:
+        # 全局预设风格影响所有项目
+        return _ALL_PROJECTS
+    if isinstance(obj, _TRACKED_MODELS):
+        return obj.project_id
+    return None
+
+
+def _after_flush(session: Session, flush_context):
+    """记录本次flush涉及的项目，事务提交后再使其失效"""
+    touched: Set[str] = set()
+    for collection, modified in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in collection:
+            project_id = _tracked_project_id(obj, modified)
+            if project_id:
+                touched.add(project_id)
+    if touched:
+        session.info.setdefault(_DIRTY_KEY, set()).update(touched)
+
+
+def _on_orm_execute(orm_execute_state):
+    """批量 insert/update/delete 无法确定受影响的项目，提交后整体失效"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in _TRACKED_MODELS:
+        orm_execute_state.session.info.setdefault(_DIRTY_KEY, set()).add(_ALL_PROJECTS)
+
+
+def _after_commit(session: Session):
+    for project_id in session.info.pop(_DIRTY_KEY, ()):
+        bump_project_version(project_id)
+
+
+def _after_rollback(session: Session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+event.listen(Session, "after_flush", _after_flush)
+event.listen(Session, "do_orm_execute", _on_orm_execute)
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_rollback", _after_rollback)
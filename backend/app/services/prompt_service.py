@@ -1,5 +1,5 @@
 """提示词管理服务"""
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 import json
 
 
@@ -234,22 +234,87 @@ class PromptService:
 
 **重要说明：**
 1. **数量控制**：数组中必须精确包含{count}个对象，不能多也不能少
-2. **关系约束**：relationships_array只能引用本批次中已经出现的角色名称
-3. **组织约束**：organization_memberships只能引用本批次中is_organization=true的实体名称
+2. **关系约束**：{relation_rule}
+3. **组织约束**：{organization_rule}
 4. **禁止幻觉**：不要引用任何不存在的角色或组织，如果没有可引用的就留空数组[]
 5. intimacy_level和loyalty都是0-100的整数
 6. 角色之间要形成合理的关系网络
 
 **示例说明**：
-- 如果生成了角色A、组织B、角色C，则角色A的organization_memberships只能是[组织B]，不能是其他组织
-- 如果角色A在数组第一位，它的relationships_array必须为空[]，因为还没有其他角色
-- 如果角色C在数组第三位，它的relationships_array可以引用角色A，但不能引用不存在的角色D
+{reference_examples}
 
 再次强调：
 1. 只返回纯JSON数组，不要有```json```这样的标记
 2. 数组中必须精确包含{count}个对象
-3. 不要引用任何本批次中不存在的角色或组织名称
+3. {reference_rule}
 4. 文本描述中不要使用中文引号（""），改用【】或《》"""
+    
+    # 批量角色生成的引用范围：batch 只能引用本批次中的实体；roster 按完整角色名单并行扩写，可以引用名单中的任何实体
+    CHARACTERS_BATCH_REFERENCE_SCOPES = {
+        "batch": {
+            "relation_rule": "relationships_array只能引用本批次中已经出现的角色名称",
+            "organization_rule": "organization_memberships只能引用本批次中is_organization=true的实体名称",
+            "reference_examples": (
+                "- 如果生成了角色A、组织B、角色C，则角色A的organization_memberships只能是[组织B]，不能是其他组织\n"
+                "- 如果角色A在数组第一位，它的relationships_array必须为空[]，因为还没有其他角色\n"
+                "- 如果角色C在数组第三位，它的relationships_array可以引用角色A，但不能引用不存在的角色D"
+            ),
+            "reference_rule": "不要引用任何本批次中不存在的角色或组织名称"
+        },
+        "roster": {
+            "relation_rule": "relationships_array可以引用【完整角色名单】中的任何角色，包括不在本批次中的角色",
+            "organization_rule": "organization_memberships只能引用【完整角色名单】中的组织名称",
+            "reference_examples": (
+                "- 如果名单中有角色A、组织B、角色C，本批次只生成角色C，则角色C的relationships_array可以引用角色A，"
+                "organization_memberships可以是[组织B]\n"
+                "- 名单之外的角色D不能被引用"
+            ),
+            "reference_rule": "不要引用任何完整角色名单中不存在的角色或组织名称"
+        }
+    }
+
+    # 角色名单生成提示词（并行生成模式第一步，只规划名称和定位）
+    CHARACTER_ROSTER_GENERATION = """你是一位专业的角色设定师。请根据以下世界观和要求，先规划一份包含{count}个实体的角色名单：
+
+世界观信息：
+- 时间背景：{time_period}
+- 地理位置：{location}
+- 氛围基调：{atmosphere}
+- 世界规则：{rules}
+
+主题：{theme}
+类型：{genre}
+特殊要求：{requirements}
+
+实体类型分配：
+- 1个主角（protagonist）
+- 多个配角（supporting）
+- 可以包含反派（antagonist）
+- 可以包含1-2个重要组织
+
+要求：
+- 只规划名称、类型和一句话定位，详细设定将在后续步骤中生成
+- 名称不能重复
+- 角色之间要能形成合理的关系网络
+
+**重要格式要求：**
+1. 只返回纯JSON数组格式，不要包含任何markdown标记、代码块标记或其他说明文字
+2. 不要在JSON字符串值中使用中文引号（""''），请使用【】或《》标记
+
+请严格按照以下JSON数组格式返回：
+[
+  {{
+    "name": "角色或组织名称",
+    "role_type": "protagonist/supporting/antagonist",
+    "is_organization": false,
+    "brief": "一句话定位（30字以内），说明身份和在故事中的作用"
+  }}
+]
+
+再次强调：
+1. 只返回纯JSON数组，不要有```json```这样的标记
+2. 数组中必须精确包含{count}个对象
+3. 文本中不要使用中文引号（""），改用【】或《》"""
 
     # 向导大纲生成提示词
     COMPLETE_OUTLINE_GENERATION = """你是一位经验丰富的小说作家和编剧。请根据以下信息生成完整的{chapter_count}章小说大纲：
@@ -315,15 +380,14 @@ class PromptService:
 2. 数组中要包含{chapter_count}个章节对象
 3. 文本中不要使用中文引号（""），改用【】或《》"""
     
-    # 大纲续写提示词
-    OUTLINE_CONTINUE_GENERATION = """你是一位经验丰富的小说作家和编剧。请基于以下信息续写小说大纲：
+    # 大纲续写的项目资料（可缓存前缀：同一次续写的各批次逐字节相同）
+    OUTLINE_CONTINUE_PROJECT_CONTEXT = """你是一位经验丰富的小说作家和编剧。请基于以下信息续写小说大纲：
 
 【项目信息】
 - 书名：{title}
 - 主题：{theme}
 - 类型：{genre}
 - 叙事视角：{narrative_perspective}
-- 续写章节数：{chapter_count}章
 
 【世界观】
 - 时间背景：{time_period}
@@ -334,6 +398,11 @@ class PromptService:
 【角色信息】
 {characters_info}
 
+"""
+
+    # 大纲续写提示词（接在项目资料之后）
+    OUTLINE_CONTINUE_GENERATION = """【续写章节数】{chapter_count}章
+
 【已有章节概览】（共{current_chapter_count}章）
 {all_chapters_brief}
 
@@ -389,6 +458,55 @@ class PromptService:
 4. 确保字段结构与已有章节完全一致
 5. 文本中不要使用中文引号（""），改用【】或《》"""
     
+    # 大纲续写分段剧情规划提示词（弧段并行续写模式）
+    OUTLINE_ARC_PLAN = """你是一位经验丰富的小说作家和编剧。请为以下小说接下来的第{start_chapter}章到第{end_chapter}章制定分段剧情规划：
+
+【基本信息】
+- 书名：{title}
+- 主题：{theme}
+- 类型：{genre}
+- 叙事视角：{narrative_perspective}
+
+【角色信息】
+{characters_info}
+
+【已有章节概览】（共{current_chapter_count}章）
+{all_chapters_brief}
+
+【最近剧情】
+{recent_plot}
+
+【续写指导】
+- 当前情节阶段：{plot_stage_instruction}
+- 故事发展方向：{story_direction}
+- 其他要求：{requirements}
+
+请按以下章节段落分别规划剧情走向：
+{segments}
+
+要求：
+- 每段规划100-200字，说明该段的主要事件、冲突推进和结尾状态
+- 各段之间前后衔接、层层推进，后一段从前一段的结尾状态开始
+- 与已有剧情自然衔接
+
+**重要格式要求：**
+1. 只返回纯JSON数组格式，不要包含任何markdown标记、代码块标记或其他说明文字
+2. 不要在JSON字符串值中使用中文引号（""''），请使用【】或《》
+
+请严格按照以下JSON数组格式返回（每个段落一个对象，顺序与上面的段落一致）：
+[
+  {{
+    "start_chapter": {start_chapter},
+    "end_chapter": 段落结束章节编号,
+    "arc": "该段剧情走向的描述"
+  }}
+]
+
+再次强调：
+1. 只返回纯JSON数组，不要有```json```这样的标记
+2. 数组中的段落数量和章节范围必须与要求完全一致
+3. 文本中不要使用中文引号（""），改用【】或《》"""
+    
     # AI去味提示词（核心特色功能）
     AI_DENOISING = """你是一位追求自然写作风格的编辑。你的任务是将AI生成的文本改写得更像人类作家的手笔。
 
@@ -428,8 +546,56 @@ class PromptService:
 
 请直接输出修改后的文本，无需解释。"""
 
-    # 章节完整创作提示词
-    CHAPTER_GENERATION = """你是一位专业的小说作家。请根据以下信息创作本章内容：
+    # AI去味提示词（长文分片版，每个片段附带前后文）
+    AI_DENOISING_SHARD = """你是一位追求自然写作风格的编辑。你的任务是将AI生成的文本改写得更像人类作家的手笔。
+
+下面是一篇长文中的一个片段。前文和后文只用于帮助你保持衔接，不要改写，也不要输出。
+
+【前文】（仅供参考）
+{context_before}
+
+【需要改写的片段】
+{original_text}
+
+【后文】（仅供参考）
+{context_after}
+
+修改要求：
+1. 去除AI痕迹：
+   - 删除过于工整的排比句
+   - 减少重复的修辞手法
+   - 去掉刻意的对称结构
+   - 避免机械式的总结陈词
+
+2. 增加人性化：
+   - 使用更口语化的表达
+   - 添加不完美的细节
+   - 保留适度的随意性
+   - 增加真实的情感波动
+
+3. 优化叙事：
+   - 让节奏更自然不做作
+   - 用简单词汇替换华丽辞藻
+   - 保持叙述的松弛感
+   - 让对话更生活化
+
+4. 保持原意：
+   - 不改变核心情节
+   - 保留关键信息点
+   - 维持角色性格
+   - 确保逻辑连贯
+   - 与前文、后文自然衔接
+
+修改风格：
+- 像是一个喜欢讲故事的普通人写的
+- 有点粗糙但很真诚
+- 自然流畅不刻意
+- 让人读起来很舒服
+
+请只输出改写后的片段正文，不要包含前文和后文，无需解释。"""
+
+    # 章节创作的项目资料（可缓存前缀：同一项目各章节逐字节相同，只放不随章节变化的内容）
+    CHAPTER_PROJECT_CONTEXT = """你是一位专业的小说作家。请根据以下信息创作本章内容：
 
 项目信息：
 - 书名：{title}
@@ -449,7 +615,10 @@ class PromptService:
 全书大纲：
 {outlines_context}
 
-本章信息：
+"""
+
+    # 章节完整创作提示词（接在项目资料之后）
+    CHAPTER_GENERATION = """本章信息：
 - 章节序号：第{chapter_number}章
 - 章节标题：{chapter_title}
 - 章节大纲：{chapter_outline}
@@ -465,28 +634,19 @@ class PromptService:
 
 请直接输出章节正文内容，不要包含章节标题和其他说明文字。"""
 
-    # 章节完整创作提示词（带前置章节上下文）
-    CHAPTER_GENERATION_WITH_CONTEXT = """你是一位专业的小说作家。请根据以下信息创作本章内容：
+    # 续写中断的章节（追加在章节创作提示词之后）
+    CHAPTER_RESUME = """
 
-项目信息：
-- 书名：{title}
-- 主题：{theme}
-- 类型：{genre}
-- 叙事视角：{narrative_perspective}
+【本章已写部分】
+{draft_content}
 
-世界观：
-- 时间背景：{time_period}
-- 地理位置：{location}
-- 氛围基调：{atmosphere}
-- 世界规则：{rules}
+本章正文已经写到上面这里，生成过程被中断。请紧接已写部分的最后一句继续往下写，完成本章剩余内容：
+- 不要重复或改写已写部分，不要重新开头
+- 已写部分计入本章字数
+- 直接输出续写的正文，不要包含任何说明文字"""
 
-角色信息：
-{characters_info}
-
-全书大纲：
-{outlines_context}
-
-【已完成的前置章节内容】
+    # 章节完整创作提示词（带前置章节上下文，接在项目资料之后）
+    CHAPTER_GENERATION_WITH_CONTEXT = """【已完成的前置章节内容】
 {previous_content}
 
 本章信息：
@@ -523,6 +683,38 @@ class PromptService:
 
 请直接输出章节正文内容，不要包含章节标题和其他说明文字。"""
 
+    # 章节剧情摘要提示词
+    CHAPTER_SUMMARY = """请为下面这一章小说正文写一段剧情摘要，供创作后续章节时回顾前情。
+
+章节：第{chapter_number}章《{chapter_title}》
+
+正文：
+{content}
+
+摘要要求：
+1. 按时间顺序概括本章发生的关键事件和结果
+2. 写明出场的主要角色，以及他们的状态、关系、目标发生的变化
+3. 保留后续剧情可能用到的伏笔、道具、地点和未解决的冲突
+4. 不写评价和修辞，只陈述事实
+5. 控制在{max_chars}字以内
+
+请直接输出摘要正文，不要包含标题和其他说明文字。"""
+
+    # 剧情弧/卷摘要提示词（由下级摘要汇总）
+    STORY_SUMMARY_ROLLUP = """请把下面第{start_chapter}-{end_chapter}章的分段剧情摘要汇总为一段{level_name}摘要，供创作后续章节时回顾前情。
+
+分段摘要：
+{children}
+
+汇总要求：
+1. 按时间顺序概括这一段剧情的主线进展和关键转折
+2. 写明主要角色在这一段结束时的状态、关系和目标
+3. 保留仍未解决的冲突和伏笔，已经了结的支线一笔带过
+4. 不写评价和修辞，只陈述事实
+5. 控制在{max_chars}字以内
+
+请直接输出摘要正文，不要包含标题和其他说明文字。"""
+
     # 大纲生成提示词
     OUTLINE_GENERATION = """你是一位经验丰富的小说作家和编剧。请根据以下信息生成小说大纲：
 
@@ -689,6 +881,17 @@ class PromptService:
             original_text=original_text
         )
     
+    @classmethod
+    def get_denoising_shard_prompt(cls, original_text: str, context_before: str = "",
+                                   context_after: str = "") -> str:
+        """获取长文分片AI去味提示词"""
+        return cls.format_prompt(
+            cls.AI_DENOISING_SHARD,
+            original_text=original_text,
+            context_before=context_before or "（无，这是开头）",
+            context_after=context_after or "（无，这是结尾）"
+        )
+    
     @classmethod
     def get_world_building_prompt(cls, title: str, theme: str, genre: str = "") -> str:
         """获取世界构建提示词"""
@@ -702,8 +905,14 @@ class PromptService:
     @classmethod
     def get_characters_batch_prompt(cls, count: int, time_period: str, location: str,
                                    atmosphere: str, rules: str, theme: str,
-                                   genre: str = "", requirements: str = "") -> str:
-        """获取批量角色生成提示词"""
+                                   genre: str = "", requirements: str = "",
+                                   reference_scope: str = "batch") -> str:
+        """
+        获取批量角色生成提示词
+        
+        Args:
+            reference_scope: 关系和组织可以引用的范围，batch（本批次）或 roster（完整角色名单）
+        """
         return cls.format_prompt(
             cls.CHARACTERS_BATCH_GENERATION,
             count=count,
@@ -713,6 +922,24 @@ class PromptService:
             rules=rules,
             theme=theme,
             genre=genre or "通用类型",
+            requirements=requirements or "无特殊要求",
+            **cls.CHARACTERS_BATCH_REFERENCE_SCOPES[reference_scope]
+        )
+    
+    @classmethod
+    def get_character_roster_prompt(cls, count: int, time_period: str, location: str,
+                                    atmosphere: str, rules: str, theme: str,
+                                    genre: str = "", requirements: str = "") -> str:
+        """获取角色名单生成提示词"""
+        return cls.format_prompt(
+            cls.CHARACTER_ROSTER_GENERATION,
+            count=count,
+            time_period=time_period,
+            location=location,
+            atmosphere=atmosphere,
+            rules=rules,
+            theme=theme,
+            genre=genre or "通用类型",
             requirements=requirements or "无特殊要求"
         )
     
@@ -739,6 +966,69 @@ class PromptService:
             requirements=requirements or "无特殊要求"
         )
     
+    @classmethod
+    def get_chapter_prompt_parts(cls, title: str, theme: str, genre: str,
+                                 narrative_perspective: str, time_period: str,
+                                 location: str, atmosphere: str, rules: str,
+                                 characters_info: str, outlines_context: str,
+                                 chapter_number: int, chapter_title: str,
+                                 chapter_outline: str, previous_content: str = "",
+                                 style_content: str = "", draft_content: str = "") -> Tuple[str, str]:
+        """
+        获取章节创作提示词，拆分为可缓存前缀和本章内容两部分
+        
+        前缀只包含项目信息、世界观、角色和全书大纲，同一项目各章节逐字节相同，
+        可以命中上游的提示词前缀缓存；前置章节、本章信息和写作风格放在后半部分。
+        
+        Args:
+            previous_content: 前置章节内容，为空时使用不带上下文的模板
+            style_content: 写作风格要求内容，如果提供则会追加到提示词中
+            draft_content: 本章已生成的草稿，续写中断的章节时追加在最后
+            
+        Returns:
+            (可缓存前缀, 本章内容)
+        """
+        prefix = cls.format_prompt(
+            cls.CHAPTER_PROJECT_CONTEXT,
+            title=title,
+            theme=theme,
+            genre=genre,
+            narrative_perspective=narrative_perspective,
+            time_period=time_period,
+            location=location,
+            atmosphere=atmosphere,
+            rules=rules,
+            characters_info=characters_info,
+            outlines_context=outlines_context
+        )
+        
+        if previous_content:
+            body = cls.format_prompt(
+                cls.CHAPTER_GENERATION_WITH_CONTEXT,
+                narrative_perspective=narrative_perspective,
+                previous_content=previous_content,
+                chapter_number=chapter_number,
+                chapter_title=chapter_title,
+                chapter_outline=chapter_outline
+            )
+        else:
+            body = cls.format_prompt(
+                cls.CHAPTER_GENERATION,
+                narrative_perspective=narrative_perspective,
+                chapter_number=chapter_number,
+                chapter_title=chapter_title,
+                chapter_outline=chapter_outline
+            )
+        
+        # 如果有风格要求，应用到提示词中
+        if style_content:
+            body = WritingStyleManager.apply_style_to_prompt(body, style_content)
+        
+        if draft_content:
+            body += cls.format_prompt(cls.CHAPTER_RESUME, draft_content=draft_content)
+        
+        return prefix, body
+    
     @classmethod
     def get_chapter_generation_prompt(cls, title: str, theme: str, genre: str,
                                      narrative_perspective: str, time_period: str,
@@ -752,8 +1042,7 @@ class PromptService:
         Args:
             style_content: 写作风格要求内容，如果提供则会追加到提示词中
         """
-        base_prompt = cls.format_prompt(
-            cls.CHAPTER_GENERATION,
+        return "".join(cls.get_chapter_prompt_parts(
             title=title,
             theme=theme,
             genre=genre,
@@ -766,14 +1055,9 @@ class PromptService:
             outlines_context=outlines_context,
             chapter_number=chapter_number,
             chapter_title=chapter_title,
-            chapter_outline=chapter_outline
-        )
-        
-        # 如果有风格要求，应用到提示词中
-        if style_content:
-            return WritingStyleManager.apply_style_to_prompt(base_prompt, style_content)
-        
-        return base_prompt
+            chapter_outline=chapter_outline,
+            style_content=style_content
+        ))
     
     @classmethod
     def get_chapter_generation_with_context_prompt(cls, title: str, theme: str, genre: str,
@@ -789,8 +1073,7 @@ class PromptService:
         Args:
             style_content: 写作风格要求内容，如果提供则会追加到提示词中
         """
-        base_prompt = cls.format_prompt(
-            cls.CHAPTER_GENERATION_WITH_CONTEXT,
+        return "".join(cls.get_chapter_prompt_parts(
             title=title,
             theme=theme,
             genre=genre,
@@ -804,14 +1087,35 @@ class PromptService:
             previous_content=previous_content,
             chapter_number=chapter_number,
             chapter_title=chapter_title,
-            chapter_outline=chapter_outline
+            chapter_outline=chapter_outline,
+            style_content=style_content
+        ))
+    
+    @classmethod
+    def get_chapter_summary_prompt(cls, chapter_number: int, chapter_title: str,
+                                   content: str, max_chars: int = 300) -> str:
+        """获取章节剧情摘要提示词"""
+        return cls.format_prompt(
+            cls.CHAPTER_SUMMARY,
+            chapter_number=chapter_number,
+            chapter_title=chapter_title,
+            content=content,
+            max_chars=max_chars
+        )
+    
+    @classmethod
+    def get_story_summary_rollup_prompt(cls, level_name: str, start_chapter: int,
+                                        end_chapter: int, children: str,
+                                        max_chars: int = 500) -> str:
+        """获取剧情弧/卷摘要汇总提示词"""
+        return cls.format_prompt(
+            cls.STORY_SUMMARY_ROLLUP,
+            level_name=level_name,
+            start_chapter=start_chapter,
+            end_chapter=end_chapter,
+            children=children,
+            max_chars=max_chars
         )
-        
-        # 如果有风格要求，应用到提示词中
-        if style_content:
-            return WritingStyleManager.apply_style_to_prompt(base_prompt, style_content)
-        
-        return base_prompt
     
     @classmethod
     def get_outline_prompt(cls, genre: str, theme: str, target_words: int,
@@ -825,6 +1129,48 @@ class PromptService:
             requirements=requirements or "无特殊要求"
         )
     
+    @classmethod
+    def get_outline_continue_prompt_parts(cls, title: str, theme: str, genre: str,
+                                          narrative_perspective: str, chapter_count: int,
+                                          time_period: str, location: str, atmosphere: str,
+                                          rules: str, characters_info: str,
+                                          current_chapter_count: int, all_chapters_brief: str,
+                                          recent_plot: str, plot_stage_instruction: str,
+                                          start_chapter: int, story_direction: str,
+                                          requirements: str = "") -> Tuple[str, str]:
+        """
+        获取大纲续写提示词，拆分为可缓存前缀（项目信息、世界观、角色）和本批续写内容
+        
+        Returns:
+            (可缓存前缀, 本批续写内容)
+        """
+        prefix = cls.format_prompt(
+            cls.OUTLINE_CONTINUE_PROJECT_CONTEXT,
+            title=title,
+            theme=theme,
+            genre=genre,
+            narrative_perspective=narrative_perspective,
+            time_period=time_period,
+            location=location,
+            atmosphere=atmosphere,
+            rules=rules,
+            characters_info=characters_info
+        )
+        end_chapter = start_chapter + chapter_count - 1
+        body = cls.format_prompt(
+            cls.OUTLINE_CONTINUE_GENERATION,
+            chapter_count=chapter_count,
+            current_chapter_count=current_chapter_count,
+            all_chapters_brief=all_chapters_brief,
+            recent_plot=recent_plot,
+            plot_stage_instruction=plot_stage_instruction,
+            start_chapter=start_chapter,
+            end_chapter=end_chapter,
+            story_direction=story_direction,
+            requirements=requirements or "无特殊要求"
+        )
+        return prefix, body
+    
     @classmethod
     def get_outline_continue_prompt(cls, title: str, theme: str, genre: str,
                                     narrative_perspective: str, chapter_count: int,
@@ -835,9 +1181,7 @@ class PromptService:
                                     start_chapter: int, story_direction: str,
                                     requirements: str = "") -> str:
         """获取大纲续写提示词"""
-        end_chapter = start_chapter + chapter_count - 1
-        return cls.format_prompt(
-            cls.OUTLINE_CONTINUE_GENERATION,
+        return "".join(cls.get_outline_continue_prompt_parts(
             title=title,
             theme=theme,
             genre=genre,
@@ -853,7 +1197,32 @@ class PromptService:
             recent_plot=recent_plot,
             plot_stage_instruction=plot_stage_instruction,
             start_chapter=start_chapter,
-            end_chapter=end_chapter,
+            story_direction=story_direction,
+            requirements=requirements
+        ))
+    
+    @classmethod
+    def get_outline_arc_plan_prompt(cls, title: str, theme: str, genre: str,
+                                    narrative_perspective: str, characters_info: str,
+                                    current_chapter_count: int, all_chapters_brief: str,
+                                    recent_plot: str, plot_stage_instruction: str,
+                                    segments: List[Tuple[int, int]], story_direction: str,
+                                    requirements: str = "") -> str:
+        """获取大纲续写分段剧情规划提示词"""
+        return cls.format_prompt(
+            cls.OUTLINE_ARC_PLAN,
+            title=title,
+            theme=theme,
+            genre=genre,
+            narrative_perspective=narrative_perspective,
+            characters_info=characters_info,
+            current_chapter_count=current_chapter_count,
+            all_chapters_brief=all_chapters_brief,
+            recent_plot=recent_plot,
+            plot_stage_instruction=plot_stage_instruction,
+            start_chapter=segments[0][0],
+            end_chapter=segments[-1][1],
+            segments="\n".join(f"- 第{start}-{end}章" for start, end in segments),
             story_direction=story_direction,
             requirements=requirements or "无特殊要求"
         )
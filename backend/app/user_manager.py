@@ -3,9 +3,11 @@
 """
 import json
 import os
+import time
 import asyncio
+import tempfile
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Any
 from pydantic import BaseModel
 from app.config import settings, DATA_DIR
 
@@ -24,11 +26,19 @@ class User(BaseModel):
 
 
 class UserManager:
-    """用户管理器 - 线程安全版本"""
+    """用户管理器 - 线程安全版本
+    
+    用户和管理员数据常驻内存索引，查询为O(1)且不访问磁盘。
+    写操作先原子写入文件（临时文件+rename，在线程池中执行）再更新索引；
+    文件被外部修改时，通过定期检查mtime重新加载。
+    """
     
     USERS_FILE = str(DATA_DIR / "users.json")
     ADMINS_FILE = str(DATA_DIR / "admins.json")
     
+    # 检查文件mtime的最小间隔（秒）
+    MTIME_CHECK_INTERVAL = 2.0
+    
     def __init__(self):
         """初始化用户管理器"""
         # DATA_DIR 已在 config.py 中创建，无需重复创建
@@ -36,16 +46,95 @@ class UserManager:
         self._users_lock = asyncio.Lock()
         self._admins_lock = asyncio.Lock()
         self._ensure_files_exist()
+        
+        # 内存索引
+        self._users: Dict[str, dict] = {}
+        self._admin_list: List[str] = []
+        self._admin_set: Set[str] = set()
+        self._user_objects: Dict[str, User] = {}
+        self._users_mtime: Optional[int] = None
+        self._admins_mtime: Optional[int] = None
+        self._last_mtime_check = 0.0
+        
+        self._reload_users_index()
+        self._reload_admins_index()
     
     def _ensure_files_exist(self):
         """确保必要的文件存在"""
         if not os.path.exists(self.USERS_FILE):
-            with open(self.USERS_FILE, "w", encoding="utf-8") as f:
-                json.dump({}, f, ensure_ascii=False, indent=2)
+            self._write_json_atomic(self.USERS_FILE, {})
         
         if not os.path.exists(self.ADMINS_FILE):
-            with open(self.ADMINS_FILE, "w", encoding="utf-8") as f:
-                json.dump({"admins": []}, f, ensure_ascii=False, indent=2)
+            self._write_json_atomic(self.ADMINS_FILE, {"admins": []})
+    
+    @staticmethod
+    def _get_mtime(path: str) -> Optional[int]:
+        """获取文件修改时间（纳秒），文件不存在时返回None"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _write_json_atomic(path: str, data: Any):
+        """原子写入JSON文件（写临时文件后rename，避免读到半写入的文件）"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    
+    def _reload_users_index(self):
+        """从文件重建用户索引"""
+        self._users_mtime = self._get_mtime(self.USERS_FILE)
+        self._users = self._load_users_unsafe()
+        self._user_objects.clear()
+    
+    def _reload_admins_index(self):
+        """从文件重建管理员索引"""
+        self._admins_mtime = self._get_mtime(self.ADMINS_FILE)
+        self._admin_list = self._load_admin_list_unsafe()
+        self._admin_set = set(self._admin_list)
+        self._user_objects.clear()
+    
+    def _refresh_if_stale(self, force: bool = False):
+        """
+        检查文件mtime，文件被外部修改时重新加载索引
+        
+        Args:
+            force: 是否忽略检查间隔（读-改-写操作前使用）
+        """
+        now = time.monotonic()
+        if not force and now - self._last_mtime_check < self.MTIME_CHECK_INTERVAL:
+            return
+        self._last_mtime_check = now
+        
+        if self._get_mtime(self.USERS_FILE) != self._users_mtime:
+            self._reload_users_index()
+        if self._get_mtime(self.ADMINS_FILE) != self._admins_mtime:
+            self._reload_admins_index()
+    
+    def _build_user(self, user_id: str) -> Optional[User]:
+        """从索引获取用户对象（缓存已构建的对象，同步管理员状态）"""
+        user = self._user_objects.get(user_id)
+        if user is not None:
+            return user
+        
+        user_data = self._users.get(user_id)
+        if not user_data:
+            return None
+        
+        user = User(**{**user_data, "is_admin": user_id in self._admin_set})
+        self._user_objects[user_id] = user
+        return user
     
     def _load_users_unsafe(self) -> Dict[str, dict]:
         """加载用户数据（不加锁，内部使用）"""
@@ -56,24 +145,16 @@ class UserManager:
             print(f"加载用户数据失败: {e}")
             return {}
     
-    def _save_users_unsafe(self, users: Dict[str, dict]):
-        """保存用户数据（不加锁，内部使用）"""
+    async def _save_users_unsafe(self, users: Dict[str, dict]):
+        """保存用户数据并更新索引（不加锁，内部使用）"""
         try:
-            with open(self.USERS_FILE, "w", encoding="utf-8") as f:
-                json.dump(users, f, ensure_ascii=False, indent=2)
+            await asyncio.to_thread(self._write_json_atomic, self.USERS_FILE, users)
+            self._users = users
+            self._users_mtime = self._get_mtime(self.USERS_FILE)
+            self._user_objects.clear()
         except Exception as e:
             print(f"保存用户数据失败: {e}")
     
-    async def _load_users(self) -> Dict[str, dict]:
-        """加载用户数据（加锁）"""
-        async with self._users_lock:
-            return self._load_users_unsafe()
-    
-    async def _save_users(self, users: Dict[str, dict]):
-        """保存用户数据（加锁）"""
-        async with self._users_lock:
-            self._save_users_unsafe(users)
-    
     def _load_admin_list_unsafe(self) -> List[str]:
         """加载管理员列表（不加锁，内部使用）"""
         try:
@@ -84,23 +165,25 @@ class UserManager:
             print(f"加载管理员列表失败: {e}")
             return []
     
-    def _save_admin_list_unsafe(self, admin_list: List[str]):
-        """保存管理员列表（不加锁，内部使用）"""
+    async def _save_admin_list_unsafe(self, admin_list: List[str]):
+        """保存管理员列表并更新索引（不加锁，内部使用）"""
         try:
-            with open(self.ADMINS_FILE, "w", encoding="utf-8") as f:
-                json.dump({"admins": admin_list}, f, ensure_ascii=False, indent=2)
+            await asyncio.to_thread(self._write_json_atomic, self.ADMINS_FILE, {"admins": admin_list})
+            self._admin_list = admin_list
+            self._admin_set = set(admin_list)
+            self._admins_mtime = self._get_mtime(self.ADMINS_FILE)
+            self._user_objects.clear()
         except Exception as e:
             print(f"保存管理员列表失败: {e}")
     
-    async def _load_admin_list(self) -> List[str]:
-        """加载管理员列表（加锁）"""
-        async with self._admins_lock:
-            return self._load_admin_list_unsafe()
+    def _snapshot_users(self) -> Dict[str, dict]:
+        """复制用户索引（不加锁，供读-改-写操作修改）"""
+        self._refresh_if_stale(force=True)
+        return {user_id: dict(user_data) for user_id, user_data in self._users.items()}
     
-    async def _save_admin_list(self, admin_list: List[str]):
-        """保存管理员列表（加锁）"""
-        async with self._admins_lock:
-            self._save_admin_list_unsafe(admin_list)
+    def _snapshot_admin_list(self) -> List[str]:
+        """复制管理员列表（不加锁，供读-改-写操作修改）"""
+        return list(self._admin_list)
     
     async def create_or_update_from_linuxdo(
         self,
@@ -132,8 +215,8 @@ class UserManager:
         # 使用锁保护整个读-改-写操作
         async with self._users_lock:
             async with self._admins_lock:
-                users = self._load_users_unsafe()
-                admin_list = self._load_admin_list_unsafe()
+                users = self._snapshot_users()
+                admin_list = self._snapshot_admin_list()
                 
                 now = datetime.now().isoformat()
                 
@@ -156,7 +239,7 @@ class UserManager:
                     # 如果是初始管理员或本地用户且还不在管理员列表中，添加进去
                     if (is_initial_admin or is_local_user) and user_id not in admin_list:
                         admin_list.append(user_id)
-                        self._save_admin_list_unsafe(admin_list)
+                        await self._save_admin_list_unsafe(admin_list)
                         user_data["is_admin"] = True
                     else:
                         # 从管理员列表同步 is_admin 状态
@@ -166,7 +249,7 @@ class UserManager:
                     is_admin = is_initial_admin or is_local_user
                     if is_admin and user_id not in admin_list:
                         admin_list.append(user_id)
-                        self._save_admin_list_unsafe(admin_list)
+                        await self._save_admin_list_unsafe(admin_list)
                     
                     user_data = {
                         "user_id": user_id,
@@ -181,32 +264,18 @@ class UserManager:
                     }
                     users[user_id] = user_data
                 
-                self._save_users_unsafe(users)
+                await self._save_users_unsafe(users)
                 return User(**user_data)
     
     async def get_user(self, user_id: str) -> Optional[User]:
-        """获取用户（线程安全）"""
-        users = await self._load_users()
-        user_data = users.get(user_id)
-        if user_data:
-            # 同步管理员状态
-            admin_list = await self._load_admin_list()
-            user_data["is_admin"] = user_id in admin_list
-            return User(**user_data)
-        return None
+        """获取用户（内存索引，O(1)，无磁盘读取）"""
+        self._refresh_if_stale()
+        return self._build_user(user_id)
     
     async def get_all_users(self) -> List[User]:
-        """获取所有用户（线程安全）"""
-        users = await self._load_users()
-        admin_list = await self._load_admin_list()
-        
-        user_list = []
-        for user_data in users.values():
-            # 同步管理员状态
-            user_data["is_admin"] = user_data["user_id"] in admin_list
-            user_list.append(User(**user_data))
-        
-        return user_list
+        """获取所有用户（内存索引）"""
+        self._refresh_if_stale()
+        return [self._build_user(user_id) for user_id in self._users]
     
     async def set_admin(self, user_id: str, is_admin: bool) -> bool:
         """
@@ -222,17 +291,17 @@ class UserManager:
         # 使用锁保护整个读-改-写操作
         async with self._users_lock:
             async with self._admins_lock:
-                users = self._load_users_unsafe()
+                users = self._snapshot_users()
                 if user_id not in users:
                     return False
                 
-                admin_list = self._load_admin_list_unsafe()
+                admin_list = self._snapshot_admin_list()
                 
                 if is_admin:
                     # 授予管理员权限
                     if user_id not in admin_list:
                         admin_list.append(user_id)
-                        self._save_admin_list_unsafe(admin_list)
+                        await self._save_admin_list_unsafe(admin_list)
                 else:
                     # 撤销管理员权限
                     if user_id in admin_list:
@@ -240,11 +309,11 @@ class UserManager:
                         if len(admin_list) <= 1:
                             return False
                         admin_list.remove(user_id)
-                        self._save_admin_list_unsafe(admin_list)
+                        await self._save_admin_list_unsafe(admin_list)
                 
                 # 更新用户数据中的 is_admin 字段
                 users[user_id]["is_admin"] = is_admin
-                self._save_users_unsafe(users)
+                await self._save_users_unsafe(users)
                 
                 return True
     
@@ -261,18 +330,18 @@ class UserManager:
         # 使用锁保护整个读-改-写操作
         async with self._users_lock:
             async with self._admins_lock:
-                users = self._load_users_unsafe()
+                users = self._snapshot_users()
                 if user_id not in users:
                     return False
                 
                 # 不能删除管理员
-                admin_list = self._load_admin_list_unsafe()
+                admin_list = self._snapshot_admin_list()
                 if user_id in admin_list:
                     return False
                 
                 # 删除用户数据
                 del users[user_id]
-                self._save_users_unsafe(users)
+                await self._save_users_unsafe(users)
         
         # 删除用户数据库文件（在锁外执行，避免阻塞）
         db_file = str(DATA_DIR / f"ai_story_user_{user_id}.db")
@@ -285,9 +354,9 @@ class UserManager:
         return True
     
     async def is_admin(self, user_id: str) -> bool:
-        """检查用户是否为管理员（线程安全）"""
-        admin_list = await self._load_admin_list()
-        return user_id in admin_list
+        """检查用户是否为管理员（内存索引，O(1)）"""
+        self._refresh_if_stale()
+        return user_id in self._admin_set
 
 
 # 全局用户管理器实例
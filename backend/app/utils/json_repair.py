@@ -0,0 +1,263 @@
+"""AI输出JSON容错解析 - 本地修复常见格式问题，避免整次重新生成"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 各修复步骤名称（按执行顺序）
+REPAIR_STEPS = (
+    "extract_json",
+    "fix_quotes",
+    "remove_trailing_commas",
+    "drop_truncated_tail",
+    "close_brackets"
+)
+
+# JSON容错解析统计（累计值）
+_json_repair_stats = {
+    "calls": 0,
+    "clean": 0,
+    "repaired": 0,
+    "failed": 0,
+    "repairs": {step: 0 for step in REPAIR_STEPS}
+}
+
+
+def get_json_repair_stats() -> Dict[str, Any]:
+    """获取JSON容错解析统计"""
+    stats = dict(_json_repair_stats)
+    stats["repairs"] = dict(_json_repair_stats["repairs"])
+    return stats
+
+
+def _strip_code_fences(text: str) -> str:
+    """移除首尾的markdown代码块标记"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[3:]
+        if text[:4].lower() == "json":
+            text = text[4:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def _find_value_end(text: str, start: int) -> Optional[int]:
+    """从start处的左括号开始，找到与之匹配的右括号之后的位置；未闭合时返回None"""
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            depth += 1
+        elif ch in "]}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def _extract_json(text: str) -> str:
+    """去掉JSON前后的说明文字"""
+    starts = [pos for pos in (text.find("["), text.find("{")) if pos != -1]
+    if not starts:
+        return text
+    start = min(starts)
+    end = _find_value_end(text, start)
+    return text[start:end] if end is not None else text[start:]
+
+
+def _next_significant(text: str, pos: int) -> str:
+    """返回pos之后第一个非空白字符，没有时返回空串"""
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return text[pos] if pos < len(text) else ""
+
+
+def _fix_quotes(text: str) -> str:
+    """
+    修复引号问题
+    
+    - 用作字符串定界符的中文引号（“ ”）替换为英文双引号
+    - 字符串内部未转义的英文双引号（后面不是 , : } ] 的）转义为 \\"
+    """
+    out = []
+    in_string = False
+    escape = False
+    opened_by_cn = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == '"' or (opened_by_cn and ch == "”"):
+                if _next_significant(text, i + 1) in ("", ",", ":", "}", "]"):
+                    in_string = False
+                    out.append('"')
+                else:
+                    out.append('\\"' if ch == '"' else ch)
+            else:
+                out.append(ch)
+            continue
+        
+        if ch == '"' or ch in "“”":
+            in_string = True
+            opened_by_cn = ch != '"'
+            out.append('"')
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def _remove_trailing_commas(text: str) -> str:
+    """移除 } 或 ] 之前多余的逗号"""
+    out = []
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            out.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch == "," and _next_significant(text, i + 1) in ("}", "]"):
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def _repair_truncation(text: str) -> Tuple[str, Optional[str]]:
+    """
+    修复被截断（max_tokens用尽）的JSON
+    
+    顶层为数组且已有完整元素时，丢弃末尾不完整的元素；否则补全字符串和括号。
+    
+    Returns:
+        (修复后的文本, 使用的修复步骤名)，无需修复时步骤名为None
+    """
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    last_complete = None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append(ch)
+        elif ch in "]}":
+            if stack:
+                stack.pop()
+            if stack == ["["]:
+                last_complete = i + 1
+    
+    if not stack and not in_string:
+        return text, None
+    
+    if stack and stack[0] == "[" and last_complete is not None:
+        return text[:last_complete] + "]", "drop_truncated_tail"
+    
+    if in_string:
+        if escape:
+            text = text[:-1]
+        text += '"'
+    text = text.rstrip().rstrip(",").rstrip()
+    if text.endswith(":"):
+        text += " null"
+    text += "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+    return text, "close_brackets"
+
+
+def parse_json_tolerant(text: str, source: str = "AI响应") -> Any:
+    """
+    容错解析AI返回的JSON
+    
+    先按标准JSON解析；失败时依次执行确定性的本地修复（去除说明文字、修复引号、
+    去除多余逗号、处理截断），每步之后重新尝试解析，并记录各修复步骤的生效次数。
+    
+    Args:
+        text: AI返回的原始文本（可包含markdown代码块标记）
+        source: 来源描述（日志用）
+    
+    Returns:
+        解析后的JSON数据
+    
+    Raises:
+        json.JSONDecodeError: 所有修复步骤后仍无法解析
+    """
+    _json_repair_stats["calls"] += 1
+    cleaned = _strip_code_fences(text)
+    try:
+        data = json.loads(cleaned)
+        _json_repair_stats["clean"] += 1
+        return data
+    except json.JSONDecodeError as e:
+        original_error = e
+    
+    applied = []
+    candidate = cleaned
+    for step, repair in (
+        ("extract_json", _extract_json),
+        ("fix_quotes", _fix_quotes),
+        ("remove_trailing_commas", _remove_trailing_commas)
+    ):
+        repaired = repair(candidate)
+        if repaired == candidate:
+            continue
+        candidate = repaired
+        applied.append(step)
+        try:
+            data = json.loads(candidate)
+            return _record_repaired(data, applied, source)
+        except json.JSONDecodeError:
+            pass
+    
+    candidate, step = _repair_truncation(candidate)
+    if step:
+        applied.append(step)
+        try:
+            data = json.loads(_remove_trailing_commas(candidate))
+            return _record_repaired(data, applied, source)
+        except json.JSONDecodeError:
+            pass
+    
+    _json_repair_stats["failed"] += 1
+    logger.warning(f"⚠️ {source}JSON修复失败（已尝试: {', '.join(applied) or '无'}）: {original_error}")
+    raise original_error
+
+
+def _record_repaired(data: Any, applied: List[str], source: str) -> Any:
+    """记录一次成功的本地修复"""
+    _json_repair_stats["repaired"] += 1
+    for step in applied:
+        _json_repair_stats["repairs"][step] += 1
+    logger.info(f"🔧 {source}JSON已本地修复，避免重新生成: {', '.join(applied)}")
+    return data
@@ -0,0 +1,114 @@
+"""流式JSON数组解析器 - 边接收AI输出边解析数组元素"""
+import json
+from typing import Any, List, Optional
+from app.utils.json_repair import parse_json_tolerant
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class JSONArrayStreamParser:
+    """
+    增量JSON数组解析器
+    
+    逐块喂入AI流式输出，数组中每个对象的右括号一到达就解析并返回该对象，
+    无需等待整个响应结束。
+    
+    - 忽略JSON前后的说明文字和markdown代码块标记
+    - 顶层为单个对象时，将其视为只有一个元素的数组
+    - 单个元素先尝试本地修复，仍解析失败时只丢弃该元素，不影响后续元素
+    - 被截断的末尾元素通过 truncated 标记，由调用方决定是否补生成
+    """
+    
+    def __init__(self):
+        self._started = False
+        self._closed = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # 当前元素开始时的嵌套深度，None表示不在元素内
+        self._item_depth: Optional[int] = None
+        self._item_parts: List[str] = []
+        self.items_parsed = 0
+        self.errors = 0
+    
+    @property
+    def truncated(self) -> bool:
+        """流结束时是否有未闭合的元素"""
+        return self._item_depth is not None
+    
+    @property
+    def closed(self) -> bool:
+        """顶层数组（或对象）是否已闭合"""
+        return self._closed
+    
+    def feed(self, text: str) -> List[Any]:
+        """
+        喂入一段文本
+        
+        Returns:
+            本次新完成的元素列表
+        """
+        completed = []
+        item_start = 0 if self._item_depth is not None else None
+        
+        for i, ch in enumerate(text):
+            if self._closed:
+                break
+            
+            if not self._started:
+                if ch == '[':
+                    self._started = True
+                    self._depth = 1
+                elif ch == '{':
+                    self._started = True
+                    self._item_depth = 0
+                    self._depth = 1
+                    item_start = i
+                continue
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            
+            if ch == '"':
+                self._in_string = True
+            elif ch == '{' or ch == '[':
+                if self._item_depth is None and self._depth == 1:
+                    self._item_depth = 1
+                    item_start = i
+                self._depth += 1
+            elif ch == '}' or ch == ']':
+                self._depth -= 1
+                if self._item_depth is not None and self._depth == self._item_depth:
+                    self._item_parts.append(text[item_start:i + 1])
+                    item = self._parse_item()
+                    if item is not None:
+                        completed.append(item)
+                    item_start = None
+                if self._depth <= 0:
+                    self._closed = True
+        
+        if self._item_depth is not None and item_start is not None:
+            self._item_parts.append(text[item_start:])
+        
+        return completed
+    
+    def _parse_item(self) -> Optional[Any]:
+        """解析已闭合的元素，失败时计数并丢弃"""
+        raw = "".join(self._item_parts)
+        self._item_parts = []
+        self._item_depth = None
+        try:
+            item = parse_json_tolerant(raw, source="流式元素")
+        except json.JSONDecodeError as e:
+            self.errors += 1
+            logger.warning(f"⚠️ 流式JSON元素解析失败，已跳过: {e}")
+            return None
+        self.items_parsed += 1
+        return item
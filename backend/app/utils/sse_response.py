@@ -1,12 +1,32 @@
 """Server-Sent Events (SSE) 响应工具类"""
 import json
+import time
 import asyncio
-from typing import AsyncGenerator, Dict, Any, Optional
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, Any, List, Optional, Tuple
 from fastapi.responses import StreamingResponse
+from app.config import settings
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
+# SSE流量统计（所有流的累计值）
+_sse_stats = {
+    "streams": 0,
+    "active": 0,
+    "disconnects": 0,
+    "frames": 0,
+    "bytes": 0,
+    "broadcast_subscribers": 0,
+    "broadcast_coalesced": 0,
+    "broadcast_dropped": 0
+}
+
+
+def get_sse_stats() -> Dict[str, Any]:
+    """获取SSE流量统计"""
+    return dict(_sse_stats)
+
 
 class SSEResponse:
     """SSE响应构建器"""
@@ -63,6 +83,23 @@ class SSEResponse:
             "content": content
         })
     
+    @staticmethod
+    async def send_item(item_type: str, data: Dict[str, Any], index: int) -> str:
+        """
+        发送单个条目(流式解析出一个角色/大纲后立即推送)
+        
+        Args:
+            item_type: 条目类型(character/outline)
+            data: 条目数据
+            index: 条目序号(从0开始)
+        """
+        return SSEResponse.format_sse({
+            "type": "item",
+            "item_type": item_type,
+            "index": index,
+            "data": data
+        })
+    
     @staticmethod
     async def send_result(data: Dict[str, Any]) -> str:
         """
@@ -104,6 +141,267 @@ class SSEResponse:
         return ": heartbeat\n\n"
 
 
+# 可以在订阅者队列中合并的正文事件类型
+_MERGEABLE_TYPES = ("content", "chunk")
+
+
+def _merge_content_frames(first: str, second: str) -> Optional[str]:
+    """两个同类型的正文事件合并为一个；无法合并时返回None"""
+    if not (first.startswith("data: ") and second.startswith("data: ")):
+        return None
+    try:
+        a = json.loads(first[6:])
+        b = json.loads(second[6:])
+    except ValueError:
+        return None
+    if (not isinstance(a, dict) or not isinstance(b, dict)
+            or a.keys() != {"type", "content"} or b.keys() != {"type", "content"}
+            or a["type"] != b["type"] or a["type"] not in _MERGEABLE_TYPES):
+        return None
+    return SSEResponse.format_sse({"type": a["type"], "content": a["content"] + b["content"]})
+
+
+class BroadcastSubscription:
+    """广播的一个订阅者：有界的待发送队列"""
+    
+    def __init__(self, broadcaster: "SSEBroadcaster", max_size: int):
+        self._broadcaster = broadcaster
+        self._queue: Deque[Tuple[int, str]] = deque()
+        self._max_size = max(1, max_size)
+        self._wakeup = asyncio.Event()
+        self.dropped = False
+    
+    def _offer(self, event_id: int, frame: str) -> bool:
+        """
+        放入一个事件，不等待
+        
+        队列已满时把正文事件合并进队尾（合并后的事件带最新的ID，按 Last-Event-ID 续传仍然正确）；
+        无法合并时清空队列并标记为 dropped。
+        
+        Returns:
+            订阅者是否仍然有效
+        """
+        if len(self._queue) < self._max_size:
+            self._queue.append((event_id, frame))
+        else:
+            merged = _merge_content_frames(self._queue[-1][1], frame)
+            if merged is None:
+                self.dropped = True
+                self._queue.clear()
+                self._wakeup.set()
+                return False
+            self._queue[-1] = (event_id, merged)
+            _sse_stats["broadcast_coalesced"] += 1
+        self._wakeup.set()
+        return True
+    
+    async def next(self, timeout: Optional[float] = None) -> Optional[Tuple[int, str]]:
+        """
+        取下一个事件
+        
+        Args:
+            timeout: 最长等待秒数，超时返回None（用于发送心跳）
+        
+        Returns:
+            (事件ID, SSE消息)
+        
+        Raises:
+            StopAsyncIteration: 广播已结束且队列已取空，或订阅者已被移除
+        """
+        while not self._queue:
+            if self.dropped or self._broadcaster.closed:
+                raise StopAsyncIteration
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._queue.popleft()
+    
+    def close(self):
+        """取消订阅"""
+        self._broadcaster._remove(self)
+
+
+class SSEBroadcaster:
+    """
+    进程内的SSE事件广播：一个生成流分发给多个订阅者
+    
+    发布方只把事件放入各订阅者的有界队列，从不等待，慢订阅者不会拖慢生成器和上游连接。
+    订阅者队列满时先合并正文事件，遇到无法合并的事件则被移除（dropped），
+    由调用方决定如何补齐（如从任务的重放缓冲区追赶）。
+    """
+    
+    def __init__(self, max_queue_size: Optional[int] = None):
+        self._max_queue_size = settings.sse_subscriber_queue_size if max_queue_size is None else max_queue_size
+        self._subscribers: List[BroadcastSubscription] = []
+        self.closed = False
+    
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+    
+    def subscribe(self) -> BroadcastSubscription:
+        """登记一个订阅者，只接收登记之后发布的事件"""
+        subscription = BroadcastSubscription(self, self._max_queue_size)
+        self._subscribers.append(subscription)
+        _sse_stats["broadcast_subscribers"] += 1
+        return subscription
+    
+    def publish(self, event_id: int, frame: str):
+        """发布事件到所有订阅者"""
+        for subscription in list(self._subscribers):
+            if not subscription._offer(event_id, frame):
+                _sse_stats["broadcast_dropped"] += 1
+                self._remove(subscription)
+    
+    def close(self):
+        """结束广播，订阅者取完队列中的事件后结束"""
+        self.closed = True
+        for subscription in self._subscribers:
+            subscription._wakeup.set()
+    
+    def _remove(self, subscription: BroadcastSubscription):
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+            _sse_stats["broadcast_subscribers"] -= 1
+
+
+async def coalesce_text_stream(
+    source: AsyncIterator[str],
+    window_ms: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    heartbeat_interval: Optional[float] = None
+) -> AsyncGenerator[Optional[str], None]:
+    """
+    合并上游文本流：按时间窗口或字节预算把多个token合并为一个块
+    
+    上游由独立任务读取，下游在等待期间可以按时发送心跳，
+    因此首个token迟迟不到时连接也不会因空闲被代理断开。
+    
+    Args:
+        source: 上游文本流（如 AIService.generate_text_stream）
+        window_ms: 合并时间窗口（毫秒），0表示不合并，默认取配置 sse_coalesce_window_ms
+        max_bytes: 单块最大字节数，达到后立即发送，默认取配置 sse_coalesce_max_bytes
+        heartbeat_interval: 无输出多少秒后产生一次心跳，0表示不发送，默认取配置 sse_heartbeat_interval
+        
+    Yields:
+        合并后的文本块；需要发送心跳时产出 None
+    """
+    window = (settings.sse_coalesce_window_ms if window_ms is None else window_ms) / 1000
+    max_bytes = settings.sse_coalesce_max_bytes if max_bytes is None else max_bytes
+    heartbeat_interval = settings.sse_heartbeat_interval if heartbeat_interval is None else heartbeat_interval
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    
+    async def pump():
+        try:
+            async for chunk in source:
+                if chunk:
+                    queue.put_nowait(chunk)
+            queue.put_nowait(done)
+        except Exception as e:
+            queue.put_nowait(e)
+    
+    pump_task = asyncio.create_task(pump())
+    buffer = []
+    buffered_bytes = 0
+    flush_deadline = None
+    last_emit = time.monotonic()
+    
+    try:
+        while True:
+            now = time.monotonic()
+            if buffer:
+                timeout = max(0.0, flush_deadline - now)
+            elif heartbeat_interval > 0:
+                timeout = max(0.0, last_emit + heartbeat_interval - now)
+            else:
+                timeout = None
+            
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    buffered_bytes = 0
+                    flush_deadline = None
+                else:
+                    yield None
+                last_emit = time.monotonic()
+                continue
+            
+            if item is done or isinstance(item, Exception):
+                if buffer:
+                    yield "".join(buffer)
+                if isinstance(item, Exception):
+                    raise item
+                break
+            
+            buffer.append(item)
+            buffered_bytes += len(item.encode("utf-8"))
+            if flush_deadline is None:
+                flush_deadline = time.monotonic() + window
+            
+            if window <= 0 or buffered_bytes >= max_bytes:
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+                flush_deadline = None
+                last_emit = time.monotonic()
+    finally:
+        if not pump_task.done():
+            pump_task.cancel()
+            try:
+                await pump_task
+            except asyncio.CancelledError:
+                pass
+
+
+async def track_sse_stream(
+    generator: AsyncGenerator[str, None],
+    stream_name: Optional[str] = None
+) -> AsyncGenerator[str, None]:
+    """
+    统计SSE流发送的帧数和字节数，流结束时记录日志
+    
+    客户端断开时 Starlette 收到 http.disconnect 后取消发送任务，取消沿生成器链传到
+    AIService 的流式调用，由其关闭上游响应；在后台任务中运行的生成不受影响。
+    
+    Args:
+        generator: SSE消息生成器
+        stream_name: 流名称（日志用），默认取生成器函数名
+    """
+    stream_name = stream_name or getattr(generator, "__name__", "sse")
+    frames = 0
+    sent_bytes = 0
+    started_at = time.monotonic()
+    _sse_stats["streams"] += 1
+    _sse_stats["active"] += 1
+    
+    try:
+        async for message in generator:
+            frames += 1
+            message_bytes = len(message.encode("utf-8"))
+            sent_bytes += message_bytes
+            _sse_stats["frames"] += 1
+            _sse_stats["bytes"] += message_bytes
+            yield message
+    except (asyncio.CancelledError, GeneratorExit):
+        _sse_stats["disconnects"] += 1
+        logger.info(f"🔌 客户端已断开 [{stream_name}]")
+        raise
+    finally:
+        _sse_stats["active"] -= 1
+        await generator.aclose()
+        logger.info(
+            f"📡 SSE流结束 [{stream_name}] - 帧数:{frames}, 字节:{sent_bytes}, "
+            f"耗时:{time.monotonic() - started_at:.1f}s"
+        )
+
+
 async def create_sse_generator(
     async_gen: AsyncGenerator[str, None],
     show_progress: bool = True
@@ -122,20 +420,12 @@ async def create_sse_generator(
         if show_progress:
             yield await SSEResponse.send_progress("开始生成...", 0)
         
-        # 累积内容用于进度计算
-        accumulated_content = ""
-        chunk_count = 0
-        
-        async for chunk in async_gen:
-            chunk_count += 1
-            accumulated_content += chunk
-            
-            # 发送内容块
-            yield await SSEResponse.send_chunk(chunk)
-            
-            # 每10个块发送一次心跳
-            if chunk_count % 10 == 0:
+        # 按时间窗口合并内容块，长时间无输出时发送心跳
+        async for chunk in coalesce_text_stream(async_gen):
+            if chunk is None:
                 yield await SSEResponse.send_heartbeat()
+            else:
+                yield await SSEResponse.send_chunk(chunk)
         
         if show_progress:
             yield await SSEResponse.send_progress("生成完成", 100, "success")
@@ -150,7 +440,7 @@ async def create_sse_generator(
 
 def create_sse_response(generator: AsyncGenerator[str, None]) -> StreamingResponse:
     """
-    创建SSE StreamingResponse
+    创建SSE StreamingResponse（附带帧数/字节数统计）
     
     Args:
         generator: SSE消息生成器
@@ -159,7 +449,7 @@ def create_sse_response(generator: AsyncGenerator[str, None]) -> StreamingRespon
         StreamingResponse对象
     """
     return StreamingResponse(
-        generator,
+        track_sse_stream(generator),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
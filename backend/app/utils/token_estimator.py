@@ -0,0 +1,25 @@
+"""Token估算 - 不依赖具体模型的分词器，按字符类型粗略估算"""
+import re
+
+# 中日韩统一表意文字（含扩展A）、中文标点、全角字符、日文假名、韩文
+_CJK_PATTERN = re.compile(
+    "[\u4e00-\u9fff\u3400-\u4dbf\u3000-\u303f\uff00-\uffef\u3040-\u30ff\uac00-\ud7af]+"
+)
+
+
+def count_cjk(text: str) -> int:
+    """统计中日韩字符数（正则替换在C层完成，长文本也很快）"""
+    return len(text) - len(_CJK_PATTERN.sub("", text))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数
+    
+    中日韩字符按每字1个token计，其余字符按每4个字符1个token计。
+    主流模型对中文的实际切分在每字0.6~1.5个token之间，这里取偏保守的值用于预算控制。
+    """
+    if not text:
+        return 0
+    cjk = count_cjk(text)
+    return cjk + (len(text) - cjk + 3) // 4
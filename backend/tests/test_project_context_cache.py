@@ -0,0 +1,56 @@
+"""项目上下文缓存的失效规则"""
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import app.models  # noqa: F401  注册全部模型
+from app.database import Base
+from app.models.outline import Outline
+from app.models.project import Project
+from app.services import project_context_cache
+
+
+async def _run(mutate) -> int:
+    """生成一次上下文、提交 mutate 的修改后再生成一次，返回第二次读取增加的命中数"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as db:
+        project = Project(title="测试项目", theme="主题", world_rules="规则", current_words=0)
+        db.add(project)
+        await db.flush()
+        db.add(Outline(project_id=project.id, title="开端", content="大纲内容", order_index=1))
+        await db.commit()
+
+        await project_context_cache.get_outlines_context(db, project.id)
+        mutate(project)
+        await db.commit()
+
+        hits = project_context_cache.get_context_cache_stats()["hits"]
+        await project_context_cache.get_outlines_context(db, project.id)
+        hits_after = project_context_cache.get_context_cache_stats()["hits"]
+
+    await engine.dispose()
+    return hits_after - hits
+
+
+def test_current_words_change_keeps_cache():
+    def mutate(project):
+        project.current_words += 100
+
+    assert asyncio.run(_run(mutate)) == 1
+
+
+def test_wizard_step_change_keeps_cache():
+    def mutate(project):
+        project.wizard_step = 3
+
+    assert asyncio.run(_run(mutate)) == 1
+
+
+def test_world_rules_change_invalidates_cache():
+    def mutate(project):
+        project.world_rules = "新的规则"
+
+    assert asyncio.run(_run(mutate)) == 0